@@ -7,6 +7,9 @@ from API import ApiCalls
 from API.config import read_config_option
 from requests.exceptions import ConnectionError
 from urllib2 import URLError
+from appdirs import user_data_dir
+
+catalog_cache_file = path.join(user_data_dir("iridaUploader"), "catalog-cache.sqlite")
 
 class APIConnectorTopics(object):
     connection_error_topic = "APIConnector.connection_error_topic"
@@ -33,6 +36,11 @@ def connect_to_irida():
     baseURL = read_config_option("baseURL")
     username = read_config_option("username")
     password = read_config_option("password")
+    # the project and sample lists (and the access token) are kept between
+    # sessions when the catalog cache is turned on
+    cache_file = None
+    if read_config_option("catalog_cache", expected_type=bool, default_value=False):
+        cache_file = catalog_cache_file
 
     try:
         # Several threads might be attempting to connect at the same time, so lock
@@ -40,7 +48,11 @@ def connect_to_irida():
         # and just return if someone else is already trying to connect.
         if lock.acquire(False):
             logging.info("About to try connecting to IRIDA.")
-            api = ApiCalls(client_id, client_secret, baseURL, username, password)
+            api = ApiCalls(client_id, client_secret, baseURL, username, password,
+                           catalog_cache_file=cache_file,
+                           http_pool_size=read_config_option("http_pool_size", expected_type=int, default_value=10),
+                           http_pool_block=read_config_option("http_pool_block", expected_type=bool,
+                                                              default_value=False))
             send_message(APIConnectorTopics.connection_success_topic, api=api)
             return api
         else:
@@ -1,6 +1,8 @@
 import ast
+import sys
 import json
 import httplib
+import hashlib
 import itertools
 from urllib2 import urlopen, URLError
 from urlparse import urljoin
@@ -11,7 +13,7 @@ import logging
 import threading
 
 from rauth import OAuth2Service
-from requests.adapters import HTTPAdapter
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 from requests.exceptions import HTTPError as request_HTTPError
 
 from Model.Project import Project
@@ -21,17 +23,30 @@ from Exceptions.SampleError import SampleError
 from Exceptions.SequenceFileError import SequenceFileError
 from Exceptions.SampleSheetError import SampleSheetError
 from Validation.offlineValidation import validate_URL_form
-from API.pubsub import send_message
+from API.pubsub import send_message, ProgressMessages
+from API.resourcestream import parse_resources
+from API.fileblocks import read_file_blocks
+from API.qualitycontrol import FastqStatsStream
+from API.catalogcache import open_catalog_cache, conditional_headers
+from API import resumableupload
+from API.workerpool import map_concurrently
 
 
 HTTP_MAX_RETRIES = 5
 HTTP_BACKOFF_FACTOR = 1
+# renew the access token this many seconds before the server says it expires
+TOKEN_REFRESH_MARGIN = 60
+# seconds that links retrieved by get_link are re-used for
+LINK_CACHE_TIME_TO_LIVE = 600
+# bytes of a resource collection to read at a time when parsing it
+RESOURCE_CHUNK_SIZE = 65536
 
 class ApiCalls(object):
 
     _instance = None
 
-    def __new__(cls, client_id, client_secret, base_URL, username, password, max_wait_time=20):
+    def __new__(cls, client_id, client_secret, base_URL, username, password, max_wait_time=20,
+                catalog_cache_file=None, http_pool_size=DEFAULT_POOLSIZE, http_pool_block=False):
         """
             Overriding __new__ to implement a singleton
             This is done instead of a decorator so that mocking still works for class.
@@ -46,11 +61,20 @@ class ApiCalls(object):
                 username -- username for server
                 password -- password for given username
                 max_wait_time -- timeout (seconds), default=20
+                catalog_cache_file -- file to keep the project and sample
+                    lists (and the access token) in between sessions, see
+                    `CatalogCache`. default=None keeps them in memory only.
+                http_pool_size -- the number of connections to the server to
+                    keep open for re-use, default=10
+                http_pool_block -- wait for one of the open connections when
+                    they're all in use, instead of opening another connection
+                    that's closed after one request. default=False
 
         """
 
         if not ApiCalls._instance or ApiCalls._instance.parameters_are_different(
-                client_id, client_secret, base_URL,username, password, max_wait_time):
+                client_id, client_secret, base_URL,username, password, max_wait_time, catalog_cache_file,
+                http_pool_size, http_pool_block):
 
             # Create a new instance of the API
             ApiCalls._instance = object.__new__(cls)
@@ -62,13 +86,28 @@ class ApiCalls(object):
             ApiCalls._instance.username = username
             ApiCalls._instance.password = password
             ApiCalls._instance.max_wait_time = max_wait_time
+            ApiCalls._instance.catalog_cache_file = catalog_cache_file
+            ApiCalls._instance.catalog_cache = open_catalog_cache(catalog_cache_file) if catalog_cache_file else None
+            ApiCalls._instance.http_pool_size = http_pool_size
+            ApiCalls._instance.http_pool_block = http_pool_block
+            ApiCalls._instance._http_adapter = None
 
             # initialize API object
             ApiCalls._instance._session_lock = threading.Lock()
             ApiCalls._instance._session_set_externally = False
+            ApiCalls._instance._token_expires_at = None
+            ApiCalls._instance.auth_request_count = 0
             ApiCalls._instance.create_session()
             ApiCalls._instance.cached_projects = None
+            ApiCalls._instance.cached_projects_by_id = {}
             ApiCalls._instance.cached_samples = {}
+            ApiCalls._instance.cached_samples_by_id = {}
+            ApiCalls._instance.cached_links = {}
+            # None until a sample's links show whether the server has resumable uploads
+            ApiCalls._instance._resumable_uploads_supported = None
+            # the stop events of the uploads in progress, set by _kill_connections
+            ApiCalls._instance._upload_stop_events = set()
+            ApiCalls._instance._upload_stop_lock = threading.Lock()
 
         return ApiCalls._instance
 
@@ -80,7 +119,8 @@ class ApiCalls(object):
         """
         ApiCalls._instance = None
 
-    def parameters_are_different(self, client_id, client_secret, base_URL, username, password, max_wait_time):
+    def parameters_are_different(self, client_id, client_secret, base_URL, username, password, max_wait_time,
+                                 catalog_cache_file=None, http_pool_size=DEFAULT_POOLSIZE, http_pool_block=False):
         """
         Compare the current instance variables with a new set of variables
         """
@@ -90,7 +130,10 @@ class ApiCalls(object):
                  self.base_URL != base_URL or
                  self.username != username or
                  self.password != password or
-                 self.max_wait_time != max_wait_time)
+                 self.max_wait_time != max_wait_time or
+                 self.catalog_cache_file != catalog_cache_file or
+                 self.http_pool_size != http_pool_size or
+                 self.http_pool_block != http_pool_block)
 
         if result:
             logging.warning("ApiCalls session instance parameters are different, "
@@ -103,22 +146,13 @@ class ApiCalls(object):
         if self._session_set_externally:
             return self._session
 
-        try:
-            self._session_lock.acquire()
-            response = self._session.options(self.base_URL)
-            if response.status_code != httplib.OK:
-                raise Exception
-            else:
-                logging.debug("Existing session still works, going to reuse it.")
-        except:
-            logging.debug("Token is probably expired, going to get a new session.")
-            oauth_service = self.get_oauth_service()
-            access_token = self.get_access_token(oauth_service)
-
-            new_session = oauth_service.get_session(access_token)
-            self._session = self.add_timeout_backoff(new_session)
-        finally:
-            self._session_lock.release()
+        # only renew the session when the access token is about to expire,
+        # tokens that are rejected early are handled by `_handle_unauthorized`.
+        if self._token_expires_soon():
+            with self._session_lock:
+                if self._token_expires_soon():
+                    logging.debug("Token is about to expire, going to get a new session.")
+                    self._renew_session()
 
         return self._session
 
@@ -135,6 +169,7 @@ class ApiCalls(object):
         """
 
         self.cached_projects = None
+        self.cached_projects_by_id = {}
         # set http backoff option
         self.http_max_retries = HTTP_MAX_RETRIES
         self.http_backoff_factor = HTTP_BACKOFF_FACTOR
@@ -143,38 +178,165 @@ class ApiCalls(object):
             self.base_URL = self.base_URL + "/"
 
         if validate_URL_form(self.base_URL):
-            oauth_service = self.get_oauth_service()
-            access_token = self.get_access_token(oauth_service)
-
-            new_session = oauth_service.get_session(access_token)
-            self._session = self.add_timeout_backoff(new_session)
+            self._renew_session(use_cached_token=True)
 
             if self.validate_URL_existence(self.base_URL, use_session=True) is False:
                 raise Exception("Cannot create session. Verify your credentials are correct.")
         else:
             raise URLError(self.base_URL + " is not a valid URL")
 
+    def _renew_session(self, use_cached_token=False):
+        """
+        get a new access token and replace the current session with a session
+        that uses the new token. Requests made with the new session that are
+        rejected with 401 UNAUTHORIZED are handed to `_handle_unauthorized`.
+
+        arguments:
+            use_cached_token -- use the access token from the catalog cache
+                instead, if it hasn't expired
+        """
+
+        oauth_service = self.get_oauth_service()
+        access_token = self._cached_access_token() if use_cached_token else None
+        if access_token is None:
+            access_token = self.get_access_token(oauth_service)
+
+        new_session = self.add_timeout_backoff(oauth_service.get_session(access_token))
+        new_session.hooks["response"].append(
+            lambda response, *args, **kwargs: self._handle_unauthorized(new_session, response, **kwargs))
+        self._session = new_session
+
+    def _token_account(self):
+        """
+        the key that access tokens for this server, client and user are kept
+        under in the catalog cache
+        """
+
+        return hashlib.sha256("\n".join([self.base_URL, self.client_id, self.username])).hexdigest()
+
+    def _cached_access_token(self):
+        """
+        find the access token from an earlier session in the catalog cache, so
+        that starting again doesn't need another token request. a token that
+        the server has revoked is replaced by `_handle_unauthorized`.
+
+        returns the access token, or None if there's no token that's valid for
+        at least another TOKEN_REFRESH_MARGIN seconds
+        """
+
+        if self.catalog_cache is None:
+            return None
+        cached_token = self.catalog_cache.access_token(self._token_account(), margin=TOKEN_REFRESH_MARGIN)
+        if cached_token is None:
+            return None
+
+        logging.info("Using the access token from the catalog cache.")
+        access_token, self._token_expires_at = cached_token
+        return access_token
+
+    def _token_expires_soon(self):
+        """
+        check whether the current access token expires within
+        TOKEN_REFRESH_MARGIN seconds. If the server didn't tell us when the
+        token expires then we rely on `_handle_unauthorized` instead.
+
+        returns True if the access token should be renewed
+        """
+
+        if self._token_expires_at is None:
+            return False
+        return time() >= self._token_expires_at - TOKEN_REFRESH_MARGIN
+
+    def _handle_unauthorized(self, expired_session, response, **kwargs):
+        """
+        response hook for sessions created by `_renew_session`. When the server
+        rejects the access token of expired_session, get a new session (unless
+        another thread already did) and send the request again, once, with the
+        new access token.
+
+        Requests with a streamed body (i.e., sequence file uploads) can't be sent
+        again, so the 401 response is returned to the caller for those.
+
+        arguments:
+            expired_session -- the session that sent the request
+            response -- the response to the request
+            kwargs -- the arguments that the request was sent with
+
+        returns the response to the retried request, or response
+        """
+
+        if response.status_code != httplib.UNAUTHORIZED or getattr(response.request, "token_renewed", False):
+            return response
+
+        logging.debug("Token was rejected by the server, going to get a new session.")
+        with self._session_lock:
+            if self._session is expired_session:
+                self._renew_session()
+            session = self._session
+
+        body = response.request.body
+        if body is not None and not isinstance(body, basestring):
+            logging.info("Can't send a streamed request again after the token was rejected.")
+            return response
+
+        # release the connection before sending the request again
+        response.content
+        response.close()
+
+        retry = response.request.copy()
+        retry.token_renewed = True
+        retry.url = retry.url.replace(expired_session.access_token, session.access_token)
+        if "Authorization" in retry.headers:
+            retry.headers["Authorization"] = "Bearer " + session.access_token
+
+        return session.send(retry, **kwargs)
+
     def add_timeout_backoff(self, new_session):
         # method stolen from https://www.programcreek.com/python/example/102997/requests.adapters example 3
         # Adds a retry counter and backoff to requests that timeout
-        try:
-            # Some older versions of requests to not have the urllib3
-            # vendorized package
-            from requests.packages.urllib3.util.retry import Retry
-        except ImportError:
-            retries = self.http_max_retries
-        else:
-            # use a requests session to reuse connections between requests
-            retries = Retry(
-                total=self.http_max_retries,
-                read=self.http_max_retries,
-                backoff_factor=self.http_backoff_factor,
-                status_forcelist=[408, 504, 522, 524]
-            )
-        new_session.mount('https://', HTTPAdapter(max_retries=retries))
-        new_session.mount('http://', HTTPAdapter(max_retries=retries))
+        if self._http_adapter is None:
+            try:
+                # Some older versions of requests to not have the urllib3
+                # vendorized package
+                from requests.packages.urllib3.util.retry import Retry
+            except ImportError:
+                retries = self.http_max_retries
+            else:
+                # use a requests session to reuse connections between requests
+                retries = Retry(
+                    total=self.http_max_retries,
+                    read=self.http_max_retries,
+                    backoff_factor=self.http_backoff_factor,
+                    status_forcelist=[408, 504, 522, 524]
+                )
+            self._http_adapter = HTTPAdapter(max_retries=retries, pool_maxsize=self.http_pool_size,
+                                             pool_block=self.http_pool_block)
+        # every session uses the same adapter, so the open connections in its
+        # pool are kept when the session is replaced to renew the access token
+        new_session.mount('https://', self._http_adapter)
+        new_session.mount('http://', self._http_adapter)
         return new_session
 
+    def connection_counts(self):
+        """
+        count the requests sent to the server, and the connections that were
+        opened to send them, since this ApiCalls was created (requests that
+        didn't need a new connection re-used an open one)
+
+        returns a tuple (number of requests, number of new connections)
+        """
+
+        requests_sent = 0
+        new_connections = 0
+        if self._http_adapter is not None:
+            pools = self._http_adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+                    new_connections += pool.num_connections
+        return requests_sent, new_connections
+
     def get_oauth_service(self):
         """
         get oauth service to be used to get access token
@@ -196,6 +358,7 @@ class ApiCalls(object):
     def get_access_token(self, oauth_service):
         """
         get access token to be used to get session from oauth_service
+        also records when the access token expires, if the server says so
 
         arguments:
             oauth_service -- O2AuthService from get_oauth_service
@@ -212,8 +375,24 @@ class ApiCalls(object):
                 "password": self.password
             }
         }
+        token_response = {}
+
+        def _decoder(return_dict):
+            # keep the whole response so that we can find out when the token expires
+            token_response.update(self.decoder(return_dict))
+            return token_response
+
+        self.auth_request_count += 1
         access_token = oauth_service.get_access_token(
-            decoder=self.decoder, **params)
+            decoder=_decoder, **params)
+
+        if "expires_in" in token_response:
+            self._token_expires_at = time() + int(token_response["expires_in"])
+            if self.catalog_cache is not None:
+                self.catalog_cache.store_access_token(self._token_account(), access_token, self._token_expires_at)
+        else:
+            self._token_expires_at = None
+
         return access_token
 
     def decoder(self, return_dict):
@@ -272,6 +451,14 @@ class ApiCalls(object):
         tries to retrieve target_key from response to find link to resource
         raises exceptions if target_key not found or targ_url is invalid
 
+        the list or resource is only requested once, raising request_HTTPError
+        if the server doesn't have it.
+
+        links are cached for LINK_CACHE_TIME_TO_LIVE seconds. when targ_dict
+        is given, the links for *every* resource in the response are cached,
+        so looking up another resource in the same list doesn't make any
+        requests.
+
         arguments:
             targ_url -- URL to retrieve link from
             target_key -- name of link (e.g projects or project/samples)
@@ -283,42 +470,220 @@ class ApiCalls(object):
         returns link if it exists
         """
 
-        if self.validate_URL_existence(targ_url, use_session=True):
-            response = self.session.get(targ_url)
+        if len(targ_dict) > 0:
+            cache_key = (targ_url, target_key, targ_dict["key"], targ_dict["value"].lower())
+        else:
+            cache_key = (targ_url, target_key, None, None)
+
+        cached_link = self.cached_links.get(cache_key)
+        if cached_link is not None and time() - cached_link[1] < LINK_CACHE_TIME_TO_LIVE:
+            return cached_link[0]
 
-            if len(targ_dict) > 0:
-                resources_list = response.json()["resource"]["resources"]
+        if len(targ_dict) > 0:
+            # read the whole list (even after finding the value) so that
+            # the links for all of the resources are cached.
+            links_by_value = {}
+            for r in self.iter_resources(targ_url):
                 try:
-                    links_list = next(r["links"] for r in resources_list
-                                      if r[targ_dict["key"]].lower() ==
-                                      targ_dict["value"].lower())
+                    links_by_value.setdefault(r[targ_dict["key"]].lower(), r["links"])
 
                 except KeyError:
                     raise KeyError(targ_dict["key"] + " not found." +
                                    " Available keys: " +
-                                   ", ".join(resources_list[0].keys()))
+                                   ", ".join(r.keys()))
 
-                except StopIteration:
-                    raise KeyError(targ_dict["value"] + " not found.")
+            self._cache_links(targ_url, target_key, targ_dict["key"], links_by_value)
 
-            else:
-                links_list = response.json()["resource"]["links"]
             try:
-                ret_val = next(link["href"] for link in links_list
-                              if link["rel"] == target_key)
+                links_list = links_by_value[targ_dict["value"].lower()]
 
-            except StopIteration:
-                raise KeyError(target_key + " not found in links. " +
-                               "Available links: " +
-                               ", ".join(
-                                [str(link["rel"]) for link in links_list]))
+            except KeyError:
+                raise KeyError(targ_dict["value"] + " not found.")
 
         else:
-            raise request_HTTPError("Error: " +
-                                    targ_url + " is not a valid URL")
+            links_list = self._get_json(targ_url)["resource"]["links"]
+        try:
+            ret_val = next(link["href"] for link in links_list
+                          if link["rel"] == target_key)
+
+        except StopIteration:
+            raise KeyError(target_key + " not found in links. " +
+                           "Available links: " +
+                           ", ".join(
+                            [str(link["rel"]) for link in links_list]))
+
+        self.cached_links[cache_key] = (ret_val, time())
 
         return ret_val
 
+    def iter_resources(self, url):
+        """
+        API call to a resource collection (e.g. api/projects/project_id/samples)
+        the response is parsed as it's received instead of all at once, so
+        memory use doesn't grow with the size of the collection. IRIDA doesn't
+        page resource collections, the collection is always one response.
+
+        arguments:
+            url -- URL of the resource collection
+
+        returns a generator that yields each resource dictionary in the
+            collection. the response is closed when the generator is closed,
+            so stopping early doesn't download the rest of the collection.
+        """
+
+        cached_response = self.catalog_cache.response(url) if self.catalog_cache else None
+        if cached_response is None:
+            response = self.session.get(url, stream=True)
+        else:
+            response = self.session.get(url, stream=True, headers=conditional_headers(cached_response))
+
+        try:
+            self._check_response(url, response)
+            if cached_response is not None and response.status_code == httplib.NOT_MODIFIED:
+                for resource in parse_resources([cached_response.body]):
+                    yield resource
+                return
+
+            chunks = response.iter_content(RESOURCE_CHUNK_SIZE)
+            if self.catalog_cache is None or response.status_code != httplib.OK:
+                for resource in parse_resources(chunks):
+                    yield resource
+                return
+
+            # keep the collection to revalidate next time, once all of it
+            # has been received
+            received = []
+            chunks = (received.append(chunk) or chunk for chunk in chunks)
+            for resource in parse_resources(chunks):
+                yield resource
+            for chunk in chunks:
+                pass
+            self.catalog_cache.store_response(url, response.headers.get("ETag"),
+                                              response.headers.get("Last-Modified"), "".join(received))
+        finally:
+            response.close()
+
+    def _get_json(self, url):
+        """
+        API call expecting a json response. with a catalog cache, the response
+        is kept and revalidated with a conditional request the next time,
+        instead of being downloaded again.
+
+        arguments:
+            url -- URL of the resource
+
+        returns the parsed response
+        """
+
+        cached_response = self.catalog_cache.response(url) if self.catalog_cache else None
+        if cached_response is None:
+            response = self.session.get(url)
+        else:
+            response = self.session.get(url, headers=conditional_headers(cached_response))
+
+        self._check_response(url, response)
+        if cached_response is not None and response.status_code == httplib.NOT_MODIFIED:
+            return json.loads(cached_response.body)
+
+        if self.catalog_cache is not None and response.status_code == httplib.OK:
+            self.catalog_cache.store_response(url, response.headers.get("ETag"),
+                                              response.headers.get("Last-Modified"), response.content)
+        return response.json()
+
+    def _check_response(self, url, response):
+        """
+        check the response to a GET of a resource or resource collection, the
+        same way that validate_URL_existence checks a URL, so the URL doesn't
+        have to be requested twice
+
+        arguments:
+            url -- the URL that was requested
+            response -- the response to the request
+
+        raises request_HTTPError if the server doesn't have the resource, or
+            Exception for any other response that isn't OK or NOT MODIFIED
+        """
+
+        if response.status_code == httplib.NOT_FOUND:
+            response.close()
+            raise request_HTTPError("Error: " + url + " is not a valid URL")
+        elif response.status_code not in (httplib.OK, httplib.NOT_MODIFIED):
+            response.close()
+            raise Exception(str(response.status_code) + " " + response.reason)
+
+    def _add_cached_resources(self, url, resources):
+        """
+        add resources that we've just created to the copy of their collection
+        in the catalog cache. the headers that the collection is revalidated
+        with are kept, so the server still decides whether it has changed.
+
+        arguments:
+            url -- URL of the resource collection
+            resources -- list of resource dictionaries to add
+        """
+
+        cached_response = self.catalog_cache.response(url) if self.catalog_cache else None
+        if cached_response is None:
+            return
+
+        collection = json.loads(cached_response.body)
+        collection["resource"]["resources"].extend(resources)
+        self.catalog_cache.update_body(url, json.dumps(collection))
+
+    def find_resource(self, url, key, value):
+        """
+        find the first resource in a resource collection where key has the
+        given (case-insensitive) value, stopping as soon as it's found
+
+        arguments:
+            url -- URL of the resource collection
+            key -- name of the property to compare (e.g. sampleName)
+            value -- the value to look for
+
+        returns the resource dictionary, or None if no resource matches
+        """
+
+        resources = self.iter_resources(url)
+        try:
+            return next((r for r in resources if r[key].lower() == value.lower()), None)
+        finally:
+            resources.close()
+
+    def _cache_links(self, targ_url, target_key, key, links_by_value):
+        """
+        add the target_key link of every resource in a resource list to the
+        link cache
+
+        arguments:
+            targ_url -- URL that the resource list was retrieved from
+            target_key -- name of the link to cache
+            key -- name of the property that resources are looked up by
+            links_by_value -- dict of lowercase property value to resource links
+        """
+
+        now = time()
+        for value, links_list in links_by_value.items():
+            for link in links_list:
+                if link["rel"] == target_key:
+                    self.cached_links[(targ_url, target_key, key, value)] = (link["href"], now)
+                    break
+
+    def clear_link_cache(self, targ_url=None):
+        """
+        remove cached links, so that they are retrieved from the server again
+
+        arguments:
+            targ_url -- only remove links that were retrieved from this URL,
+                default=None removes all cached links
+        """
+
+        if targ_url is None:
+            self.cached_links = {}
+        else:
+            for cache_key in self.cached_links.keys():
+                if cache_key[0] == targ_url:
+                    self.cached_links.pop(cache_key, None)
+
     def get_projects(self):
         """
         API call to api/projects to get list of projects
@@ -329,9 +694,7 @@ class ApiCalls(object):
         if self.cached_projects is None:
             logging.info("Loading projects from server.")
             url = self.get_link(self.base_URL, "projects")
-            response = self.session.get(url)
-
-            result = response.json()["resource"]["resources"]
+            result = self._get_json(url)["resource"]["resources"]
             try:
                 project_list = [
                     Project(
@@ -348,11 +711,26 @@ class ApiCalls(object):
                 raise KeyError(msg_arg + " not found." + " Available keys: " +
                                ", ".join(result[0].keys()))
             self.cached_projects = project_list
+            self.cached_projects_by_id = dict((project.get_id(), project) for project in project_list)
         else:
             logging.info("Loading projects from cache.")
 
         return self.cached_projects
 
+    def get_project(self, project_id):
+        """
+        find a project by its identifier using the projects from get_projects
+
+        arguments:
+            project_id -- the identifier of the project
+
+        returns the Project object with the given identifier, or None if
+            there is no such project
+        """
+
+        self.get_projects()
+        return self.cached_projects_by_id.get(project_id)
+
     def get_samples(self, project=None, sample=None):
         """
         API call to api/projects/project_id/samples
@@ -383,12 +761,94 @@ class ApiCalls(object):
             except StopIteration:
                 raise ProjectError("The given project ID: " + project_id + " doesn't exist")
 
-            response = self.session.get(url)
-            result = response.json()["resource"]["resources"]
-            self.cached_samples[project_id] = [Sample(sample_dict) for sample_dict in result]
+            self._cache_samples(project_id, url)
 
         return self.cached_samples[project_id]
 
+    def _cache_samples(self, project_id, url):
+        """
+        download the sample list of a project into the sample caches
+
+        arguments:
+            project_id -- the identifier of the project
+            url -- URL of the project's sample list
+        """
+
+        samples = [Sample(sample_dict) for sample_dict in self.iter_resources(url)]
+        # the samples are only looked up by id once the list is cached
+        self.cached_samples_by_id[project_id] = dict(
+            (server_sample.get_id().lower(), server_sample) for server_sample in samples)
+        self.cached_samples[project_id] = samples
+
+    def prefetch_samples(self, project_ids, max_concurrent_requests=1):
+        """
+        download the sample lists of several projects at the same time, so
+        that get_samples and get_sample find them in the cache instead of
+        fetching them one project at a time.
+
+        projects that don't exist, or whose sample list can't be downloaded,
+        are skipped; get_samples reports the error when they're looked up.
+
+        arguments:
+            project_ids -- the identifiers of the projects
+            max_concurrent_requests -- the maximum number of sample lists to
+                                       download at the same time
+
+        returns the number of sample lists that were downloaded
+        """
+
+        pending_projects = []
+        # the links are looked up first, looking up one project's link caches
+        # the links for every project
+        for project_id in sorted(set(project_ids)):
+            if project_id in self.cached_samples:
+                continue
+            try:
+                if self.get_project(project_id) is None:
+                    continue
+                proj_URL = self.get_link(self.base_URL, "projects")
+                url = self.get_link(proj_URL, "project/samples",
+                                    targ_dict={
+                                        "key": "identifier",
+                                        "value": project_id
+                                    })
+            except Exception:
+                logging.exception("Failed to find the sample list for project [{}].".format(project_id))
+                continue
+            pending_projects.append((project_id, url))
+
+        def _prefetch_samples(pending_project):
+            project_id, url = pending_project
+            try:
+                self._cache_samples(project_id, url)
+                return True
+            except Exception:
+                logging.exception("Failed to prefetch samples for project [{}].".format(project_id))
+                return False
+
+        worker_count = max(1, min(max_concurrent_requests, self.http_pool_size, len(pending_projects)))
+        logging.info("Prefetching samples for {} projects with {} concurrent requests.".format(
+            len(pending_projects), worker_count))
+        fetched = map_concurrently(_prefetch_samples, pending_projects, worker_count, name="SamplePrefetcher")
+
+        return fetched.count(True)
+
+    def get_sample(self, sample):
+        """
+        find the sample on the server that has the same (case-insensitive)
+        identifier as sample, in the project that sample belongs to, using the
+        samples from get_samples
+
+        arguments:
+            sample -- a Sample object used to get project_id and sample_id
+
+        returns the Sample object from the server, or None if the project
+            doesn't have a sample with that identifier
+        """
+
+        self.get_samples(sample=sample)
+        return self.cached_samples_by_id[sample.get_project_id()].get(sample.get_id().lower())
+
     def get_sequence_files(self, sample):
         """
         API call to api/projects/project_id/sample_id/sequenceFiles
@@ -439,6 +899,8 @@ class ApiCalls(object):
 
         arguments:
             project -- a Project object to be sent.
+            clear_cache -- add the new project to the cached project list
+                (instead of leaving the list as it is)
 
         returns a dictionary containing the result of post request.
         when post is successful the dictionary it returns will contain the same
@@ -447,8 +909,6 @@ class ApiCalls(object):
         when post fails then an error will be raised so return statement is
             not even reached.
         """
-        if clear_cache:
-            self.cached_projects = None
 
         json_res = {}
         if len(project.get_name()) >= 5:
@@ -463,6 +923,10 @@ class ApiCalls(object):
             response = self.session.post(url, json_obj, **headers)
             if response.status_code == httplib.CREATED:  # 201
                 json_res = json.loads(response.text)
+                # the project list has changed, so links found in it are stale
+                self.clear_link_cache(url)
+                if clear_cache:
+                    self._add_cached_project(url, json_res["resource"])
             else:
                 raise ProjectError("Error: " +
                                    str(response.status_code) + " " +
@@ -476,26 +940,86 @@ class ApiCalls(object):
 
         return json_res
 
-    def send_samples(self, samples_list):
+    def _add_cached_project(self, url, resource):
+        """
+        add a project that we've just created to the cached project lists,
+        instead of fetching the whole list again
+
+        arguments:
+            url -- URL of the project list
+            resource -- the project's resource dictionary from the server
+        """
+
+        try:
+            project = Project(resource["name"], resource["projectDescription"], resource["identifier"])
+        except KeyError:
+            logging.info("The server didn't describe the new project, the projects will be fetched again.")
+            self.cached_projects = None
+            self.cached_projects_by_id = {}
+            return
+
+        if self.cached_projects is not None:
+            self.cached_projects = self.cached_projects + [project]
+            self.cached_projects_by_id[project.get_id()] = project
+        self._add_cached_resources(url, [resource])
+
+    def send_samples(self, samples_list, max_concurrent_requests=1):
         """
         post request to send sample(s) to the given project
         the project that the sample will be sent to is in its dictionary's
         "sampleProject" key
 
+        every sample is sent (see `create_samples`) before the first failure
+        is raised
+
         arguments:
             samples_list -- list containing Sample object(s) to send
+            max_concurrent_requests -- the maximum number of samples to send
+                                       at the same time
 
         returns a list containing dictionaries of the result of post request.
         """
 
-        self.cached_samples = {} # reset the cache, we're updating stuff
-        self.cached_projects = None
-        json_res_list = []
+        json_res_list = self.create_samples(samples_list, max_concurrent_requests)
+        for json_res in json_res_list:
+            if isinstance(json_res, Exception):
+                raise json_res
 
-        for sample in samples_list:
+        return json_res_list
+
+    def create_samples(self, samples_list, max_concurrent_requests=1):
+        """
+        create a batch of samples on the server. The samples are grouped by
+        project so that the link to each project's sample list is only looked
+        up once, then the samples are sent by a bounded pool of worker threads
+        that share the session's keep-alive connections.
+
+        a sample that can't be created doesn't stop the rest of the batch from
+        being sent.
+
+        arguments:
+            samples_list -- list containing Sample object(s) to send
+            max_concurrent_requests -- the maximum number of samples to send
+                                       at the same time (no more than the
+                                       number of connections the session keeps
+                                       open to the server)
+
+        returns a list in the same order as samples_list, containing the
+            dictionary of the result of the post request for each sample that
+            was created, and the ProjectError or SampleError for each sample
+            that wasn't.
+        """
 
+        json_res_list = [None] * len(samples_list)
+
+        indexes_by_project = {}
+        for index, sample in enumerate(samples_list):
+            indexes_by_project.setdefault(sample.get_project_id(), []).append(index)
+
+        pending_samples = []
+        samples_urls = {}
+        for project_id, indexes in indexes_by_project.items():
             try:
-                project_id = sample.get_project_id()
                 proj_URL = self.get_link(self.base_URL, "projects")
                 url = self.get_link(proj_URL, "project/samples",
                                     targ_dict={
@@ -503,30 +1027,87 @@ class ApiCalls(object):
                                         "value": project_id
                                     })
 
-            except StopIteration:
-                raise ProjectError("The given project ID: " +
-                                   project_id + " doesn't exist")
+            except (StopIteration, KeyError):
+                e = ProjectError("The given project ID: " +
+                                 project_id + " doesn't exist")
+                for index in indexes:
+                    json_res_list[index] = e
+                continue
 
-            headers = {
-                "headers": {
-                    "Content-Type": "application/json"
-                }
+            samples_urls[project_id] = url
+            for index in indexes:
+                pending_samples.append((index, url))
+
+        headers = {
+            "headers": {
+                "Content-Type": "application/json"
             }
+        }
 
-            json_obj = json.dumps(sample, cls=Sample.JsonEncoder)
-            response = self.session.post(url, json_obj, **headers)
+        def _create_sample(pending_sample):
+            index, url = pending_sample
+            sample = samples_list[index]
+
+            try:
+                json_obj = json.dumps(sample, cls=Sample.JsonEncoder)
+                response = self.session.post(url, json_obj, **headers)
+            except Exception as e:
+                logging.exception("Didn't create sample on server, the request failed.")
+                json_res_list[index] = e
+                return
 
             if response.status_code == httplib.CREATED:  # 201
-                json_res = json.loads(response.text)
-                json_res_list.append(json_res)
+                json_res_list[index] = json.loads(response.text)
             else:
                 logging.error("Didn't create sample on server, response code is [{}] and error message is [{}]".format(response.status_code, response.text))
                 e = SampleError("Error {status_code}: {err_msg}.\nSample data: {sample_data}".format(status_code=str(response.status_code), err_msg=response.text, sample_data=str(sample)), ["IRIDA rejected the sample."])
                 send_message(sample.upload_failed_topic, exception = e)
-                raise e
+                json_res_list[index] = e
+
+        # more threads than the session keeps connections for would open
+        # connections that are closed again after each request
+        worker_count = max(1, min(max_concurrent_requests, self.http_pool_size, len(pending_samples)))
+        logging.info("Creating {} samples with {} concurrent requests.".format(len(pending_samples), worker_count))
+        if worker_count == 1:
+            for pending_sample in pending_samples:
+                _create_sample(pending_sample)
+        else:
+            map_concurrently(_create_sample, pending_samples, worker_count, name="SampleCreator")
+
+        for project_id, url in samples_urls.items():
+            # the new samples are added to the cached lists, and their links
+            # to the link cache (the links of the other samples in the list
+            # haven't changed), so finding where to upload their files doesn't
+            # download the project's sample list again
+            created = [json_res_list[index]["resource"] for index in indexes_by_project[project_id]
+                       if isinstance(json_res_list[index], dict) and "resource" in json_res_list[index]]
+            self._cache_links(url, "sample/sequenceFiles", "sampleName",
+                              dict((resource["sampleName"].lower(), resource["links"]) for resource in created
+                                   if "sampleName" in resource and "links" in resource))
+            if created:
+                self._add_cached_samples(project_id, url, created)
 
         return json_res_list
 
+    def _add_cached_samples(self, project_id, url, resources):
+        """
+        add samples that we've just created to the cached sample lists of their
+        project, instead of fetching the whole list again
+
+        arguments:
+            project_id -- the identifier of the project
+            url -- URL of the project's sample list
+            resources -- list of the samples' resource dictionaries from the server
+        """
+
+        if project_id in self.cached_samples:
+            samples = [Sample(resource) for resource in resources]
+            samples_by_id = dict(self.cached_samples_by_id[project_id])
+            samples_by_id.update((server_sample.get_id().lower(), server_sample) for server_sample in samples)
+            self.cached_samples_by_id[project_id] = samples_by_id
+            self.cached_samples[project_id] = self.cached_samples[project_id] + samples
+        self._add_cached_resources(url, resources)
+
     def get_file_size_list(self, samples_list):
         """
         calculate file size for the files in a sample
@@ -542,11 +1123,11 @@ class ApiCalls(object):
 
             bytes_read_size = sample.get_files_size()
             file_size_list.append(bytes_read_size)
-            sample.pair_files_byte_size = bytes_read_size
 
         return file_size_list
 
-    def send_sequence_files(self, samples_list, upload_id=1):
+    def send_sequence_files(self, samples_list, upload_id=1, max_concurrent_uploads=1, upload_journal=None,
+                            qc_stats=False, prepare_sample=None):
 
         """
         send sequence files found in each sample in samples_list
@@ -558,40 +1139,143 @@ class ApiCalls(object):
         arguments:
             samples_list -- list containing Sample object(s)
             upload_id -- the run to send the files to
+            max_concurrent_uploads -- the number of samples to upload at the
+                                      same time, default=1 (one at a time)
+            upload_journal -- an UploadJournal to record the progress of
+                              resumable uploads in. The files are sent in
+                              chunks that can be resumed after an interruption
+                              when this is given and the server supports it,
+                              default=None (send each sample in one request)
+            qc_stats -- calculate the statistics of each file (see
+                        `FastqStatsStream`) from the blocks as they're sent,
+                        and record them in the sample's seq_file.qc_stats,
+                        default=False
+            prepare_sample -- a function to call with each sample before its
+                              files are sent (e.g. to create the sample on the
+                              server). Samples are prepared one at a time, in
+                              order, on a separate thread, and each sample's
+                              files are sent as soon as it's been prepared
+                              while the following samples are being prepared.
+                              A sample that can't be prepared isn't uploaded,
+                              but the other samples are, default=None
 
         returns a list containing dictionaries of the result of post request.
+            the results are in the same order as samples_list.
         """
 
         json_res_list = []
+        # each call has its own stop event, so that starting another upload
+        # doesn't undo a request to stop this one
+        stop_upload = threading.Event()
+        with self._upload_stop_lock:
+            self._upload_stop_events.add(stop_upload)
+
+        try:
+            if prepare_sample or (max_concurrent_uploads > 1 and len(samples_list) > 1):
+                return self._send_sequence_files_concurrently(samples_list, upload_id, max_concurrent_uploads,
+                                                              stop_upload, upload_journal, qc_stats, prepare_sample)
 
-        file_size_list = self.get_file_size_list(samples_list)
-        self.size_of_all_seq_files = sum(file_size_list)
+            for sample in samples_list:
+                try:
+                    json_res = self._send_sequence_files(sample, upload_id, stop_upload, upload_journal, qc_stats)
+                    json_res_list.append(json_res)
+                except Exception, e:
+                    logging.error("The upload failed for unexpected reasons, informing the UI.")
+                    send_message(sample.upload_failed_topic, exception = e)
+                    raise
+            return json_res_list
+        finally:
+            with self._upload_stop_lock:
+                self._upload_stop_events.discard(stop_upload)
 
-        self.total_bytes_read = 0
-        self.start_time = time()
+    def _send_sequence_files_concurrently(self, samples_list, upload_id, max_concurrent_uploads, stop_upload,
+                                          upload_journal=None, compute_qc_stats=False, prepare_sample=None):
 
-        for sample in samples_list:
+        """
+        send the sequence files for the samples in samples_list using a bounded
+        pool of worker threads (see `map_concurrently`), each worker uploading
+        one sample at a time. When prepare_sample is given, the samples are
+        prepared on this thread and handed to the workers as each of them is
+        prepared.
+
+        A sample that can't be prepared (e.g. its project doesn't exist) fails
+        on its own: its files aren't sent, and the samples before and after it
+        are still prepared and uploaded. No new samples are started once the
+        files of any sample have failed to upload, or once the upload has been
+        halted by `_kill_connections`. Samples that are already in progress
+        when a failure happens are allowed to finish so that they can be
+        recorded as uploaded. The first failure is re-raised once all of the
+        workers have stopped.
+
+        arguments:
+            samples_list -- list containing Sample object(s)
+            upload_id -- the run to send the files to
+            max_concurrent_uploads -- the maximum number of worker threads
+            stop_upload -- the threading.Event that's set to halt the upload
+            upload_journal -- an UploadJournal for resumable uploads, or None
+            compute_qc_stats -- calculate the statistics of each file as it's
+                                sent
+            prepare_sample -- a function to call with each sample before it's
+                              uploaded, or None
+
+        returns a list containing dictionaries of the result of post request,
+            in the same order as samples_list.
+        """
+
+        json_res_list = [None] * len(samples_list)
+        prepare_failures = []
+        worker_count = max(1, min(max_concurrent_uploads, len(samples_list)))
+
+        def _prepared_samples():
+            for index, sample in enumerate(samples_list):
+                if prepare_sample:
+                    try:
+                        prepare_sample(sample)
+                    except Exception, e:
+                        logging.exception("Failed to prepare sample [{}] for upload.".format(sample))
+                        send_message(sample.upload_failed_topic, exception = e)
+                        prepare_failures.append(sys.exc_info())
+                        continue
+                yield index, sample
+
+        def _upload_sample(pending_sample):
+            index, sample = pending_sample
             try:
-                json_res = self._send_sequence_files(sample, upload_id)
-                json_res_list.append(json_res)
+                json_res_list[index] = self._send_sequence_files(sample, upload_id, stop_upload, upload_journal,
+                                                                 compute_qc_stats)
             except Exception, e:
                 logging.error("The upload failed for unexpected reasons, informing the UI.")
                 send_message(sample.upload_failed_topic, exception = e)
                 raise
+
+        logging.info("Uploading {} samples with {} concurrent uploads.".format(len(samples_list), worker_count))
+        map_concurrently(_upload_sample, _prepared_samples(), worker_count, name="SequenceFileUploader",
+                         should_stop=stop_upload.is_set)
+
+        if prepare_failures:
+            exc_type, exc_value, exc_traceback = prepare_failures[0]
+            raise exc_type, exc_value, exc_traceback
+
+        if stop_upload.is_set():
+            raise SequenceFileError("Upload halted on user request.", [])
+
         return json_res_list
 
     def _kill_connections(self):
         """Terminate any currently running uploads.
 
-        This method simply sets a flag to instruct any in-progress generators called
-        by `_send_sequence_files` below to stop generating data and raise an exception
-        that will set the run to an error state on the server.
+        This method simply sets the stop event of each `send_sequence_files` call in
+        progress to instruct the generators called by `_send_sequence_files` below to
+        stop generating data and raise an exception that will set the run to an error
+        state on the server.
         """
 
-        self._stop_upload = True
+        with self._upload_stop_lock:
+            for stop_upload in self._upload_stop_events:
+                stop_upload.set()
         self.session.close()
 
-    def _send_sequence_files(self, sample, upload_id):
+    def _send_sequence_files(self, sample, upload_id, stop_upload, upload_journal=None, compute_qc_stats=False):
 
         """
         post request to send sequence files found in given sample argument
@@ -601,12 +1285,16 @@ class ApiCalls(object):
         arguments:
             sample -- Sample object
             upload_id -- the run to upload the files to
+            stop_upload -- the threading.Event that's set to halt the upload
+            upload_journal -- an UploadJournal to send the files in resumable
+                              chunks with, or None to send them in one request
+            compute_qc_stats -- calculate the statistics of each file as it's
+                                sent
 
         returns result of post request.
         """
 
         json_res = {}
-        self._stop_upload = False
 
         try:
             project_id = sample.get_project_id()
@@ -631,19 +1319,24 @@ class ApiCalls(object):
                 ["No sample with name [{}] exists in project [{}]".format(sample_id, project_id)])
 
         boundary = "B0undary"
-        read_size = 32768
 
-        def _send_file(filename, parameter_name, bytes_read=0):
+        def _send_file(filename, parameter_name, progress, bytes_read=0):
             """This function is a generator that yields a multipart form-data
-            entry for the specified file. This function will yield `read_size`
-            bytes of the specified file name at a time as the generator is called.
-            This function will also terminate generating data when the field
-            `self._stop_upload` is set.
+            entry for the specified file. This function will yield the file in
+            blocks (see `read_file_blocks`) as the generator is called.
+            This function will also terminate generating data when
+            `stop_upload` is set.
+
+            The MD5 and SHA-256 digests of the file (and its statistics, when
+            they're enabled) are computed from the same blocks as they're
+            sent, and recorded in the sample's `seq_file.checksums` (and
+            `seq_file.qc_stats`) once the whole file has been sent.
 
             Args:
-                filename: the file to read and yield in `read_size` chunks to
-                          the server.
+                filename: the file to read and yield in blocks to the server.
                 parameter_name: the form field name to send to the server.
+                progress: the `ProgressMessages` to report the number of bytes
+                          sent to the UI layer with.
                 bytes_read: used for sending messages to the UI layer indicating
                             the total number of bytes sent when sending the sample
                             to the server.
@@ -655,31 +1348,45 @@ class ApiCalls(object):
             "Content-Disposition: form-data; name=\"{parameter_name}\"; filename=\"{filename}\"\r\n"
             "\r\n").format(boundary=boundary, parameter_name=parameter_name, filename=filename.replace("\\", "/"))
 
-            # Send the contents of the file, read_size bytes at a time until
-            # we've either read the entire file, or we've been instructed to
-            # stop the upload by the UI
+            # Send the contents of the file, a block at a time until we've
+            # either read the entire file, or we've been instructed to stop
+            # the upload by the UI
             logging.info("Starting to send the file {}".format(filename))
-            with open(filename, "rb", read_size) as fastq_file:
-                data = fastq_file.read(read_size)
-                while data and not self._stop_upload:
-                    bytes_read += len(data)
-                    send_message(sample.upload_progress_topic, progress=bytes_read)
-                    yield data
-                    data = fastq_file.read(read_size)
-                logging.info("Finished sending file {}".format(filename))
-                if self._stop_upload:
-                    logging.info("Halting upload on user request.")
-
-        def _send_parameters(parameter_name, parameters):
+            md5 = hashlib.md5()
+            sha256 = hashlib.sha256()
+            qc_stats = FastqStatsStream(filename) if compute_qc_stats else None
+            for block in read_file_blocks(filename):
+                if stop_upload.is_set():
+                    break
+                bytes_read += len(block)
+                md5.update(block)
+                sha256.update(block)
+                if qc_stats:
+                    qc_stats.update(block)
+                progress.update(bytes_read)
+                yield block
+            logging.info("Finished sending file {}".format(filename))
+            if stop_upload.is_set():
+                logging.info("Halting upload on user request.")
+            else:
+                progress.finish()
+                sample.seq_file.checksums[filename] = {"md5": md5.hexdigest(), "sha256": sha256.hexdigest()}
+                if qc_stats:
+                    self._record_qc_stats(sample, filename, qc_stats)
+
+        def _send_parameters(parameter_name, filename):
             """This function is a generator that yields a multipart form-data
-            entry with additional file metadata.
+            entry with additional file metadata. The metadata is only composed
+            when the entry is generated, after the file itself has been sent,
+            so that it includes the checksums of the file.
 
             Args:
                 parameter_name: the form field name to use to send to the server.
-                parameters: a JSON encoded object with the metadata for the file.
+                filename: the file that the metadata is for.
             """
 
             logging.info("Going to send parameters for {}".format(parameter_name))
+            parameters = json.dumps(self._file_metadata(sample, filename, upload_id))
             yield ("\r\n--{boundary}\r\n"
             "Content-Disposition: form-data; name=\"{parameter_name}\"\r\n"
             "Content-Type: application/json\r\n\r\n"
@@ -699,27 +1406,24 @@ class ApiCalls(object):
                 sample: the sample to send to the server
             """
 
-            bytes_read = 0
-
-            file_metadata = sample.get_sample_metadata()
-            file_metadata["miseqRunId"] = str(upload_id)
-            file_metadata_json = json.dumps(file_metadata)
+            progress = ProgressMessages(sample.upload_progress_topic)
 
             if sample.is_paired_end():
                 # Compose a collection of generators to send both files of a paired-end
                 # file set and the corresponding metadata
                 return itertools.chain(
-                    _send_file(filename=sample.get_files()[0], parameter_name="file1"),
-                    _send_file(filename=sample.get_files()[1], parameter_name="file2", bytes_read=path.getsize(sample.get_files()[0])),
-                    _send_parameters(parameter_name="parameters1", parameters=file_metadata_json),
-                    _send_parameters(parameter_name="parameters2", parameters=file_metadata_json),
+                    _send_file(filename=sample.get_files()[0], parameter_name="file1", progress=progress),
+                    _send_file(filename=sample.get_files()[1], parameter_name="file2", progress=progress,
+                               bytes_read=path.getsize(sample.get_files()[0])),
+                    _send_parameters(parameter_name="parameters1", filename=sample.get_files()[0]),
+                    _send_parameters(parameter_name="parameters2", filename=sample.get_files()[1]),
                     _finish_request())
             else:
                 # Compose a generator to send the single file from a single-end
                 # file set and the corresponding metadata.
                 return itertools.chain(
-                    _send_file(filename=sample.get_files()[0], parameter_name="file"),
-                    _send_parameters(parameter_name="parameters", parameters=file_metadata_json),
+                    _send_file(filename=sample.get_files()[0], parameter_name="file", progress=progress),
+                    _send_parameters(parameter_name="parameters", filename=sample.get_files()[0]),
                     _finish_request())
 
         if sample.is_paired_end():
@@ -729,24 +1433,44 @@ class ApiCalls(object):
             logging.info("sending single-end file")
             url = seq_url
 
+        uploads_url = None
+        # every sample has the link if the server supports resumable uploads,
+        # so the links of the other samples aren't looked through once it's missing
+        if upload_journal and self._resumable_uploads_supported is not False:
+            try:
+                uploads_url = self.get_link(seq_url, "sample/sequenceFiles/uploads")
+                self._resumable_uploads_supported = True
+            except KeyError:
+                logging.warning("Resumable uploads are turned on, but the server doesn't support them (they're "
+                                "experimental, IRIDA doesn't have them yet). Each sample is sent in one request, "
+                                "which starts from the beginning again if it's interrupted.")
+                self._resumable_uploads_supported = False
+
         send_message(sample.upload_started_topic)
 
-        logging.info("Sending files to [{}]".format(url))
-        response = self.session.post(url, data=_sample_upload_generator(sample),
-                                     headers={"Content-Type": "multipart/form-data; boundary={}".format(boundary)})
+        if uploads_url:
+            logging.info("Sending files in chunks to [{}]".format(uploads_url))
+            response = resumableupload.send_sequence_files(self, sample, upload_id, url, uploads_url, upload_journal,
+                                                           stop_upload, compute_qc_stats)
+        else:
+            logging.info("Sending files to [{}]".format(url))
+            response = self.session.post(url, data=_sample_upload_generator(sample),
+                                         headers={"Content-Type": "multipart/form-data; boundary={}".format(boundary)})
 
-        if self._stop_upload:
+        if stop_upload.is_set():
             logging.info("Upload was halted on user request, raising exception so that server upload status is set to error state.")
             raise SequenceFileError("Upload halted on user request.", [])
 
         if response.status_code == httplib.CREATED:
             json_res = json.loads(response.text)
             logging.info("Finished uploading sequence files for sample [{}]".format(sample.get_id()))
+            if uploads_url:
+                upload_journal.forget(sample.get_files())
             send_message(sample.upload_completed_topic, sample=sample)
         else:
             e = SequenceFileError("Error {status_code}: {err_msg}\n".format(
                        status_code=str(response.status_code),
-                       err_msg=response.reason))
+                       err_msg=response.reason), [])
             logging.info("Got an error when uploading [{}]: [{}]".format(sample.get_id(), e))
             logging.info(response.text)
             send_message(sample.upload_failed_topic, exception=e)
@@ -754,6 +1478,48 @@ class ApiCalls(object):
 
         return json_res
 
+    def _record_qc_stats(self, sample, filename, qc_stats):
+
+        """
+        record the statistics calculated while sending a file in the sample's
+        seq_file.qc_stats (nothing is recorded if the file couldn't be
+        decompressed)
+
+        arguments:
+            sample -- the Sample that the file belongs to
+            filename -- the file that was sent
+            qc_stats -- the FastqStatsStream that the file was sent through
+        """
+
+        stats = qc_stats.stats()
+        if stats:
+            logging.info("{}: {} reads, {} bases, mean quality {:.2f}".format(
+                filename, stats.reads, stats.bases, stats.mean_quality))
+            sample.seq_file.qc_stats[filename] = stats
+
+    def _file_metadata(self, sample, filename, upload_id):
+
+        """
+        compose the metadata to send with a sequence file
+
+        arguments:
+            sample -- the Sample that the file belongs to
+            filename -- the file the metadata is for
+            upload_id -- the run the file is uploaded to
+
+        returns a dictionary of the sample's metadata, the run ID, and the
+            checksums of the file (if the whole file has been read).
+        """
+
+        file_metadata = dict(sample.get_sample_metadata())
+        file_metadata["miseqRunId"] = str(upload_id)
+        checksums = sample.seq_file.checksums.get(filename)
+        if checksums:
+            file_metadata["uploadMd5"] = checksums["md5"]
+            file_metadata["uploadSha256"] = checksums["sha256"]
+
+        return file_metadata
+
     def create_seq_run(self, metadata_dict):
 
         """
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import logging
+import threading
+from time import time
+from collections import namedtuple
+
+# bump when what's stored changes, so old entries aren't used
+CACHE_VERSION = 1
+
+CachedResponse = namedtuple("CachedResponse", ["etag", "last_modified", "body"])
+
+
+def conditional_headers(cached_response):
+    """The headers that ask the server to only send a resource again if it has
+    changed since cached_response was received.
+    """
+    headers = {}
+    if cached_response.etag:
+        headers["If-None-Match"] = cached_response.etag
+    if cached_response.last_modified:
+        headers["If-Modified-Since"] = cached_response.last_modified
+    return headers
+
+
+class CatalogCache(object):
+    """An on-disk copy of the project and sample lists from the server, and of
+    the access token used to get them.
+
+    Each list is stored with the `ETag` and `Last-Modified` headers that it was
+    sent with, so that it can be revalidated with a conditional request the
+    next time it's needed instead of being downloaded again. Access tokens are
+    stored by server, client and user (never with the password) until they
+    expire; the file is only readable by the user that created it.
+    """
+
+    def __init__(self, cache_path):
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, 0700)
+
+        # the cache has access tokens in it, so nobody else can read it (the
+        # journal files sqlite creates beside it get the same permissions)
+        os.close(os.open(cache_path, os.O_RDWR | os.O_CREAT, 0600))
+        os.chmod(cache_path, 0600)
+
+        # the lists are fetched by several threads at the same time
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_path, timeout=10, check_same_thread=False)
+        self._connection.text_factory = str
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        with self._connection:
+            if version != CACHE_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS responses")
+                self._connection.execute("DROP TABLE IF EXISTS tokens")
+                self._connection.execute("PRAGMA user_version = {}".format(CACHE_VERSION))
+            self._connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                     "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS tokens ("
+                                     "account TEXT PRIMARY KEY, access_token TEXT, expires_at REAL)")
+
+    def _read(self, query, parameters):
+        try:
+            with self._lock:
+                return self._connection.execute(query, parameters).fetchone()
+        except sqlite3.Error:
+            logging.exception("Could not read from the catalog cache.")
+            return None
+
+    def _write(self, query, parameters):
+        # the cache is only a shortcut, everything is fetched from the server
+        # again when it can't be updated
+        try:
+            with self._lock:
+                with self._connection:
+                    self._connection.execute(query, parameters)
+        except sqlite3.Error:
+            logging.exception("Could not update the catalog cache.")
+
+    def response(self, url):
+        """Get the response that was stored for a URL.
+
+        Returns:
+            a `CachedResponse`, or None if there's no response for the URL.
+        """
+        row = self._read("SELECT etag, last_modified, body FROM responses WHERE url = ?", (url,))
+        if row is None:
+            return None
+        return CachedResponse(row[0], row[1], str(row[2]))
+
+    def store_response(self, url, etag, last_modified, body):
+        """Store the body of a response with the headers to revalidate it with.
+
+        Responses that can't be revalidated aren't stored.
+        """
+        if not etag and not last_modified:
+            return
+        self._write("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (url, etag, last_modified, sqlite3.Binary(body)))
+
+    def update_body(self, url, body):
+        """Replace the body stored for a URL, keeping the headers that it's
+        revalidated with (the server still decides whether it has changed).
+        """
+        self._write("UPDATE responses SET body = ? WHERE url = ?", (sqlite3.Binary(body), url))
+
+    def access_token(self, account, margin=0):
+        """Get the access token stored for an account.
+
+        Args:
+            account: the key that the token was stored with.
+            margin: seconds before the token expires that it's no longer used.
+
+        Returns:
+            a tuple (access token, time it expires), or None if there's no
+            token for the account that's still valid.
+        """
+        row = self._read("SELECT access_token, expires_at FROM tokens WHERE account = ?", (account,))
+        if row is None or row[1] - margin <= time():
+            return None
+        return row[0], row[1]
+
+    def store_access_token(self, account, access_token, expires_at):
+        self._write("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)", (account, access_token, expires_at))
+
+    def close(self):
+        self._connection.close()
+
+
+def open_catalog_cache(cache_path):
+    """Open the catalog cache, or return None if it can't be used (everything
+    is then fetched from the server).
+    """
+    try:
+        return CatalogCache(cache_path)
+    except Exception:
+        logging.exception("Could not open the catalog cache {}, fetching every list from the server.".format(
+            cache_path))
+        return None
@@ -17,7 +17,19 @@ default_settings = [SettingsDefault._make(["client_id", ""]),
                     SettingsDefault._make(["baseurl", ""]),
                     SettingsDefault._make(["completion_cmd", ""]),
                     SettingsDefault._make(["default_dir", os.path.expanduser("~")]),
-                    SettingsDefault._make(["monitor_default_dir", "False"])]
+                    SettingsDefault._make(["monitor_default_dir", "False"]),
+                    SettingsDefault._make(["max_concurrent_uploads", "1"]),
+                    # experimental, IRIDA doesn't support resumable uploads yet (see API/resumableupload.py)
+                    SettingsDefault._make(["resumable_uploads", "False"]),
+                    SettingsDefault._make(["max_concurrent_scans", "4"]),
+                    SettingsDefault._make(["upload_qc_stats", "False"]),
+                    SettingsDefault._make(["verify_gzip_crc", "False"]),
+                    SettingsDefault._make(["verify_read_counts", "False"]),
+                    SettingsDefault._make(["pipelined_uploads", "False"]),
+                    SettingsDefault._make(["max_concurrent_sample_requests", "4"]),
+                    SettingsDefault._make(["catalog_cache", "False"]),
+                    SettingsDefault._make(["http_pool_size", "10"]),
+                    SettingsDefault._make(["http_pool_block", "False"])]
 
 if os.path.exists(user_config_file):
     logging.info("Loading configuration settings from {}".format(user_config_file))
@@ -55,6 +67,8 @@ def read_config_option(key, expected_type=None, default_value=None):
             return conf_parser.get("Settings", key)
         elif expected_type is bool:
             return conf_parser.getboolean("Settings", key)
+        elif expected_type is int:
+            return conf_parser.getint("Settings", key)
     except (ValueError, NoOptionError) as e:
         if default_value:
             return default_value
@@ -1,15 +1,21 @@
 import os
+import errno
 import logging
 import time
 import threading
 
-from wx.lib.pubsub import pub
 
-from API.pubsub import send_message
+from API.pubsub import pub, send_message
 from API.directoryscanner import find_runs_in_directory
+from API.inotify import (Inotify, can_watch, IN_CREATE, IN_MOVED_TO, IN_CLOSE_WRITE, IN_ONLYDIR,
+                         IN_ISDIR, IN_MOVE_SELF, IN_IGNORED, IN_Q_OVERFLOW)
 
 toMonitor = True
 TIMEBETWEENMONITOR = 120
+# how often (seconds) the event watcher checks whether monitoring has been stopped
+EVENT_WAIT_TIME = 1
+
+COMPLETED_JOB_INFO = "CompletedJobInfo.xml"
 
 class DirectoryMonitorTopics(object):
     """Topics for monitoring directories for new runs."""
@@ -29,8 +35,8 @@ class RunMonitor(threading.Thread):
         super(RunMonitor, self).__init__(name=name)
 
     def run(self):
-        """Initiate directory monitor. The monitor checks the default
-        directory every 2 minutes
+        """Initiate directory monitor. The monitor watches the default
+        directory for finished runs, or checks it every 2 minutes
         """
         monitor_directory(self._directory, self._condition)
 
@@ -65,8 +71,10 @@ def on_created(directory, cond):
 
 
 def monitor_directory(directory, cond):
-    """Calls the function searches the default directory every 2 minutes unless
-    monitoring is no longer required
+    """Watches the default directory for runs that are finished unless monitoring
+    is no longer required. Runs are found as soon as CompletedJobInfo.xml is written
+    when the filesystem delivers inotify events, otherwise the directory is searched
+    every 2 minutes.
     """
     global toMonitor
     logging.info("Getting ready to monitor directory {}".format(directory))
@@ -74,6 +82,17 @@ def monitor_directory(directory, cond):
     pub.subscribe(stop_monitoring, DirectoryMonitorTopics.shut_down_directory_monitor)
     pub.subscribe(start_monitoring, DirectoryMonitorTopics.start_up_directory_monitor)
     time.sleep(10)
+    if can_watch(directory):
+        try:
+            watch_directory(directory, cond)
+            return
+        except (OSError, IOError):
+            logging.exception("Could not watch {} for new runs, searching it every {} seconds instead.".format(
+                directory, TIMEBETWEENMONITOR))
+    poll_directory(directory, cond)
+
+def poll_directory(directory, cond):
+    """Searches the directory every 2 minutes unless monitoring is no longer required"""
     while toMonitor:
         search_for_upload(directory, cond)
         i = 0
@@ -81,9 +100,83 @@ def monitor_directory(directory, cond):
             time.sleep(10)
             i = i+10
 
-def search_for_upload(directory, cond):
+def watch_directory(directory, cond):
+    """Waits for CompletedJobInfo.xml to be written in the subdirectories of the default
+    directory, and uploads each run as soon as it is, unless monitoring is no longer
+    required.
+
+    The default directory is watched for new run directories, and each run directory
+    that doesn't have a CompletedJobInfo.xml file yet is watched for the file, so runs
+    that are already finished don't use up watches.
+    """
+    watcher = Inotify()
+    # watch descriptor -> run directory being watched for CompletedJobInfo.xml
+    run_watches = {}
+
+    def watch_run(run_directory):
+        try:
+            watch = watcher.add_watch(run_directory, IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVE_SELF | IN_ONLYDIR)
+        except OSError as e:
+            # the directory was removed (or replaced by a file) before it could be watched
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return None
+            raise
+        run_watches[watch] = run_directory
+        return watch
+
+    def stop_watching_run(watch):
+        if run_watches.pop(watch, None):
+            watcher.remove_watch(watch)
+
+    try:
+        root_watch = watcher.add_watch(directory, IN_CREATE | IN_MOVED_TO | IN_ONLYDIR)
+        for name in next(os.walk(directory))[1]:
+            run_directory = os.path.join(directory, name)
+            if not os.path.isfile(os.path.join(run_directory, COMPLETED_JOB_INFO)):
+                watch_run(run_directory)
+        logging.info("Watching {} for new runs.".format(directory))
+
+        # upload the runs that finished before the directory was being watched
+        search_all = True
+        while toMonitor:
+            if search_all:
+                search_all = False
+                search_for_upload(directory, cond, upload_all=True)
+                continue
+
+            finished_runs = []
+            for watch, mask, name in watcher.read_events(timeout=EVENT_WAIT_TIME):
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped, the runs that finished have to be searched for
+                    search_all = True
+                elif mask & IN_IGNORED:
+                    run_watches.pop(watch, None)
+                elif watch == root_watch:
+                    if mask & IN_ISDIR:
+                        run_directory = os.path.join(directory, name)
+                        run_watch = watch_run(run_directory)
+                        # the file may have been written before the watch was added,
+                        # e.g., when a finished run is copied into the directory
+                        if os.path.isfile(os.path.join(run_directory, COMPLETED_JOB_INFO)):
+                            stop_watching_run(run_watch)
+                            finished_runs.append(run_directory)
+                elif mask & IN_MOVE_SELF:
+                    stop_watching_run(watch)
+                elif name == COMPLETED_JOB_INFO and watch in run_watches:
+                    finished_runs.append(run_watches[watch])
+                    stop_watching_run(watch)
+
+            for run_directory in finished_runs:
+                if not toMonitor:
+                    break
+                if not os.path.isfile(os.path.join(run_directory, ".miseqUploaderInfo")):
+                    on_created(os.path.join(run_directory, COMPLETED_JOB_INFO), cond)
+    finally:
+        watcher.close()
+
+def search_for_upload(directory, cond, upload_all=False):
     """loop through subdirectories of the default directory looking for CompletedJobInfo.xml without
-    .miseqUploaderInfo files.
+    .miseqUploaderInfo files. Only the first run found is uploaded unless upload_all is True.
     """
     global toMonitor
 
@@ -94,7 +187,7 @@ def search_for_upload(directory, cond):
     root = next(os.walk(directory))[0]
     dirs = next(os.walk(directory))[1]
     for name in dirs:
-        check_for_comp_job = os.path.join(root, name, "CompletedJobInfo.xml")
+        check_for_comp_job = os.path.join(root, name, COMPLETED_JOB_INFO)
         check_for_miseq = os.path.join(root, name, ".miseqUploaderInfo")
 
         if os.path.isfile(check_for_comp_job):
@@ -103,7 +196,8 @@ def search_for_upload(directory, cond):
                 if toMonitor:
                     on_created(path_to_upload, cond)
                 # After upload, start back at the start of directories
-                return
+                if not upload_all:
+                    return
         # Check each step of loop if monitoring is still required
         if not toMonitor:
             return
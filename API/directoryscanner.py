@@ -1,13 +1,21 @@
 import json
 import logging
 import os
+from collections import namedtuple
+from appdirs import user_data_dir
 from Exceptions.SampleSheetError import SampleSheetError
 from Exceptions.SequenceFileError import SequenceFileError
 from Exceptions.SampleError import SampleError
-from Validation.offlineValidation import validate_sample_sheet, validate_sample_list
-from Parsers.miseqParser import parse_metadata, complete_parse_samples
+from Validation.offlineValidation import (validate_sample_sheet, validate_sample_list, validate_sequence_files,
+                                          validate_read_counts)
+from Parsers.miseqParser import read_sample_sheet, parse_metadata, complete_parse_samples
 from Model.SequencingRun import SequencingRun
 from API.pubsub import send_message
+from API.config import read_config_option
+from API.workerpool import map_concurrently
+from API.scanindex import ScanIndex, run_fingerprint, completion_fingerprint, RUN_PARSED
+
+scan_index_file = os.path.join(user_data_dir("iridaUploader"), "scan-index.sqlite")
 
 
 class DirectoryScannerTopics(object):
@@ -18,6 +26,9 @@ class DirectoryScannerTopics(object):
     missing_files = "missing_files"
 
 
+ValidationSettings = namedtuple("ValidationSettings", ["verify_gzip_crc", "verify_read_counts"])
+
+
 def find_runs_in_directory(directory):
     """Find and validate all runs the specified directory.
 
@@ -25,6 +36,11 @@ def find_runs_in_directory(directory):
     been uploaded. The filter is silent, so no warnings are emitted
     if there is an uploaded run that's found in the directory.
 
+    What was found in each run directory is recorded in the scan index, so
+    run directories that haven't changed since they were last scanned aren't
+    read or parsed again. The sample sheets that do have to be parsed are
+    parsed and validated by `max_concurrent_scans` threads at a time.
+
     Arguments:
     directory -- the directory to find sequencing runs
 
@@ -37,12 +53,16 @@ def find_runs_in_directory(directory):
     """
 
     def find_run_directory_list(run_dir):
-        """Find and return all directories (including this one) in the specified directory.
+        """Find and return all entries (including this directory) in the specified directory.
+
+        The entries aren't checked to be directories here; each one is stat'ed
+        at most once while it's scanned, and the runs that the scan index
+        knows are uploaded aren't checked at all.
 
         Arguments:
         directory -- the directory to find directories in
 
-        Returns: a list of directories including current directory
+        Returns: a list of entries including current directory
         """
 
         # Checks if we can access to the given directory, return empty and log a warning if we cannot.
@@ -51,7 +71,7 @@ def find_runs_in_directory(directory):
                             "can not upload any samples from this directory {}".format(run_dir))
             return []
 
-        dir_list = next(os.walk(run_dir))[1]  # Gets the list of directories in the directory
+        dir_list = os.listdir(run_dir)
         dir_list.append(run_dir)  # Add the current directory to the list too
         return dir_list
 
@@ -78,51 +98,156 @@ def find_runs_in_directory(directory):
                             "can not upload any samples from this directory {}".format(sample_dir))
             return False
 
-        file_list = next(os.walk(sample_dir))[2]  # Gets the list of files in the directory
+        # a run that's unchanged since the last scan has the same status as it did then
+        if scan_index and scan_index.status(sample_dir, fingerprints[sample_dir]) == RUN_PARSED:
+            return True
+
+        file_list = os.listdir(sample_dir)  # Gets the list of entries in the directory
         if 'SampleSheet.csv' in file_list:
             if '.miseqUploaderInfo' in file_list:  # Must check status of upload to determine if upload is completed
                 uploader_info_file = os.path.join(sample_dir, '.miseqUploaderInfo')
                 with open(uploader_info_file, "rb") as reader:
                     info_file = json.load(reader)
-                    return info_file["Upload Status"] != "Complete"  # if True, has samples, not completed uploading
+                    if info_file["Upload Status"] == "Complete":
+                        if scan_index:
+                            scan_index.record_complete(sample_dir, completion_fingerprints[sample_dir])
+                        return False
+                    return True  # has samples, not completed uploading
 
             else:  # SampleSheet.csv with no .miseqUploaderInfo file, has samples not uploaded yet
                 return True
 
         return False  # No SampleSheet.csv, does not have samples
 
+    directory = os.path.abspath(directory)
     logging.info("looking for sample sheet in {}".format(directory))
 
-    sample_sheets = []
-    directory_list = find_run_directory_list(directory)
-    for d in directory_list:
-        current_directory = os.path.join(directory, d)
-        if dir_has_samples_not_uploaded(current_directory):
-            sample_sheets.append(os.path.join(current_directory, 'SampleSheet.csv'))
-
-    logging.info("found sample sheets (filtered): {}".format(", ".join(sample_sheets)))
-
-    # Only appending sheets to the list that do not have errors
-    # The errors are collected to create a list to show the user
-    sequencing_runs = []
-    for sheet in sample_sheets:
-        try:
-            sequencing_runs.append(process_sample_sheet(sheet))
-        except SampleSheetError, e:
-            logging.exception("Failed to parse sample sheet.")
-            send_message(DirectoryScannerTopics.garbled_sample_sheet, sample_sheet=sheet, error=e)
-        except SampleError, e:
-            logging.exception("Failed to parse sample.")
-            send_message(DirectoryScannerTopics.garbled_sample_sheet, sample_sheet=sheet, error=e)
-        except SequenceFileError as e:
-            logging.exception("Failed to find files for sample sheet.")
-            send_message(DirectoryScannerTopics.missing_files, sample_sheet=sheet, error=e)
+    scan_index = open_scan_index()
+    # the fingerprint of each directory is taken before anything in it is read, so
+    # a change made while the directory is being parsed is noticed next time
+    fingerprints = {}
+    completion_fingerprints = {}
+    # runs that were checked with other settings are parsed (and checked) again
+    settings = validation_settings()
+
+    try:
+        sample_sheets = []
+        directory_list = find_run_directory_list(directory)
+        for d in directory_list:
+            current_directory = os.path.join(directory, d)
+            if scan_index:
+                # most of the runs are usually uploaded already, and only their
+                # uploader info file has to be checked to know that they still are
+                completion_fingerprints[current_directory] = completion_fingerprint(current_directory)
+                if scan_index.is_complete(current_directory, completion_fingerprints[current_directory]):
+                    continue
+            if not os.path.isdir(current_directory):
+                continue
+            fingerprints[current_directory] = run_fingerprint(current_directory, settings) if scan_index else None
+            if dir_has_samples_not_uploaded(current_directory):
+                sample_sheets.append(os.path.join(current_directory, 'SampleSheet.csv'))
+
+        logging.info("found sample sheets (filtered): {}".format(", ".join(sample_sheets)))
+
+        runs_by_sheet = {}
+        sheets_to_parse = []
+        for sheet in sample_sheets:
+            sample_dir = os.path.dirname(sheet)
+            sequencing_run = scan_index.parsed_run(sample_dir, fingerprints[sample_dir]) if scan_index else None
+            if sequencing_run is not None:
+                logging.info("Run in {} is unchanged since it was last scanned.".format(sample_dir))
+                send_message(DirectoryScannerTopics.run_discovered, run=sequencing_run)
+                runs_by_sheet[sheet] = sequencing_run
+            else:
+                sheets_to_parse.append(sheet)
+
+        max_concurrent_scans = read_config_option("max_concurrent_scans", expected_type=int, default_value=4)
+        for sheet, sequencing_run in zip(sheets_to_parse, discover_runs(sheets_to_parse, max_concurrent_scans)):
+            runs_by_sheet[sheet] = sequencing_run
+            # the index is only used on this thread, sqlite connections can't be shared
+            if scan_index and sequencing_run:
+                sample_dir = os.path.dirname(sheet)
+                scan_index.record_parsed_run(sample_dir, fingerprints[sample_dir], sequencing_run)
+
+        # Only appending sheets to the list that do not have errors
+        # The errors are collected to create a list to show the user
+        sequencing_runs = [runs_by_sheet[sheet] for sheet in sample_sheets if runs_by_sheet[sheet]]
+    finally:
+        if scan_index:
+            scan_index.close()
 
     send_message(DirectoryScannerTopics.finished_run_scan)
 
     return sequencing_runs
 
 
+def open_scan_index():
+    """Open the scan index, or return None if it can't be used (runs are then
+    found without it).
+    """
+    try:
+        return ScanIndex(scan_index_file)
+    except Exception:
+        logging.exception("Could not open the scan index {}, scanning every run directory.".format(scan_index_file))
+        return None
+
+
+def discover_runs(sample_sheets, max_concurrent_scans=1):
+    """Parse and validate the sample sheets, using a bounded pool of worker threads
+    when there's more than one sheet.
+
+    Most of the time taken by parsing a sheet is waiting for the files on the (often
+    network) disk, so several sheets are parsed at the same time. `run_discovered` is
+    sent as each run is parsed, and sheets that can't be parsed are reported the same
+    way as when they're parsed one at a time. Any other error stops the remaining
+    sheets from being started, and the first one is re-raised once all of the workers
+    have stopped.
+
+    Arguments:
+    sample_sheets -- the `SampleSheet.csv` files to parse
+    max_concurrent_scans -- the maximum number of worker threads
+
+    Returns: a list with the SequencingRun for each sample sheet, in the same order as
+    sample_sheets, or None for the sheets that couldn't be parsed.
+    """
+
+    if max_concurrent_scans <= 1 or len(sample_sheets) <= 1:
+        return [_discover_run(sheet) for sheet in sample_sheets]
+
+    worker_count = min(max_concurrent_scans, len(sample_sheets))
+    logging.info("Parsing {} sample sheets with {} concurrent scans.".format(len(sample_sheets), worker_count))
+    return map_concurrently(_scan_sheet, sample_sheets, worker_count, name="SampleSheetScanner")
+
+
+def _scan_sheet(sample_sheet):
+    """Parse a sample sheet on a worker thread, logging any unexpected error."""
+    try:
+        return _discover_run(sample_sheet)
+    except Exception:
+        logging.exception("Failed to scan sample sheet {}.".format(sample_sheet))
+        raise
+
+
+def _discover_run(sample_sheet):
+    """Parse and validate a sample sheet, telling the UI if it can't be parsed.
+
+    Returns: the SequencingRun for the sample sheet, or None if it couldn't be parsed.
+    """
+
+    try:
+        return process_sample_sheet(sample_sheet)
+    except SampleSheetError, e:
+        logging.exception("Failed to parse sample sheet.")
+        send_message(DirectoryScannerTopics.garbled_sample_sheet, sample_sheet=sample_sheet, error=e)
+    except SampleError, e:
+        logging.exception("Failed to parse sample.")
+        send_message(DirectoryScannerTopics.garbled_sample_sheet, sample_sheet=sample_sheet, error=e)
+    except SequenceFileError as e:
+        logging.exception("Failed to find files for sample sheet.")
+        send_message(DirectoryScannerTopics.missing_files, sample_sheet=sample_sheet, error=e)
+    return None
+
+
 def process_sample_sheet(sample_sheet):
     """Create a SequencingRun object for the specified sample sheet.
 
@@ -134,24 +259,38 @@ def process_sample_sheet(sample_sheet):
     ready to be uploaded.
     """
 
+    logging.info("going to read sample sheet")
+    parsed_sample_sheet = read_sample_sheet(sample_sheet)
+
     logging.info("going to parse metadata")
-    run_metadata = parse_metadata(sample_sheet)
+    run_metadata = parse_metadata(parsed_sample_sheet)
 
     logging.info("going to parse samples")
-    samples = complete_parse_samples(sample_sheet)
+    samples = complete_parse_samples(parsed_sample_sheet)
 
     logging.info("going to build sequencing run")
     sequencing_run = SequencingRun(run_metadata, samples, sample_sheet)
 
     logging.info("going to validate sequencing run")
-    validate_run(sequencing_run)
+    validate_run(sequencing_run, parsed_sample_sheet)
 
     send_message(DirectoryScannerTopics.run_discovered, run=sequencing_run)
 
     return sequencing_run
 
 
-def validate_run(sequencing_run):
+def validation_settings():
+    """Read the settings that decide which checks `validate_run` does.
+
+    The settings are part of the fingerprint of each run in the scan index, so
+    a run that was parsed before a check was turned on is checked again.
+    """
+    return ValidationSettings(
+        verify_gzip_crc=read_config_option("verify_gzip_crc", expected_type=bool, default_value=False),
+        verify_read_counts=read_config_option("verify_read_counts", expected_type=bool, default_value=False))
+
+
+def validate_run(sequencing_run, parsed_sample_sheet=None):
     """Do the validation on a run, its samples, and files.
 
     This function is kinda yucky because the validators should be raising
@@ -159,11 +298,12 @@ def validate_run(sequencing_run):
 
     Arguments:
     sequencing_run -- the run to validate
+    parsed_sample_sheet -- the run's sample sheet, if it's already been read
     """
 
     sample_sheet = sequencing_run.sample_sheet
 
-    validation = validate_sample_sheet(sequencing_run.sample_sheet)
+    validation = validate_sample_sheet(parsed_sample_sheet or sequencing_run.sample_sheet)
     if not validation.is_valid():
         send_message(sequencing_run.offline_validation_topic, run=sequencing_run, errors=validation.get_errors())
         raise SampleSheetError('Sample sheet {} is invalid. Reason:\n {}'.format(sample_sheet, validation.get_errors()),
@@ -173,3 +313,17 @@ def validate_run(sequencing_run):
     if not validation.is_valid():
         raise SampleError('Sample sheet {} is invalid. Reason:\n {}'.format(sample_sheet, validation.get_errors()),
                           validation.error_list())
+
+    settings = validation_settings()
+    # files that were already uploaded aren't sent again, so they aren't checked
+    validation = validate_sequence_files(sequencing_run.samples_to_upload,
+                                         verify_crc=settings.verify_gzip_crc)
+    if not validation.is_valid():
+        raise SequenceFileError('Sample sheet {} has damaged sequence files:\n {}'.format(
+            sample_sheet, validation.get_errors()), validation.error_list())
+
+    if settings.verify_read_counts:
+        validation = validate_read_counts(sequencing_run.samples_to_upload)
+        if not validation.is_valid():
+            raise SequenceFileError('Sample sheet {} has paired-end files that don\'t match:\n {}'.format(
+                sample_sheet, validation.get_errors()), validation.error_list())
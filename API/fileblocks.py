@@ -0,0 +1,51 @@
+from time import time
+
+# the smallest and largest blocks that files are read in
+MIN_READ_SIZE = 64 * 1024
+MAX_READ_SIZE = 4 * 1024 * 1024
+# how long (seconds) the caller should take to consume each block
+TARGET_BLOCK_TIME = 0.1
+
+
+def read_file_blocks(filename, min_read_size=MIN_READ_SIZE, max_read_size=MAX_READ_SIZE,
+                     target_block_time=TARGET_BLOCK_TIME):
+    """Read a file in blocks that are sized by how quickly they're consumed.
+
+    Reading in small blocks means a lot of iterations (and progress messages)
+    for a large file on a fast connection, while large blocks mean that a slow
+    connection only hears about progress (or notices a request to stop) every
+    few seconds. The first block is `min_read_size` bytes; each following
+    block is twice the size of the previous one when the caller consumed the
+    previous block in less than half of `target_block_time`, and half of the
+    size when it took more than twice as long.
+
+    The file is read with `readinto` into a single buffer that's re-used for
+    every block, so no new string is allocated per block.
+
+    Args:
+        filename: the file to read.
+        min_read_size: the smallest block to read.
+        max_read_size: the largest block to read.
+        target_block_time: how long the caller should take with each block.
+
+    Returns:
+        a generator that yields a `memoryview` of each block. The view is only
+        valid until the next block is read; use `block.tobytes()` to keep a copy.
+    """
+    buffer = memoryview(bytearray(max_read_size))
+    read_size = min_read_size
+
+    # the file is unbuffered because readinto already reads big enough blocks
+    with open(filename, "rb", 0) as file_to_read:
+        bytes_in_block = file_to_read.readinto(buffer[:read_size])
+        while bytes_in_block:
+            block_started = time()
+            yield buffer[:bytes_in_block]
+            block_time = time() - block_started
+
+            if block_time < target_block_time / 2.0:
+                read_size = min(read_size * 2, max_read_size)
+            elif block_time > target_block_time * 2:
+                read_size = max(read_size / 2, min_read_size)
+
+            bytes_in_block = file_to_read.readinto(buffer[:read_size])
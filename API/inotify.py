@@ -0,0 +1,163 @@
+import os
+import sys
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import logging
+
+# event masks from <sys/inotify.h>
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOSE_WRITE = 0x00000008
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+_event_header = struct.Struct("iIII")
+
+# network filesystems only deliver events for changes made on this machine, so
+# runs written by the sequencer (or anything else) would never be seen.
+NETWORK_FILESYSTEMS = frozenset(["nfs", "nfs4", "cifs", "smbfs", "smb3", "ncpfs", "afs", "9p",
+                                 "fuse.sshfs", "fuse.glusterfs", "glusterfs", "ceph", "lustre"])
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        # raises AttributeError when the C library doesn't have inotify
+        libc.inotify_init1
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def filesystem_type(directory, mounts_file="/proc/mounts"):
+    """Find the type of the filesystem that a directory is on.
+
+    Args:
+        directory: the directory to check.
+        mounts_file: the file listing the mounted filesystems.
+
+    Returns:
+        the filesystem type (e.g., "ext4" or "nfs"), or None if it's unknown.
+    """
+    directory = os.path.realpath(directory)
+    fs_type = None
+    longest_mount_point = ""
+    try:
+        with open(mounts_file) as mounts:
+            for mount in mounts:
+                fields = mount.split()
+                if len(fields) < 3:
+                    continue
+                # spaces in mount points are escaped as \040
+                mount_point = fields[1].replace("\\040", " ")
+                if ((directory == mount_point or directory.startswith(mount_point.rstrip("/") + "/")) and
+                        len(mount_point) >= len(longest_mount_point)):
+                    longest_mount_point = mount_point
+                    fs_type = fields[2]
+    except IOError:
+        return None
+    return fs_type
+
+
+def can_watch(directory):
+    """Check if inotify events can be used to watch a directory for changes.
+
+    Returns:
+        False on systems without inotify, or when the directory is on a network
+        filesystem, True otherwise.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        _load_libc()
+    except (OSError, AttributeError):
+        logging.info("inotify isn't available.")
+        return False
+
+    fs_type = filesystem_type(directory)
+    if fs_type in NETWORK_FILESYSTEMS or (fs_type or "").startswith("fuse"):
+        logging.info("{} is on a {} filesystem, which doesn't deliver inotify events for changes "
+                     "made by other machines.".format(directory, fs_type))
+        return False
+    return True
+
+
+class Inotify(object):
+    """A minimal wrapper around the Linux inotify API."""
+
+    def __init__(self):
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            self._raise_error()
+        self._buffer = ""
+
+    def _raise_error(self, path=None):
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error), path)
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path, mask):
+        """Start watching a path for the events in `mask`.
+
+        Returns:
+            the watch descriptor for the path.
+        """
+        watch = self._libc.inotify_add_watch(self._fd, path, mask)
+        if watch < 0:
+            self._raise_error(path)
+        return watch
+
+    def remove_watch(self, watch):
+        self._libc.inotify_rm_watch(self._fd, watch)
+
+    def read_events(self, timeout=None):
+        """Wait for events.
+
+        Args:
+            timeout: how long to wait for events (seconds), or None to wait
+                until there are events.
+
+        Returns:
+            a list of `(watch, mask, name)` tuples, empty if no events
+            happened before the timeout.
+        """
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+        if not readable:
+            return []
+
+        self._buffer += os.read(self._fd, 65536)
+        events = []
+        while len(self._buffer) >= _event_header.size:
+            watch, mask, cookie, name_length = _event_header.unpack_from(self._buffer)
+            end = _event_header.size + name_length
+            if len(self._buffer) < end:
+                break
+            name = self._buffer[_event_header.size:end].rstrip("\0")
+            self._buffer = self._buffer[end:]
+            events.append((watch, mask, name))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
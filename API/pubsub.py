@@ -1,10 +1,194 @@
-import wx
+import sys
+import inspect
 import logging
-from wx.lib.pubsub import pub
+import threading
+import weakref
+from time import time
 
-def send_message(message_id, *args, **kwargs):
-    app = wx.GetApp()
-    if app:
-        wx.CallAfter(pub.sendMessage, message_id, *args, **kwargs)
+# progress messages are sent at most this often (seconds) for each topic...
+PROGRESS_INTERVAL = 0.25
+# ...and only once at least this many more bytes have been sent
+PROGRESS_MIN_BYTES = 64 * 1024
+
+class Topic(object):
+    """The topic that a message was sent on, given to listeners that ask for it
+    with a `topic=pub.AUTO_TOPIC` argument."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def getName(self):
+        return self._name
+
+class _Listener(object):
+    """A weak reference to a listener, so that subscribing doesn't keep objects
+    (like panels that have been destroyed) alive."""
+
+    def __init__(self, listener):
+        if inspect.ismethod(listener) and listener.im_self is not None:
+            self._instance = weakref.ref(listener.im_self)
+            self._function = listener.im_func
+            function = listener.im_func
+            skip_args = 1
+        else:
+            self._instance = None
+            self._function = weakref.ref(listener)
+            if inspect.isfunction(listener):
+                function = listener
+                skip_args = 0
+            else:
+                function = listener.__call__.im_func
+                skip_args = 1
+
+        # work out which message arguments the listener takes once, instead of
+        # for every message.
+        spec = inspect.getargspec(function)
+        self._arguments = None if spec.keywords else set(spec.args[skip_args:])
+        self._topic_argument = None
+        for argument, default in zip(reversed(spec.args), reversed(spec.defaults or ())):
+            if default is Publisher.AUTO_TOPIC:
+                self._topic_argument = argument
+
+    def get(self):
+        """Get the listener, or None if it no longer exists."""
+        if self._instance is None:
+            return self._function()
+        instance = self._instance()
+        return None if instance is None else self._function.__get__(instance)
+
+    def matches(self, listener):
+        if self._instance is None:
+            return self._function() is listener
+        return (getattr(listener, "im_func", None) is self._function and
+                getattr(listener, "im_self", None) is self._instance())
+
+    def arguments(self, topic, kwargs):
+        """Select the message arguments that the listener accepts."""
+        if self._arguments is not None:
+            kwargs = dict((argument, value) for argument, value in kwargs.items()
+                          if argument in self._arguments)
+        if self._topic_argument:
+            kwargs[self._topic_argument] = topic
+        return kwargs
+
+class Publisher(object):
+    """A pure-Python replacement for `wx.lib.pubsub.pub`.
+
+    Messages are sent to named topics. Topics are arranged in a tree by their
+    names (the parent of `run.progress.sample` is `run.progress`), and a message
+    sent to a topic is delivered to the listeners of that topic, then the
+    listeners of its parent, and so on up to the root.
+
+    Each listener is called with the keyword arguments of the message that it
+    accepts, and a listener with an argument defaulting to `AUTO_TOPIC` is given
+    the `Topic` that the message was sent to.
+
+    Listeners are called in the thread that sends the message; use
+    `send_message` to send messages that the GUI is listening to.
+    """
+
+    AUTO_TOPIC = object()
+
+    def __init__(self):
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener, topicName):
+        """Call `listener` with the messages sent to `topicName` (and its subtopics)."""
+        with self._lock:
+            listeners = self._listeners.get(topicName, ())
+            if not any(l.matches(listener) for l in listeners):
+                self._listeners[topicName] = listeners + (_Listener(listener),)
+
+    def unsubscribe(self, listener, topicName):
+        """Stop calling `listener` with the messages sent to `topicName`."""
+        with self._lock:
+            listeners = tuple(l for l in self._listeners.get(topicName, ()) if not l.matches(listener))
+            if listeners:
+                self._listeners[topicName] = listeners
+            else:
+                self._listeners.pop(topicName, None)
+
+    def isSubscribed(self, listener, topicName):
+        return any(l.matches(listener) for l in self._listeners.get(topicName, ()))
+
+    def sendMessage(self, topicName, **kwargs):
+        """Send a message to the listeners of `topicName` and its parent topics."""
+        topic = Topic(topicName)
+        name = topicName
+        while name:
+            for listener in self._listeners.get(name, ()):
+                function = listener.get()
+                if function is None:
+                    self._remove_dead(name)
+                else:
+                    function(**listener.arguments(topic, kwargs))
+            name = name.rpartition(".")[0]
+
+    def _remove_dead(self, topicName):
+        with self._lock:
+            listeners = tuple(l for l in self._listeners.get(topicName, ()) if l.get() is not None)
+            if listeners:
+                self._listeners[topicName] = listeners
+            else:
+                self._listeners.pop(topicName, None)
+
+pub = Publisher()
+
+def send_message(message_id, **kwargs):
+    # when the GUI is running (it's the only thing that imports wx), listeners
+    # have to be called on the GUI thread.
+    wx = sys.modules.get("wx")
+    if wx and wx.GetApp():
+        wx.CallAfter(pub.sendMessage, message_id, **kwargs)
     else:
-        pub.sendMessage(message_id, *args, **kwargs)
+        pub.sendMessage(message_id, **kwargs)
+
+class ProgressMessages(object):
+    """Send progress messages for a topic at a limited rate.
+
+    Every progress message sent from an upload thread becomes a `wx.CallAfter`
+    and a dispatch to each listener in the GUI thread, while the GUI only
+    redraws progress once a second. Progress updates are coalesced so that a
+    message is only sent when at least `interval` seconds have passed and at
+    least `min_bytes` more bytes have been sent since the last message.
+    `finish` always sends the latest progress, so listeners see the exact
+    final number of bytes.
+    """
+
+    def __init__(self, message_id, interval=PROGRESS_INTERVAL, min_bytes=PROGRESS_MIN_BYTES):
+        """Initialize `ProgressMessages`.
+
+        Args:
+            message_id: the topic to send the `progress` messages on.
+            interval: the minimum number of seconds between messages.
+            min_bytes: the minimum change in progress between messages.
+        """
+        self._message_id = message_id
+        self._interval = interval
+        self._min_bytes = min_bytes
+        self._progress = 0
+        self._sent_progress = 0
+        self._sent_time = 0
+
+    def update(self, progress):
+        """Record the current progress, sending it if it's been long enough.
+
+        Args:
+            progress: the number of bytes sent so far.
+        """
+        self._progress = progress
+        if progress - self._sent_progress >= self._min_bytes:
+            now = time()
+            if now - self._sent_time >= self._interval:
+                self._send(now)
+
+    def finish(self):
+        """Send the latest progress, if it hasn't already been sent."""
+        if self._progress != self._sent_progress:
+            self._send(time())
+
+    def _send(self, now):
+        self._sent_progress = self._progress
+        self._sent_time = now
+        send_message(self._message_id, progress=self._progress)
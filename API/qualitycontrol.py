@@ -1,25 +1,453 @@
-import gzip
+import os
 import sys
-import wx
-from wx.lib.pubsub import pub
+import zlib
+import logging
+import threading
+import multiprocessing
+from functools import partial
+from collections import namedtuple
+
+from API.pubsub import send_message
+
+# how much of a file is read (before decompressing) at a time
+BLOCK_SIZE = 1024 * 1024
+# quality scores are written as Phred+33 (Illumina 1.8 and later)
+PHRED_OFFSET = 33
+
+GZIP_MAGIC = "\x1f\x8b"
+# the magic number followed by the only compression method (deflate)
+GZIP_MEMBER_START = GZIP_MAGIC + "\x08"
+# decompress gzip (not raw zlib) streams, checking the trailer of each member
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# how much of the end of a file is read to find its last gzip member
+GZIP_TAIL_SIZE = 128 * 1024
+# how much of the end of a file is read first; files written in small members
+# (e.g. by bcl2fastq or bgzip) usually have their last member in here
+GZIP_PROBE_SIZE = 8 * 1024
+
+# what the end of a gzip file shows about it (see gzip_end_status)
+GZIP_COMPLETE = "complete"
+GZIP_TRUNCATED = "truncated"
+GZIP_UNKNOWN = "unknown"
+GZIP_NOT_COMPRESSED = "not compressed"
+
+"""
+Statistics for the reads in a fastq file:
+    reads -- the number of reads
+    bases -- the total length of the reads
+    mean_quality -- the mean quality score of all of the bases (0 if there
+        aren't any)
+    gc_content -- the fraction of the bases that are G or C (0 if there aren't
+        any)
+    length_distribution -- read length -> number of reads with that length
+"""
+FastqStats = namedtuple("FastqStats", ["reads", "bases", "mean_quality", "gc_content", "length_distribution"])
+
+
+class FastqDecompressor(object):
+    """Decompress a .fastq.gz file from blocks of its contents, in any size.
+
+    Files with several gzip members one after another (e.g. written by
+    bcl2fastq or bgzip) are decompressed as one stream, and files that aren't
+    compressed are passed through as they are.
+    """
+
+    def __init__(self):
+        self._compressed = None
+        self._decompressor = None
+
+    def decompress(self, data):
+        """Decompress the next block of the file.
+
+        Returns:
+            the uncompressed data that's available so far (maybe empty).
+        """
+        if self._compressed is None and data:
+            self._compressed = data[:1] == GZIP_MAGIC[:1]
+        if not self._compressed:
+            return data
+
+        blocks = []
+        while data:
+            if self._decompressor is None:
+                # members can be padded with zeroes
+                data = data.lstrip("\x00")
+                if not data:
+                    break
+                self._decompressor = zlib.decompressobj(GZIP_WBITS)
+            blocks.append(self._decompressor.decompress(data))
+            # anything after the end of a member is the start of the next one
+            data = self._decompressor.unused_data
+            if data:
+                self._decompressor = None
+        return "".join(blocks)
+
+    def finished(self):
+        """Whether the data so far ends at the end of a gzip member (data that
+        isn't compressed is always finished).
+        """
+        return not self._compressed or self._decompressor is None or _member_finished(self._decompressor)
+
+
+def _member_finished(decompressor):
+    # anything given to a decompressor after the end of its member is kept in
+    # unused_data, otherwise it's treated as more of the member
+    try:
+        decompressor.decompress("\x00")
+    except zlib.error:
+        return False
+    return decompressor.unused_data.endswith("\x00")
+
+
+def _gzip_member_length(data):
+    """Find the end of the gzip member at the start of data.
+
+    Returns:
+        the length of the member, or None if data ends part of the way through it.
+
+    Raises:
+        zlib.error: if data doesn't start with a valid gzip member (or its CRC
+        or length don't match the data).
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    decompressor.decompress(data)
+    if decompressor.unused_data:
+        return len(data) - len(decompressor.unused_data)
+    return len(data) if _member_finished(decompressor) else None
+
+
+def _gzip_members_status(data, at_start_of_file):
+    # follow the members from the start of data to the end
+    offset = 0
+    while True:
+        try:
+            length = _gzip_member_length(data[offset:])
+        except zlib.error:
+            return None
+        if length is None:
+            # a member that follows a complete member (or starts the file) is
+            # a real member, otherwise the start may have been found by chance
+            return GZIP_TRUNCATED if offset or at_start_of_file else None
+        # members can be padded with zeroes
+        offset = len(data) - len(data[offset + length:].lstrip("\x00"))
+        if offset == len(data):
+            return GZIP_COMPLETE
+
+
+def _gzip_tail_status(tail, tail_start, search_end):
+    position = tail.find(GZIP_MEMBER_START, 0, search_end)
+    while position != -1:
+        status = _gzip_members_status(tail[position:], at_start_of_file=(tail_start + position == 0))
+        if status:
+            return status
+        position = tail.find(GZIP_MEMBER_START, position + 1, search_end)
+    return None
+
+
+def gzip_end_status(filename, tail_size=GZIP_TAIL_SIZE):
+    """Check whether a gzip file was completely written, reading only the end of it.
+
+    Only the end of the file is read (whatever the size of the file): the last
+    `GZIP_PROBE_SIZE` bytes first, then more, up to `tail_size` bytes, only
+    while none of the gzip members that start there can be followed to the
+    end. The members that start in those bytes are decompressed to find
+    whether the last one has its end-of-stream marker and its trailer
+    (checking its CRC and ISIZE). Files written in many small members (e.g. by
+    bcl2fastq or bgzip) and small files can always be checked this way. A
+    large file that's a single member can't, because the end of a deflate
+    stream can't be found without decompressing it from the start; see
+    `gzip_crc_valid` for checking the whole file.
+
+    Args:
+        filename: the file to check.
+        tail_size: the most of the end of the file to read.
+
+    Returns:
+        GZIP_COMPLETE if the file ends with a complete member, GZIP_TRUNCATED
+        if it's empty or ends part of the way through a member, GZIP_UNKNOWN if
+        the last member starts before the part of the file that was read, or
+        GZIP_NOT_COMPRESSED if the file isn't gzip compressed.
+    """
+    with open(filename, "rb") as gzip_file:
+        start = gzip_file.read(len(GZIP_MAGIC))
+        if not start:
+            return GZIP_TRUNCATED
+        elif start != GZIP_MAGIC:
+            return GZIP_NOT_COMPRESSED
+
+        gzip_file.seek(0, os.SEEK_END)
+        file_size = gzip_file.tell()
+        tail = ""
+        tail_start = file_size
+        read_size = min(GZIP_PROBE_SIZE, tail_size)
+        while tail_start > max(0, file_size - tail_size):
+            new_start = max(0, file_size - tail_size, file_size - read_size)
+            gzip_file.seek(new_start)
+            tail = gzip_file.read(tail_start - new_start) + tail
+            # the members that start in what was read before were already
+            # followed to the end, only look for ones that start in what's new
+            status = _gzip_tail_status(tail, new_start, tail_start - new_start + len(GZIP_MEMBER_START) - 1)
+            if status:
+                return status
+            tail_start = new_start
+            read_size *= 4
+    return GZIP_UNKNOWN
+
+
+def gzip_crc_valid(filename, block_size=BLOCK_SIZE):
+    """Decompress a whole gzip file, checking the CRC of every member and that
+    the last member is complete.
+
+    Returns:
+        True if the file is intact (or isn't compressed), False otherwise.
+    """
+    decompressor = FastqDecompressor()
+    try:
+        with open(filename, "rb") as gzip_file:
+            for block in iter(partial(gzip_file.read, block_size), ""):
+                decompressor.decompress(block)
+    except zlib.error:
+        logging.info("{} couldn't be decompressed.".format(filename), exc_info=True)
+        return False
+    return decompressor.finished()
+
+
+# only one caller (e.g. of the threads that scan several runs at the same
+# time) has a pool of processes at a time
+_background_pool_lock = threading.Lock()
+# (path, size, modification time) -> the number of reads in the file
+_read_counts = {}
+_read_counts_lock = threading.Lock()
+
+
+def _map_in_background(function, filenames):
+    """Call function for each file, one file per process.
+
+    Decompressing is limited by the CPU, so the files are read by a pool of
+    processes (one per core) instead of threads. The pool is started for each
+    call and closed and joined before it returns, so no processes are left
+    behind; callers take turns with the pool, so there are never more
+    processes reading files than there are cores.
+    """
+    processes = min(multiprocessing.cpu_count(), len(filenames))
+    if processes <= 1:
+        return [function(filename) for filename in filenames]
+
+    with _background_pool_lock:
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(function, filenames, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+
+def verify_gzip_files(filenames):
+    """Check the CRCs of gzip files (see `gzip_crc_valid`), one file per process.
+
+    Returns:
+        a list with whether each file is intact, in the same order as filenames.
+    """
+    return _map_in_background(gzip_crc_valid, filenames)
+
+
+def count_reads(filename, block_size=BLOCK_SIZE):
+    """Count the reads in a fastq file by counting the lines in each
+    decompressed block, without looking at the records.
+
+    Returns:
+        the number of reads, or None if the file couldn't be decompressed.
+    """
+    decompressor = FastqDecompressor()
+    lines = 0
+    last_block = ""
+    try:
+        with open(filename, "rb") as fastq_file:
+            for block in iter(partial(fastq_file.read, block_size), ""):
+                block = decompressor.decompress(block)
+                if block:
+                    lines += block.count("\n")
+                    last_block = block
+    except zlib.error:
+        logging.info("{} couldn't be decompressed.".format(filename), exc_info=True)
+        return None
+    if last_block and not last_block.endswith("\n"):
+        lines += 1
+    return lines / 4
+
+
+def count_reads_in_files(filenames):
+    """Count the reads in fastq files (see `count_reads`), one file per process.
+
+    The counts are remembered for the path, size and modification time of
+    each file, so a file is only counted again when it has changed.
+
+    Returns:
+        a list with the number of reads in each file (or None for files that
+        couldn't be decompressed), in the same order as filenames.
+    """
+    keys = []
+    for filename in filenames:
+        stat = os.stat(filename)
+        keys.append((os.path.abspath(filename), stat.st_size, stat.st_mtime))
+
+    with _read_counts_lock:
+        to_count = [key for key in keys if key not in _read_counts]
+    counts = _map_in_background(count_reads, [key[0] for key in to_count])
+    with _read_counts_lock:
+        _read_counts.update((key, count) for key, count in zip(to_count, counts) if count is not None)
+        return [_read_counts.get(key) for key in keys]
+
+
+class FastqStatsCounter(object):
+    """Count the reads, bases, quality and GC content of fastq records as
+    blocks of (uncompressed) text are added.
+
+    Blocks don't have to end at a record; the records are counted as they're
+    completed. Each block is handled with a few passes over whole strings
+    (splitting, joining and counting characters) instead of a Python loop over
+    every line.
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.gc_bases = 0
+        self.quality_sum = 0
+        self.quality_count = 0
+        self.length_distribution = {}
+        self._partial = ""
+
+    def add(self, text):
+        lines = (self._partial + text).split("\n")
+        # the last line isn't finished yet, and nor are the lines of the last
+        # record until it has four of them
+        complete = (len(lines) - 1) / 4 * 4
+        self._partial = "\n".join(lines[complete:])
+        del lines[complete:]
+        self._add_records(lines)
+
+    def _add_records(self, lines):
+        if not lines:
+            return
+
+        sequences = lines[1::4]
+        lengths = map(len, sequences)
+        for length in set(lengths):
+            self.length_distribution[length] = self.length_distribution.get(length, 0) + lengths.count(length)
+        self.reads += len(sequences)
+
+        bases = "".join(sequences)
+        self.bases += len(bases)
+        # deleting characters is one pass, counting them would be one pass per character
+        self.gc_bases += len(bases) - len(bases.translate(None, "GCgc"))
+
+        qualities = "".join(lines[3::4])
+        self.quality_sum += sum(bytearray(qualities))
+        self.quality_count += len(qualities)
+
+    def stats(self):
+        """Get the statistics for the records so far, including a last record
+        that isn't followed by a new line.
+        """
+        if self._partial.strip():
+            self._add_records(self._partial.split("\n"))
+            self._partial = ""
+        mean_quality = (float(self.quality_sum) / self.quality_count - PHRED_OFFSET) if self.quality_count else 0
+        gc_content = float(self.gc_bases) / self.bases if self.bases else 0
+        return FastqStats(self.reads, self.bases, mean_quality, gc_content, dict(self.length_distribution))
+
+
+class FastqStatsStream(object):
+    """Calculate the statistics for a fastq file from its contents as they're
+    read for something else (e.g. uploading), so the file isn't read twice.
+
+    Like the `hashlib` objects, `update` is called with each block of the file
+    in order. A file that can't be decompressed doesn't stop the blocks from
+    being read; its statistics are just not available.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._decompressor = FastqDecompressor()
+        self._counter = FastqStatsCounter()
+        self._failed = False
+
+    def update(self, data):
+        if self._failed:
+            return
+        if isinstance(data, memoryview):
+            # the view is re-used for the next block once this returns, and
+            # zlib can't read a memoryview in Python 2, so it's copied here
+            data = data.tobytes()
+        try:
+            self._counter.add(self._decompressor.decompress(data))
+        except zlib.error:
+            logging.warning("Could not decompress {}, not calculating its statistics.".format(self._filename))
+            self._failed = True
+
+    def stats(self):
+        """Get the `FastqStats` for the file, or None if it couldn't be decompressed."""
+        if self._failed:
+            return None
+        return self._counter.stats()
+
+
+def fastq_file_stats(filename, block_size=BLOCK_SIZE):
+    """Calculate the statistics for the reads in a fastq file.
+
+    Args:
+        filename: the .fastq.gz (or .fastq) file.
+        block_size: how much of the file is read at a time.
+
+    Returns:
+        the `FastqStats` for the file.
+    """
+    decompressor = FastqDecompressor()
+    counter = FastqStatsCounter()
+    with open(filename, "rb") as fastq_file:
+        block = fastq_file.read(block_size)
+        while block:
+            counter.add(decompressor.decompress(block))
+            block = fastq_file.read(block_size)
+    return counter.stats()
 
-def parse_fastq(filename):
-    fastq_file = gzip.open(filename)
-    for i, line in enumerate(fastq_file):
-        if i % 4 == 1:
-            yield line.rstrip('\n')
 
 def fastq_stats(filename, event_name=None):
-    total_bases = 0
-    total_reads = 0
-    for sequence in parse_fastq(filename):
-        total_reads += 1
-        total_bases += len(sequence)
+    stats = fastq_file_stats(filename)
     if event_name:
-        wx.CallAfter(pub.sendMessage, event_name, fastq_stats=(total_reads, total_bases))
-    return (total_reads, total_bases)
+        send_message(event_name, fastq_stats=(stats.reads, stats.bases))
+    return (stats.reads, stats.bases)
+
+
+def fastq_stats_for_files(filenames, processes=None):
+    """Calculate the statistics for several fastq files, one file per process.
+
+    Decompressing is limited by the CPU, so each file is handled by a separate
+    process (at most `processes` at a time, defaulting to the number of cores)
+    instead of a thread.
+
+    Args:
+        filenames: the fastq files.
+        processes: the most files to read at the same time.
+
+    Returns:
+        a list with the `FastqStats` for each file, in the same order as filenames.
+    """
+    processes = min(processes or multiprocessing.cpu_count(), len(filenames))
+    if processes <= 1:
+        return [fastq_file_stats(filename) for filename in filenames]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(fastq_file_stats, filenames, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
 
 if __name__ == "__main__":
-    filename = sys.argv[1]
-    (reads, bases) = fastq_stats(filename)
-    print "Total reads: [{}], total bases: [{}].".format(reads, bases)
+    filenames = sys.argv[1:]
+    for filename, stats in zip(filenames, fastq_stats_for_files(filenames)):
+        print "{}: total reads: [{}], total bases: [{}], mean quality: [{:.2f}], GC content: [{:.2%}].".format(
+            filename, stats.reads, stats.bases, stats.mean_quality, stats.gc_content)
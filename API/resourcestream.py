@@ -0,0 +1,115 @@
+import json
+
+_json_decoder = json.JSONDecoder()
+_skip_between_resources = " \t\r\n,"
+
+
+def parse_resources(chunks, array_name="resources", array_depth=2):
+    """Parse the resources in an IRIDA resource collection incrementally.
+
+    IRIDA sends resource collections as a single JSON document, like:
+
+        {"resource": {"links": [...], "resources": [{...}, {...}, ...]}}
+
+    This function yields each entry of the `resources` array as soon as it has
+    been received, so the whole document (which can be tens of MB for a large
+    project) never has to be held in memory, and the caller can stop reading
+    the response as soon as it's found what it's looking for.
+
+    Args:
+        chunks: an iterable of strings containing consecutive parts of the
+            JSON document (e.g., `response.iter_content()`).
+        array_name: the key of the array to parse the entries from.
+        array_depth: the nesting depth of the object with the `array_name` key.
+
+    Raises:
+        ValueError: if the document ends before the array is complete, or the
+            document doesn't contain the array.
+    """
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+
+    # Scan the start of the document until we're just past the opening bracket
+    # of the array. The start of the document only has a few links in it, so
+    # going character by character is fine.
+    depth = 0
+    in_string = False
+    escaped = False
+    string_start = 0
+    last_string = None
+    last_string_end = None
+    expecting_array = False
+    while True:
+        if pos >= len(buf):
+            buf += _next_chunk(chunks)
+        c = buf[pos]
+        pos += 1
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+                last_string = buf[string_start:pos - 1]
+                last_string_end = pos
+        elif expecting_array and c not in " \t\r\n":
+            if c == "[":
+                break
+            expecting_array = False
+        elif c == '"':
+            in_string = True
+            string_start = pos
+        elif c == ":":
+            expecting_array = (depth == array_depth and last_string == array_name and
+                               buf[last_string_end:pos - 1].strip() == "")
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+
+    # Decode each entry of the array in turn, reading more of the document when
+    # an entry hasn't been completely received yet.
+    buf = buf[pos:]
+    pos = 0
+    while True:
+        while pos < len(buf) and buf[pos] in _skip_between_resources:
+            pos += 1
+        if pos >= len(buf):
+            buf = _next_chunk(chunks)
+            pos = 0
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            resource, pos = _json_decoder.raw_decode(buf, pos)
+        except ValueError:
+            # only part of the entry is in the buffer, so keep the part that
+            # we have and try again when there's at least as much again. The
+            # part that's buffered doubles between attempts, so an entry that
+            # spans many chunks is decoded a few times instead of once for
+            # each chunk.
+            parts = [buf[pos:]]
+            buffered = len(parts[0])
+            while buffered < 2 * len(parts[0]):
+                try:
+                    parts.append(_next_chunk(chunks))
+                except ValueError:
+                    # the end of the document is near, try the rest of it
+                    if len(parts) == 1:
+                        raise
+                    break
+                buffered += len(parts[-1])
+            buf = "".join(parts)
+            pos = 0
+        else:
+            yield resource
+
+
+def _next_chunk(chunks):
+    for chunk in chunks:
+        if chunk:
+            return chunk
+    raise ValueError("The resource collection ended before all of the resources were received.")
@@ -0,0 +1,169 @@
+"""Experimental resumable uploads of sequence files.
+
+IRIDA only accepts the files of a sample in one multipart request, which has
+to be sent again from the start when it's interrupted. This module is for
+servers that also support resumable uploads, and is only used when the
+`resumable_uploads` setting is turned on and the server has the links for it.
+
+What the server has to support:
+
+* a `sample/sequenceFiles/uploads` link in each sample's sequence files
+  resource, where uploads are created with the tus protocol
+  (https://tus.io/protocols/resumable-upload.html): `POST` to create an
+  upload, `HEAD` to find how much of it the server has, and `PATCH` to send
+  each chunk.
+* creating the sample's sequence files (or pairs) from a JSON `POST` of the
+  locations of the completed uploads in place of the file contents, with the
+  same file and metadata parameter names as the multipart request.
+"""
+
+import json
+import httplib
+import hashlib
+import logging
+from os import path
+from base64 import b64encode
+from urlparse import urljoin
+
+from Exceptions.SequenceFileError import SequenceFileError
+from API.pubsub import ProgressMessages
+from API.qualitycontrol import FastqStatsStream
+
+# bytes of a file to send in each request when uploading a file in chunks
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+RESUMABLE_UPLOAD_HEADERS = {"Tus-Resumable": "1.0.0"}
+
+
+def send_sequence_files(api, sample, upload_id, url, uploads_url, upload_journal, stop_upload,
+                        compute_qc_stats=False):
+    """Send the sequence files for a sample in chunks, continuing from the last
+    chunk recorded in upload_journal for each file.
+
+    Each file is uploaded to uploads_url, and the sample's files are then
+    created by posting the locations of the uploads (in place of the file
+    contents) and the file metadata to url.
+
+    Args:
+        api: the `ApiCalls` to send the requests with.
+        sample: the `Sample` to send the files of.
+        upload_id: the run to upload the files to.
+        url: the sample's sequence files (or pairs) URL.
+        uploads_url: the URL to create resumable uploads at.
+        upload_journal: the `UploadJournal` to record acknowledged chunks in.
+        stop_upload: the `threading.Event` that's set to halt the upload.
+        compute_qc_stats: calculate the statistics of each file as it's sent.
+
+    Returns:
+        the response to creating the sample's files.
+    """
+    if sample.is_paired_end():
+        parameter_names = [("file1", "parameters1"), ("file2", "parameters2")]
+    else:
+        parameter_names = [("file", "parameters")]
+
+    form = {}
+    bytes_read = 0
+    progress = ProgressMessages(sample.upload_progress_topic)
+    for filename, (file_parameter, metadata_parameter) in zip(sample.get_files(), parameter_names):
+        form[file_parameter] = _send_file(api, sample, filename, uploads_url, upload_journal, progress,
+                                          stop_upload, compute_qc_stats, bytes_read)
+        form[metadata_parameter] = api._file_metadata(sample, filename, upload_id)
+        bytes_read += path.getsize(filename)
+
+    logging.info("Creating sequence files from uploads at [{}]".format(url))
+    return api.session.post(url, json.dumps(form), headers={"Content-Type": "application/json"})
+
+
+def _send_file(api, sample, filename, uploads_url, upload_journal, progress, stop_upload, compute_qc_stats=False,
+               bytes_read=0):
+    """Upload a file in chunks of UPLOAD_CHUNK_SIZE bytes, recording each chunk
+    that the server acknowledges in upload_journal.
+
+    If the journal has an upload for the file, the server is asked how much of
+    the file it has, and the upload continues from there. The checksums of the
+    file (and its statistics, when they're enabled) are recorded in the
+    sample's seq_file.checksums (and seq_file.qc_stats); the part of the file
+    that the server already has is read again to compute them.
+
+    Args:
+        api: the `ApiCalls` to send the requests with.
+        sample: the `Sample` that the file belongs to.
+        filename: the file to upload.
+        uploads_url: the URL to create resumable uploads at.
+        upload_journal: the `UploadJournal` to record acknowledged chunks in.
+        progress: the `ProgressMessages` to report bytes sent with.
+        stop_upload: the `threading.Event` that's set to halt the upload.
+        compute_qc_stats: calculate the statistics of the file as it's sent.
+        bytes_read: bytes of the sample already sent (for progress messages).
+
+    Returns:
+        the location of the completed upload on the server.
+    """
+    file_size = path.getsize(filename)
+    location, offset = upload_journal.committed(filename)
+
+    if location:
+        response = api.session.head(location, headers=RESUMABLE_UPLOAD_HEADERS)
+        if response.status_code == httplib.OK:
+            offset = int(response.headers["Upload-Offset"])
+            logging.info("Resuming upload of {} from byte {}".format(filename, offset))
+        else:
+            logging.info("The server no longer has the partial upload of {}, starting again.".format(filename))
+            location = None
+
+    if not location:
+        headers = dict(RESUMABLE_UPLOAD_HEADERS)
+        headers["Upload-Length"] = str(file_size)
+        headers["Upload-Metadata"] = "filename " + b64encode(path.basename(filename))
+        response = api.session.post(uploads_url, headers=headers)
+        if response.status_code != httplib.CREATED:
+            raise SequenceFileError("Error {status_code}: {err_msg}\n".format(
+                status_code=str(response.status_code),
+                err_msg=response.reason), [])
+        location = urljoin(uploads_url, response.headers["Location"])
+        offset = 0
+        upload_journal.record(filename, location, offset)
+
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    qc_stats = FastqStatsStream(filename) if compute_qc_stats else None
+    with open(filename, "rb") as fastq_file:
+        while fastq_file.tell() < offset:
+            data = fastq_file.read(min(UPLOAD_CHUNK_SIZE, offset - fastq_file.tell()))
+            md5.update(data)
+            sha256.update(data)
+            if qc_stats:
+                qc_stats.update(data)
+
+        while offset < file_size:
+            if stop_upload.is_set():
+                logging.info("Halting upload on user request.")
+                raise SequenceFileError("Upload halted on user request.", [])
+
+            fastq_file.seek(offset)
+            data = fastq_file.read(UPLOAD_CHUNK_SIZE)
+            headers = dict(RESUMABLE_UPLOAD_HEADERS)
+            headers["Upload-Offset"] = str(offset)
+            headers["Content-Type"] = "application/offset+octet-stream"
+            response = api.session.patch(location, data, headers=headers)
+            if response.status_code != httplib.NO_CONTENT:
+                raise SequenceFileError("Error {status_code}: {err_msg}\n".format(
+                    status_code=str(response.status_code),
+                    err_msg=response.reason), [])
+
+            committed = int(response.headers["Upload-Offset"])
+            # the server may only keep part of the chunk
+            md5.update(data[:committed - offset])
+            sha256.update(data[:committed - offset])
+            if qc_stats:
+                qc_stats.update(data[:committed - offset])
+            offset = committed
+            upload_journal.record(filename, location, offset)
+            progress.update(bytes_read + offset)
+
+    progress.finish()
+    sample.seq_file.checksums[filename] = {"md5": md5.hexdigest(), "sha256": sha256.hexdigest()}
+    if qc_stats:
+        api._record_qc_stats(sample, filename, qc_stats)
+    logging.info("Finished sending file {}".format(filename))
+    return location
@@ -1,12 +1,14 @@
 from Validation.onlineValidation import project_exists, sample_exists
 from Exceptions.ProjectError import ProjectError
-from API.pubsub import send_message
+from API.pubsub import pub, send_message
+from API.config import read_config_option
+from API.uploadjournal import UploadJournal
 
 from os import path
-from wx.lib.pubsub import pub
 
 import os
 import json
+import time
 import logging
 import threading
 
@@ -91,6 +93,9 @@ def upload_run_to_server(api, sequencing_run, condition):
 
     filename = path.join(sequencing_run.sample_sheet_dir,
                          ".miseqUploaderInfo")
+    # samples may finish uploading at the same time when uploading concurrently,
+    # so only let one of them update the info file at a time.
+    info_file_lock = threading.Lock()
 
     def _handle_upload_sample_complete(sample=None):
         """Handle the event that happens when a sample has finished uploading.
@@ -98,20 +103,51 @@ def upload_run_to_server(api, sequencing_run, condition):
         """
         if sample is None:
             raise Exception("sample is required!")
-        with open(filename, "rb") as reader:
-            uploader_info = json.load(reader)
-            logging.info(uploader_info)
-            if not 'uploaded_samples' in uploader_info:
-                uploader_info['uploaded_samples'] = list()
-
-            uploader_info['uploaded_samples'].append(sample.get_id())
-        with open(filename, 'wb') as writer:
-            json.dump(uploader_info, writer)
+        with info_file_lock:
+            with open(filename, "rb") as reader:
+                uploader_info = json.load(reader)
+                logging.info(uploader_info)
+                if not 'uploaded_samples' in uploader_info:
+                    uploader_info['uploaded_samples'] = list()
+
+                uploader_info['uploaded_samples'].append(sample.get_id())
+                # the checksums of the files as they were read for the upload,
+                # to verify the files on the server against
+                if not 'checksums' in uploader_info:
+                    uploader_info['checksums'] = dict()
+
+                uploader_info['checksums'].update(sample.seq_file.checksums)
+                # the statistics of the files, when they were calculated while uploading
+                if sample.seq_file.qc_stats:
+                    if not 'qc_stats' in uploader_info:
+                        uploader_info['qc_stats'] = dict()
+
+                    for fastq_file, stats in sample.seq_file.qc_stats.items():
+                        uploader_info['qc_stats'][fastq_file] = stats._asdict()
+            with open(filename, 'wb') as writer:
+                json.dump(uploader_info, writer)
         logging.info("Finished updating info file.")
         pub.unsubscribe(_handle_upload_sample_complete, sample.upload_completed_topic)
 
+    auth_requests_at_start = api.auth_request_count
+    requests_at_start, connections_at_start = api.connection_counts()
+    validation_started_at = time.time()
+    max_concurrent_requests = read_config_option("max_concurrent_sample_requests", expected_type=int,
+                                                 default_value=4)
+
+    pipelined_uploads = read_config_option("pipelined_uploads", expected_type=bool, default_value=False)
+    samples_to_upload = set(sequencing_run.samples_to_upload)
+    # when uploads are pipelined, the samples that are uploaded are checked one
+    # at a time just before their files are sent (see _prepare_sample), and
+    # only the samples that were uploaded before are checked first.
+    if pipelined_uploads:
+        samples_to_check = [sample for sample in sequencing_run.sample_list if sample not in samples_to_upload]
+    else:
+        samples_to_check = sequencing_run.sample_list
+
     # do online validation first.
-    _online_validation(api, sequencing_run)
+    _online_validation(api, samples_to_check, max_concurrent_requests)
+    validation_time = time.time() - validation_started_at
     # then do actual uploading
 
     if not path.exists(filename):
@@ -126,12 +162,24 @@ def upload_run_to_server(api, sequencing_run, condition):
             run_id = uploader_info['Upload ID']
 
     send_message(RunUploaderTopics.start_checking_samples)
-    logging.info("Starting to check samples. [{}]".format(len(sequencing_run.sample_list)))
-    # only send samples that aren't already on the server
-    samples_to_create = filter(lambda sample: not sample_exists(api, sample), sequencing_run.sample_list)
-    logging.info("Sending samples to server: [{}].".format(", ".join([str(x) for x in samples_to_create])))
+    logging.info("Starting to check samples. [{}]".format(len(samples_to_check)))
+    # only send samples that aren't already on the server (all of them are
+    # checked before any are created)
+    checking_started_at = time.time()
+    samples_to_create = filter(lambda sample: not sample_exists(api, sample), samples_to_check)
+    validation_time += time.time() - checking_started_at
+    logging.info("Spent [{:.2f}] seconds validating the run and checking its samples on the server.".format(
+        validation_time))
+    prepare_sample = None
+    if pipelined_uploads:
+        # each sample's files are sent as soon as the sample has been checked
+        # (and created), while the files of the samples before it are being
+        # uploaded
+        prepare_sample = lambda sample: _prepare_sample(api, sample)
     try:
-        api.send_samples(samples_to_create)
+        if samples_to_create:
+            logging.info("Sending samples to server: [{}].".format(", ".join([str(x) for x in samples_to_create])))
+            api.send_samples(samples_to_create, max_concurrent_requests=max_concurrent_requests)
     except Exception as e:
         logging.exception("Encountered error while uploading files to server, updating status of run to error state.")
         api.set_seq_run_error(run_id)
@@ -145,10 +193,21 @@ def upload_run_to_server(api, sequencing_run, condition):
                                                run_id = run_id)
     send_message(sequencing_run.upload_started_topic)
 
-    logging.info("About to start uploading samples.")
+    max_concurrent_uploads = read_config_option("max_concurrent_uploads", expected_type=int, default_value=1)
+    logging.info("About to start uploading samples, [{}] at a time.".format(max_concurrent_uploads))
+    upload_journal = None
+    if read_config_option("resumable_uploads", expected_type=bool, default_value=False):
+        # the journal is kept beside .miseqUploaderInfo so that an interrupted
+        # upload can be continued from the last chunk when the run is resumed
+        upload_journal = UploadJournal(path.join(sequencing_run.sample_sheet_dir, ".miseqUploaderJournal"))
     try:
         api.send_sequence_files(samples_list = sequencing_run.samples_to_upload,
-                                     upload_id = run_id)
+                                     upload_id = run_id,
+                                     max_concurrent_uploads = max_concurrent_uploads,
+                                     upload_journal = upload_journal,
+                                     qc_stats = read_config_option("upload_qc_stats", expected_type=bool,
+                                                                   default_value=False),
+                                     prepare_sample = prepare_sample)
         send_message("finished_uploading_samples", sheet_dir = sequencing_run.sample_sheet_dir)
         send_message(sequencing_run.upload_completed_topic)
         # acquring lock so it can be released so that directory monitoring can resume if it was running
@@ -156,36 +215,72 @@ def upload_run_to_server(api, sequencing_run, condition):
         condition.notify()
         condition.release()
         api.set_seq_run_complete(run_id)
-        _create_miseq_uploader_info_file(sequencing_run.sample_sheet_dir, run_id, "Complete")
+        with info_file_lock:
+            _create_miseq_uploader_info_file(sequencing_run.sample_sheet_dir, run_id, "Complete")
+        if upload_journal:
+            upload_journal.remove()
+        logging.info("Made [{}] authentication requests while uploading the run.".format(
+            api.auth_request_count - auth_requests_at_start))
+        requests_sent, new_connections = api.connection_counts()
+        requests_sent -= requests_at_start
+        new_connections -= connections_at_start
+        logging.info("Sent [{}] requests while uploading the run, [{}] on new connections and [{}] on re-used "
+                     "connections.".format(requests_sent, new_connections, requests_sent - new_connections))
     except Exception as e:
         logging.exception("Encountered error while uploading files to server, updating status of run to error state.")
         api.set_seq_run_error(run_id)
 	raise
 
-def _online_validation(api, sequencing_run):
-    """Do online validation for the specified sequencing run.
+def _prepare_sample(api, sample):
+    """Check a sample's project, and create the sample on the server if it
+    isn't there, just before its files are uploaded.
+
+    Publishes messages:
+    online_validation_failure (params: project_id, sample_id) -- when the sample's project doesn't exist
+    """
+    _validate_project(api, sample)
+    if not sample_exists(api, sample):
+        logging.info("Sending sample to server: [{}].".format(sample))
+        api.send_samples([sample])
+
+def _online_validation(api, samples, max_concurrent_requests=1):
+    """Do online validation for the specified samples of a sequencing run.
+
+    The sample lists of every project in the run are fetched at the same time
+    before the samples are checked, instead of one project at a time.
 
     Arguments:
     api -- the API object to use for interacting with the server
-    sequencing_run -- the run to validate
+    samples -- the samples of the run to validate
+    max_concurrent_requests -- the number of sample lists to fetch at the same time
 
     Publishes messages:
     start_online_validation -- when running online validation
     online_validation_failure (params: project_id, sample_id) -- when the online validation fails
     """
     send_message("start_online_validation")
-    for sample in sequencing_run.sample_list:
-        if not project_exists(api, sample.get_project_id()):
-            send_message("online_validation_failure", project_id=sample.get_project_id(), sample_id=sample.get_id())
-            raise ProjectError("The Sample_Project: {pid} doesn't exist in IRIDA for Sample_Id: {sid}".format(
-                    sid=sample.get_id(),
-                    pid=sample.get_project_id()))
+    if samples:
+        api.prefetch_samples([sample.get_project_id() for sample in samples],
+                             max_concurrent_requests=max_concurrent_requests)
+    for sample in samples:
+        _validate_project(api, sample)
+
+def _validate_project(api, sample):
+    """Check that the project of a sample exists on the server, raising a
+    ProjectError if it doesn't."""
+    if not project_exists(api, sample.get_project_id()):
+        send_message("online_validation_failure", project_id=sample.get_project_id(), sample_id=sample.get_id())
+        raise ProjectError("The Sample_Project: {pid} doesn't exist in IRIDA for Sample_Id: {sid}".format(
+                sid=sample.get_id(),
+                pid=sample.get_project_id()))
 
 def _create_miseq_uploader_info_file(sample_sheet_dir, upload_id, upload_status):
 
     """
-    creates a .miseqUploaderInfo file
-    Contains Upload ID and Upload Status
+    creates a .miseqUploaderInfo file, or updates the one that's there
+    Contains Upload ID and Upload Status (and, once samples have been
+    uploaded, their ids and the checksums and statistics of their files,
+    which are kept when the file is updated)
     Upload ID is is the SequencingRun's identifier in IRIDA
     Upload Status will either be "Complete" or the last sequencing file
     that was uploaded.
@@ -205,9 +300,13 @@ def _create_miseq_uploader_info_file(sample_sheet_dir, upload_id, upload_status)
 
     filename = path.join(sample_sheet_dir,
                          ".miseqUploaderInfo")
-    info = {
+    info = {}
+    if path.exists(filename):
+        with open(filename, "rb") as reader:
+            info = json.load(reader)
+    info.update({
         "Upload ID": upload_id,
         "Upload Status": upload_status
-    }
+    })
     with open(filename, "wb") as writer:
         json.dump(info, writer)
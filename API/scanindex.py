@@ -0,0 +1,175 @@
+import os
+import cPickle as pickle
+import sqlite3
+import logging
+
+# bump when the fingerprint or the pickled models change, so old entries aren't used
+INDEX_VERSION = 5
+
+RUN_COMPLETE = "complete"
+RUN_PARSED = "parsed"
+
+
+def _stat(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+def _listing_stats(directory):
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return None
+    return tuple((name, _stat(os.path.join(directory, name))) for name in names)
+
+
+def run_fingerprint(run_directory, settings=None):
+    """Describe the files in a run directory that parsing the run depends on.
+
+    The sample sheet, every file in the directory with the sequence files and
+    the uploader info file are stat'ed instead of read, so checking whether a
+    run has changed since it was last scanned is cheap even on a network share.
+    A sequence file that's copied again in place changes the fingerprint, so
+    the run is checked again (see `validate_run`).
+
+    Args:
+        run_directory: the directory with SampleSheet.csv in it.
+        settings: the settings the run is validated with, so that runs are
+            parsed again when they change.
+
+    Returns:
+        a string describing the settings and the sizes and modification times of the files, or
+        None if the directory doesn't have a sample sheet.
+    """
+    sample_sheet = _stat(os.path.join(run_directory, "SampleSheet.csv"))
+    if sample_sheet is None:
+        return None
+    return repr((sample_sheet,
+                 _listing_stats(os.path.join(run_directory, "Data", "Intensities", "BaseCalls")),
+                 _stat(os.path.join(run_directory, ".miseqUploaderInfo")),
+                 tuple(settings) if settings is not None else None))
+
+
+def _index_key(run_directory):
+    # the directories being scanned are already absolute, and normalizing
+    # thousands of them again takes as long as looking them up
+    if os.path.isabs(run_directory):
+        return run_directory
+    return os.path.abspath(run_directory)
+
+
+def completion_fingerprint(run_directory):
+    """Describe the uploader info file of a run directory, which is all that
+    decides whether the run is completely uploaded.
+
+    Returns:
+        a string describing the size and modification time of the file, or
+        None if the directory doesn't have one.
+    """
+    uploader_info = _stat(os.path.join(run_directory, ".miseqUploaderInfo"))
+    if uploader_info is None:
+        return None
+    return repr(uploader_info)
+
+
+class ScanIndex(object):
+    """An on-disk record of what was found in each run directory the last time it was scanned.
+
+    Each run directory is stored with either the fact that it's completely
+    uploaded and the fingerprint of its uploader info file (see
+    `completion_fingerprint`), or the `SequencingRun` that was parsed from it
+    and the fingerprint of its files (see `run_fingerprint`). Entries are only
+    used while the fingerprint of the directory is unchanged.
+
+    The fingerprints and statuses of every directory are read when the index is
+    opened, so a directory is looked up without a query; only the runs that
+    are used are read from the file.
+    """
+
+    def __init__(self, index_path):
+        index_dir = os.path.dirname(index_path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+
+        self._connection = sqlite3.connect(index_path, timeout=10)
+        # each run is committed when it's recorded; with a write-ahead log that
+        # doesn't have to wait for the disk (losing the last few entries in a
+        # crash only means those runs are parsed again)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        with self._connection:
+            if version != INDEX_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS runs")
+                self._connection.execute("PRAGMA user_version = {}".format(INDEX_VERSION))
+            self._connection.execute("CREATE TABLE IF NOT EXISTS runs ("
+                                     "directory TEXT PRIMARY KEY, fingerprint TEXT, status TEXT, run BLOB)")
+        self._entries = dict((directory, (fingerprint, status)) for directory, fingerprint, status in
+                             self._connection.execute("SELECT directory, fingerprint, status FROM runs"))
+
+    def _status(self, run_directory, fingerprint):
+        if fingerprint is None:
+            return None
+        entry = self._entries.get(_index_key(run_directory))
+        if entry is None or entry[0] != fingerprint:
+            return None
+        return entry[1]
+
+    def _store(self, run_directory, fingerprint, status, run=None):
+        if fingerprint is None:
+            return
+        # the index is only a shortcut, runs are still found when it can't be updated
+        try:
+            with self._connection:
+                self._connection.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                                         (_index_key(run_directory), fingerprint, status, run))
+        except sqlite3.Error:
+            logging.exception("Could not record {} in the scan index.".format(run_directory))
+        else:
+            self._entries[_index_key(run_directory)] = (fingerprint, status)
+
+    def status(self, run_directory, fingerprint):
+        """Find what the run directory had in it the last time it was scanned.
+
+        Returns:
+            RUN_PARSED if the run was parsed, or None if the directory has
+            changed since (or hasn't been scanned).
+        """
+        status = self._status(run_directory, fingerprint)
+        return status if status == RUN_PARSED else None
+
+    def is_complete(self, run_directory, completion_fingerprint):
+        """Check whether the run was completely uploaded the last time it was
+        scanned, and its uploader info file hasn't changed since.
+        """
+        return self._status(run_directory, completion_fingerprint) == RUN_COMPLETE
+
+    def record_complete(self, run_directory, completion_fingerprint):
+        self._store(run_directory, completion_fingerprint, RUN_COMPLETE)
+
+    def parsed_run(self, run_directory, fingerprint):
+        """Get the `SequencingRun` that was parsed from the run directory the last time it was scanned.
+
+        Returns:
+            a new copy of the run, or None if the directory has changed since
+            (or hasn't been parsed).
+        """
+        if self._status(run_directory, fingerprint) != RUN_PARSED:
+            return None
+        try:
+            run = self._connection.execute("SELECT run FROM runs WHERE directory = ?",
+                                           (_index_key(run_directory),)).fetchone()[0]
+            return pickle.loads(str(run))
+        except Exception:
+            logging.warning("Could not load the run for {} from the scan index.".format(run_directory))
+            return None
+
+    def record_parsed_run(self, run_directory, fingerprint, sequencing_run):
+        self._store(run_directory, fingerprint, RUN_PARSED,
+                    sqlite3.Binary(pickle.dumps(sequencing_run, pickle.HIGHEST_PROTOCOL)))
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,116 @@
+import os
+import json
+import logging
+import threading
+
+
+class UploadJournal(object):
+    """A local record of how much of each file the server has acknowledged.
+
+    Resumable uploads send files to the server in chunks. After the server has
+    acknowledged each chunk, an entry is appended to the journal with the
+    location of the upload on the server and the number of bytes of the file
+    that the server has committed. When an upload is interrupted, the next
+    attempt reads the journal to find where to continue from instead of sending
+    the whole file again.
+
+    The journal is a file with one JSON object per line, so that recording a
+    chunk is a single append. If the uploader is killed while appending, the
+    partially written last line is ignored when the journal is loaded.
+
+    Entries are tied to the size and modification time of the file, so a file
+    that's changed since it was partially uploaded is uploaded from the start.
+    """
+
+    def __init__(self, journal_path):
+        """Initialize an `UploadJournal`, loading any existing entries.
+
+        Args:
+            journal_path: the file to keep the journal in.
+        """
+        self._journal_path = journal_path
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        if os.path.exists(journal_path):
+            with open(journal_path, "rb") as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logging.warn("Ignoring incomplete entry in upload journal {}".format(journal_path))
+                        continue
+                    self._entries[entry["file"]] = entry
+            logging.info("Loaded upload journal {} with entries for {} files.".format(journal_path, len(self._entries)))
+
+    def committed(self, filename):
+        """Get the upload location and committed bytes recorded for a file.
+
+        Args:
+            filename: the file being uploaded.
+
+        Returns:
+            a tuple of the location of the upload on the server and the number
+            of bytes that the server has acknowledged, or `(None, 0)` if there
+            is no (current) entry for the file.
+        """
+        entry = self._entries.get(os.path.abspath(filename))
+        size, mtime = _file_signature(filename)
+
+        if entry and entry["size"] == size and entry["mtime"] == mtime:
+            return entry["location"], entry["offset"]
+        return None, 0
+
+    def record(self, filename, location, offset):
+        """Record that the server has committed `offset` bytes of a file.
+
+        Args:
+            filename: the file being uploaded.
+            location: the location of the upload on the server.
+            offset: the number of bytes of the file that the server has
+                acknowledged.
+        """
+        size, mtime = _file_signature(filename)
+        entry = {"file": os.path.abspath(filename), "size": size, "mtime": mtime,
+                 "location": location, "offset": offset}
+
+        with self._lock:
+            self._entries[entry["file"]] = entry
+            with open(self._journal_path, "ab") as journal:
+                journal.write(json.dumps(entry) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def forget(self, filenames):
+        """Remove the entries for files that have been completely uploaded.
+
+        The journal file is rewritten without the entries, and removed when
+        there are no entries left.
+
+        Args:
+            filenames: the files to remove from the journal.
+        """
+        with self._lock:
+            for filename in filenames:
+                self._entries.pop(os.path.abspath(filename), None)
+
+            if self._entries:
+                with open(self._journal_path, "wb") as journal:
+                    for entry in self._entries.values():
+                        journal.write(json.dumps(entry) + "\n")
+            elif os.path.exists(self._journal_path):
+                os.remove(self._journal_path)
+
+    def remove(self):
+        """Remove the journal once the run it's for has been uploaded, along
+        with the entries of any files that weren't sent in chunks.
+        """
+        with self._lock:
+            self._entries = {}
+            if os.path.exists(self._journal_path):
+                os.remove(self._journal_path)
+
+
+def _file_signature(filename):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime
@@ -0,0 +1,80 @@
+import sys
+import Queue
+import threading
+
+
+def map_concurrently(function, items, max_workers, name="Worker", should_stop=None):
+    """Call a function with each of the items on a bounded pool of worker threads.
+
+    The items are handed to the workers through a queue, each worker calling
+    `function` with one item at a time. `items` can be a generator: it's run on
+    the calling thread, and each item is started as soon as it's produced
+    while the generator produces the next one.
+
+    No new items are started once `function` has raised an exception, or once
+    `should_stop` returns True. Items that are already in progress are allowed
+    to finish, and the first exception is re-raised once all of the workers
+    have stopped.
+
+    Args:
+        function: the function to call with each item.
+        items: the items to call the function with.
+        max_workers: the largest number of worker threads to start.
+        name: the name of the worker threads (numbered from 0).
+        should_stop: a function that returns True when no more items should be
+            started, or None.
+
+    Returns:
+        a list with the result of the function for each item, in the same
+        order as items, or None for the items that weren't started (the list
+        ends at the last item that a generator produced).
+    """
+
+    results = {}
+    failures = []
+    pending_items = Queue.Queue()
+    if hasattr(items, "__len__"):
+        max_workers = min(max_workers, len(items))
+    worker_count = max(1, max_workers)
+
+    def _stopped():
+        return failures or (should_stop and should_stop())
+
+    def _worker():
+        while not _stopped():
+            pending_item = pending_items.get()
+            if pending_item is None:
+                return
+            index, item = pending_item
+
+            try:
+                results[index] = function(item)
+            except Exception:
+                failures.append(sys.exc_info())
+                return
+
+    workers = [threading.Thread(target=_worker, name="{}-{}".format(name, i)) for i in xrange(worker_count)]
+    for worker in workers:
+        worker.start()
+
+    item_count = 0
+    try:
+        for item in items:
+            if _stopped():
+                break
+            pending_items.put((item_count, item))
+            item_count += 1
+    finally:
+        # tell each worker that there are no more items
+        for _ in xrange(worker_count):
+            pending_items.put(None)
+        for worker in workers:
+            worker.join()
+
+    if failures:
+        exc_type, exc_value, exc_traceback = failures[0]
+        raise exc_type, exc_value, exc_traceback
+
+    if hasattr(items, "__len__"):
+        item_count = len(items)
+    return [results.get(index) for index in xrange(item_count)]
@@ -4,13 +4,12 @@ import logging
 
 from os.path import dirname, basename, sep as separator
 
-from wx.lib.pubsub import pub
 from wx.lib.wordwrap import wordwrap
 
 from Exceptions import SampleError, SampleSheetError, SequenceFileError
 from API.directoryscanner import DirectoryScannerTopics
 from API.directorymonitor import DirectoryMonitorTopics
-from API.pubsub import send_message
+from API.pubsub import pub, send_message
 from GUI.SettingsDialog import SettingsDialog
 
 class InvalidSampleSheetsPanel(wx.Panel):
@@ -2,7 +2,7 @@
 import wx
 import logging
 
-from wx.lib.pubsub import pub
+from API.pubsub import pub
 from wx.lib.scrolledpanel import ScrolledPanel
 
 from SamplePanel import SamplePanel
@@ -38,7 +38,7 @@ class RunPanel(ScrolledPanel):
         self._run = run
 
         self._progress_value = 0
-        self._last_progress = 0
+        self._last_progress = {}
         self._last_timer_progress = 0
         self._sample_panels = {}
         self._progress = wx.Gauge(self, id=wx.ID_ANY, range=100, size=(250, 20))
@@ -173,7 +173,7 @@ class RunPanel(ScrolledPanel):
             self.Layout()
             self.Thaw()
 
-    def _handle_progress(self, progress):
+    def _handle_progress(self, progress, topic=pub.AUTO_TOPIC):
         """Update the number of bytes sent provided by the API.
 
         This method will update the number of bytes sent for the current progress
@@ -188,12 +188,19 @@ class RunPanel(ScrolledPanel):
         the `progress` variable will be less, so we reset the diff counter to
         start at 0.
 
+        The last number of bytes sent is tracked separately for each topic that
+        the progress is sent on, because samples can be uploaded concurrently and
+        their progress messages will be interleaved.
+
         Args:
             progress: the number of bytes sent by the uploader
+            topic: the (per-sample) topic that the progress was sent on
         """
-        if progress > self._last_progress:
-            current_progress = progress - self._last_progress
+        topic_name = topic.getName()
+        last_progress = self._last_progress.get(topic_name, 0)
+        if progress > last_progress:
+            current_progress = progress - last_progress
         else:
             current_progress = 0
-        self._last_progress = progress
+        self._last_progress[topic_name] = progress
         self._progress_value += current_progress
@@ -3,8 +3,7 @@ import wx
 import logging
 import threading
 
-from wx.lib.pubsub import pub
-from API.pubsub import send_message
+from API.pubsub import pub, send_message
 from Validation import project_exists
 
 class SamplePanel(wx.Panel):
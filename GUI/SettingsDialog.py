@@ -6,10 +6,9 @@ import logging
 import threading
 import types
 
-from API.pubsub import send_message
+from API.pubsub import pub, send_message
 from API.APIConnector import APIConnectorTopics, connect_to_irida
 from API.config import read_config_option, write_config_option
-from wx.lib.pubsub import pub
 from os import path
 from GUI.ProcessingPlaceholderText import ProcessingPlaceholderText
 
@@ -7,9 +7,8 @@ import os
 import wx.lib.agw.hyperlink as hl
 
 from wx.lib.wordwrap import wordwrap
-from wx.lib.pubsub import pub
 
-from API.pubsub import send_message
+from API.pubsub import pub, send_message
 from API.directoryscanner import find_runs_in_directory, DirectoryScannerTopics
 from API.directorymonitor import RunMonitor, DirectoryMonitorTopics
 from API.runuploader import RunUploader, RunUploaderTopics
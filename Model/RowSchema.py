@@ -0,0 +1,59 @@
+import threading
+from weakref import WeakValueDictionary
+
+
+class RowSchema(object):
+    """
+    The column names shared by rows of values, e.g. the [Data] section of a
+    sample sheet. Each row (a Sample or a SequenceFile) keeps a tuple of its
+    values and a reference to its schema, instead of a dictionary with a copy
+    of every column name.
+    """
+
+    __slots__ = ("keys", "_positions", "_splits", "__weakref__")
+
+    # schemas are shared by every row with the same columns, even across runs,
+    # for as long as there are rows that use them
+    _schemas = WeakValueDictionary()
+    _schemas_lock = threading.Lock()
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self._positions = dict((key, position) for position, key in enumerate(self.keys))
+        self._splits = {}
+
+    @classmethod
+    def for_keys(cls, keys):
+        """Get the schema for the column names, in order."""
+        keys = tuple(keys)
+        with cls._schemas_lock:
+            schema = cls._schemas.get(keys)
+            if schema is None:
+                schema = cls(keys)
+                cls._schemas[keys] = schema
+        return schema
+
+    def position(self, key):
+        """Get the position of a column in the rows, or None if there isn't one."""
+        return self._positions.get(key)
+
+    def split(self, keys):
+        """
+        Split the columns into the ones in keys and the rest, keeping the order
+        of the columns.
+
+        returns a tuple (schema of the columns in keys, their positions,
+            schema of the rest of the columns, their positions)
+        """
+        keys = tuple(keys)
+        split = self._splits.get(keys)
+        if split is None:
+            kept = [position for position, key in enumerate(self.keys) if key in keys]
+            rest = [position for position, key in enumerate(self.keys) if key not in keys]
+            split = (RowSchema.for_keys(self.keys[position] for position in kept), tuple(kept),
+                     RowSchema.for_keys(self.keys[position] for position in rest), tuple(rest))
+            self._splits[keys] = split
+        return split
+
+    def as_dict(self, values):
+        return dict(zip(self.keys, values))
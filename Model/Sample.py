@@ -1,7 +1,10 @@
 import json
 import logging
+
+from Model.RowSchema import RowSchema
 """
-A Sample will store (key: value) pairs using a dictionary.
+A Sample will store (key: value) pairs, with the keys shared by every sample
+in a run (see RowSchema) and the values in a tuple.
 e.g  {"sequencerSampleId": "01-1111"}
 Keys: 'sampleName','description','sequencerSampleId','sampleProject'
 """
@@ -9,22 +12,39 @@ Keys: 'sampleName','description','sequencerSampleId','sampleProject'
 
 class Sample(object):
 
+    __slots__ = ("_schema", "_values", "seq_file", "_run", "_sample_number", "_already_uploaded", "_topics")
+
     def __init__(self, new_samp_dict, run=None, sample_number=None):
-        self.sample_dict = dict(new_samp_dict)
+        keys = new_samp_dict.keys()
+        self._set_row(RowSchema.for_keys(keys), tuple(new_samp_dict[key] for key in keys), run, sample_number)
+
+    @classmethod
+    def from_row(cls, schema, values, run=None, sample_number=None):
+        """Create a sample from a row of values, in the same order as the columns in schema."""
+        sample = cls.__new__(cls)
+        sample._set_row(schema, tuple(values), run, sample_number)
+        return sample
+
+    def _set_row(self, schema, values, run, sample_number):
+        self._schema = schema
+        self._values = values
         self.seq_file = None
         self._run = run
         self._sample_number = sample_number
         self._already_uploaded = False
+        self._topics = None
 
     def get_id(self):
         # When pulling sample records from the server, the sample name *is* the
         # identifier for the sample, so if it's not specified in the dictionary
         # that we're using to build this sample, set it as the sample name that
         # we got from the server.
-        try:
-            return self.sample_dict["sequencerSampleId"]
-        except KeyError:
-            return self.sample_dict["sampleName"]
+        position = self._schema.position("sequencerSampleId")
+        if position is None:
+            position = self._schema.position("sampleName")
+            if position is None:
+                raise KeyError("sampleName")
+        return self._values[position]
 
     @property
     def already_uploaded(self):
@@ -46,13 +66,26 @@ class Sample(object):
         return self.get("sampleProject")
 
     def get_dict(self):
-        return self.sample_dict
+        return self._schema.as_dict(self._values)
+
+    def split_columns(self, keys):
+        """
+        Keep only the columns in keys in this sample.
+
+        returns a tuple (schema, values) of the other columns
+        """
+        kept_schema, kept_positions, rest_schema, rest_positions = self._schema.split(keys)
+        rest_values = tuple(self._values[position] for position in rest_positions)
+        self._values = tuple(self._values[position] for position in kept_positions)
+        self._schema = kept_schema
+        self._topics = None
+        return rest_schema, rest_values
 
     def __getitem__(self, key):
-        ret_val = None
-        if key in self.sample_dict:
-            ret_val = self.sample_dict[key]
-        return ret_val
+        position = self._schema.position(key)
+        if position is None:
+            return None
+        return self._values[position]
 
     def get(self, key):
         return self.__getitem__(key)
@@ -73,27 +106,38 @@ class Sample(object):
         return len(self.seq_file.get_files()) == 2
 
     def __str__(self):
-        return str(self.sample_dict) + str(self.seq_file)
+        return str(self.get_dict()) + str(self.seq_file)
+
+    def _topic(self, index):
+        # the topics are used for every progress message, so they're only built once
+        if self._topics is None:
+            sample_id = "." + self.get_id()
+            self._topics = (self._run.upload_progress_topic + sample_id,
+                            self._run.upload_started_topic + sample_id,
+                            self._run.upload_completed_topic + sample_id,
+                            self._run.upload_failed_topic + sample_id,
+                            self._run.online_validation_topic + sample_id)
+        return self._topics[index]
 
     @property
     def upload_progress_topic(self):
-        return self._run.upload_progress_topic + "." + self.get_id()
+        return self._topic(0)
 
     @property
     def upload_started_topic(self):
-        return self._run.upload_started_topic + "." + self.get_id()
+        return self._topic(1)
 
     @property
     def upload_completed_topic(self):
-        return self._run.upload_completed_topic + "." + self.get_id()
+        return self._topic(2)
 
     @property
     def upload_failed_topic(self):
-        return self._run.upload_failed_topic + "." + self.get_id()
+        return self._topic(3)
 
     @property
     def online_validation_topic(self):
-        return self._run.online_validation_topic + "." + self.get_id()
+        return self._topic(4)
 
     @property
     def run(self):
@@ -103,6 +147,7 @@ class Sample(object):
     def run(self, run):
         logging.info("Setting run.")
         self._run = run
+        self._topics = None
 
     class JsonEncoder(json.JSONEncoder):
 
@@ -1,4 +1,6 @@
 from os import path
+
+from Model.RowSchema import RowSchema
 """
 Holds files and Sample metadata:
 samplePlate
@@ -11,21 +13,55 @@ etc.
 """
 
 
-class SequenceFile:
+class SequenceFile(object):
+
+    __slots__ = ("_schema", "_values", "file_list", "_checksums", "_qc_stats")
 
     def __init__(self, properties_dict, file_list):
-        self.properties_dict = properties_dict  # Sample metadata
+        keys = properties_dict.keys()
+        self._set_row(RowSchema.for_keys(keys), tuple(properties_dict[key] for key in keys), file_list)
+
+    @classmethod
+    def from_row(cls, schema, values, file_list):
+        """Create a sequence file from a row of sample metadata, in the same order as the columns in schema."""
+        sequence_file = cls.__new__(cls)
+        sequence_file._set_row(schema, tuple(values), file_list)
+        return sequence_file
+
+    def _set_row(self, schema, values, file_list):
+        self._schema = schema  # Sample metadata
+        self._values = values
         self.file_list = file_list
         self.file_list.sort()
+        self._checksums = None
+        self._qc_stats = None
+
+    @property
+    def properties_dict(self):
+        return self._schema.as_dict(self._values)
+
+    @property
+    def checksums(self):
+        # {filename: {"md5": ..., "sha256": ...}}, recorded while uploading
+        if self._checksums is None:
+            self._checksums = {}
+        return self._checksums
+
+    @property
+    def qc_stats(self):
+        # {filename: FastqStats}, calculated while uploading (if enabled)
+        if self._qc_stats is None:
+            self._qc_stats = {}
+        return self._qc_stats
 
     def get_properties(self):
         return self.properties_dict
 
     def get(self, key):
-        retVal = None
-        if self.properties_dict in key:
-            retVal = self.properties_dict[key]
-        return retVal
+        position = self._schema.position(key)
+        if position is None:
+            return None
+        return self._values[position]
 
     def get_files_size(self):
         return sum([path.getsize(file) for file in self.file_list])
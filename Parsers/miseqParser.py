@@ -2,17 +2,115 @@ import re
 from os import path, listdir, walk
 from fnmatch import translate as fn_translate
 from csv import reader
-from collections import OrderedDict
-from copy import deepcopy
+from collections import OrderedDict, namedtuple
 import logging
 import json
 
 from Model.Sample import Sample
+from Model.RowSchema import RowSchema
 from Model.SequenceFile import SequenceFile
 from Exceptions.SampleSheetError import SampleSheetError
 from Exceptions.SequenceFileError import SequenceFileError
 
 
+"""
+The sections of a SampleSheet.csv file, tokenized once by read_sample_sheet:
+    path -- the path to SampleSheet.csv
+    sections -- the names of the sections in the order they're found,
+        e.g. ("[Header]", "[Reads]", "[Settings]", "[Data]"). After [Data],
+        only [Header] is recorded (the validator has always looked for it
+        anywhere in the sheet)
+    preamble -- lines with values before the first section
+    header, reads, settings -- lines with values in the [Header], [Reads] and
+        [Settings] sections
+    data_headers -- the line after [Data] (the column names), or None if there
+        isn't one
+    data_rows -- every line after the column names
+Each line is a tuple of the values in the line. Lines in sections that aren't
+used ([Manifests], etc.) and blank lines before [Data] are dropped.
+"""
+ParsedSampleSheet = namedtuple("ParsedSampleSheet", ["path", "sections", "preamble", "header", "reads",
+                                                     "settings", "data_headers", "data_rows"])
+
+"""
+The fastq files in a directory, indexed by the sample name and number in the
+file name:
+    by_name_and_number -- (sample name, sample number) -> list of file names
+    by_name -- sample name -> list of file names (for any sample number)
+"""
+FastqFileIndex = namedtuple("FastqFileIndex", ["by_name_and_number", "by_name"])
+
+# the (translated) columns that are kept in a Sample, the rest are moved to its SequenceFile
+sample_keys = ("sampleName", "description", "sequencerSampleId", "sampleProject")
+
+# this is the Illumina-defined pattern for naming fastq files, from:
+# http://blog.basespace.illumina.com/2014/08/18/fastq-upload-in-now-available-in-basespace/
+fastq_file_name_pattern = re.compile("^(.+)_S(\\d+)_L\\d{3}_R(\\d+)_\\S+\\.fastq.*$")
+
+
+def read_sample_sheet(sample_sheet_file):
+
+    """
+    Read SampleSheet.csv in one pass, so that the metadata parser, the sample
+        parser and the sample sheet validator don't each read the file
+
+    arguments:
+            sample_sheet_file -- path to SampleSheet.csv
+
+    returns a ParsedSampleSheet
+    """
+
+    sections = []
+    lines = {None: [], "[Header]": [], "[Reads]": [], "[Settings]": []}
+    data_headers = None
+    data_rows = []
+
+    section = None
+    csv_reader = get_csv_reader(sample_sheet_file)
+    for line in csv_reader:
+        # the checks are made in the same order the parsers have always made them
+        if "[Header]" in line or "[Settings]" in line:
+            section = "[Header]" if "[Header]" in line else "[Settings]"
+        elif "[Reads]" in line:
+            section = "[Reads]"
+        elif "[Data]" in line:
+            sections.append("[Data]")
+            break
+        elif line and line[0].startswith("["):
+            section = line[0]
+        elif line and line[0] and section in lines:
+            lines[section].append(tuple(line))
+            continue
+        else:
+            continue
+        sections.append(section)
+
+    else:
+        # there's no [Data] section
+        return ParsedSampleSheet(sample_sheet_file, tuple(sections), tuple(lines[None]), tuple(lines["[Header]"]),
+                                 tuple(lines["[Reads]"]), tuple(lines["[Settings]"]), None, ())
+
+    for line in csv_reader:
+        # the lines after [Data] are still all rows, as the sample parser has
+        # always read them
+        if "[Header]" in line:
+            sections.append("[Header]")
+        if data_headers is None:
+            data_headers = tuple(line)
+        else:
+            data_rows.append(tuple(line))
+
+    return ParsedSampleSheet(sample_sheet_file, tuple(sections), tuple(lines[None]), tuple(lines["[Header]"]),
+                             tuple(lines["[Reads]"]), tuple(lines["[Settings]"]), data_headers, tuple(data_rows))
+
+
+def _as_parsed_sample_sheet(sample_sheet):
+    """Read the sample sheet, unless it's already been read"""
+    if isinstance(sample_sheet, ParsedSampleSheet):
+        return sample_sheet
+    return read_sample_sheet(sample_sheet)
+
+
 def parse_metadata(sample_sheet_file):
 
     """
@@ -22,7 +120,8 @@ def parse_metadata(sample_sheet_file):
         metadata_key_translation_dict
 
     arguments:
-            sample_sheet_file -- path to SampleSheet.csv
+            sample_sheet_file -- path to SampleSheet.csv, or a
+                ParsedSampleSheet
 
     returns a dictionary containing the parsed key:pair values from .csv file
     """
@@ -30,8 +129,7 @@ def parse_metadata(sample_sheet_file):
     metadata_dict = {}
     metadata_dict["readLengths"] = []
 
-    csv_reader = get_csv_reader(sample_sheet_file)
-    add_next_line_to_dict = False
+    sample_sheet = _as_parsed_sample_sheet(sample_sheet_file)
 
     metadata_key_translation_dict = {
         'Assay': 'assay',
@@ -49,35 +147,19 @@ def parse_metadata(sample_sheet_file):
         'Project Name': 'projectName'
     }
 
-    section = None
-
-    for line in csv_reader:
-        if "[Header]" in line or "[Settings]" in line:
-            section = "header"
-            continue
-        elif "[Reads]" in line:
-            section = "reads"
-            continue
-        elif "[Data]" in line:
-            break
-        elif line and line[0].startswith("["):
-            section = "unknown"
-            continue
+    if sample_sheet.preamble:
+        raise SampleSheetError("This sample sheet doesn't have any sections.",
+                               ["The sample sheet is missing important sections: no sections were found."])
 
-        if not line or not line[0]:
-            continue
+    for line in sample_sheet.header + sample_sheet.settings:
+        try:
+            key_name = metadata_key_translation_dict[line[0]]
+            metadata_dict[key_name] = line[1]
+        except KeyError:
+            logging.info("Unexpected key in header: [{}]".format(line[0]))
 
-        if not section:
-            raise SampleSheetError("This sample sheet doesn't have any sections.",
-                                   ["The sample sheet is missing important sections: no sections were found."])
-        elif section is "header":
-            try:
-                key_name = metadata_key_translation_dict[line[0]]
-                metadata_dict[key_name] = line[1]
-            except KeyError:
-                logging.info("Unexpected key in header: [{}]".format(line[0]))
-        elif section is "reads":
-            metadata_dict["readLengths"].append(line[0])
+    for line in sample_sheet.reads:
+        metadata_dict["readLengths"].append(line[0])
 
     # currently sends just the larger readLengths
     if len(metadata_dict["readLengths"]) > 0:
@@ -106,7 +188,8 @@ def complete_parse_samples(sample_sheet_file):
     These Sample objects will be stored in a list.
 
     arguments:
-            sample_sheet_file -- path to SampleSheet.csv
+            sample_sheet_file -- path to SampleSheet.csv, or a
+                ParsedSampleSheet
 
     returns list containing complete Sample objects
     """
@@ -135,10 +218,12 @@ def complete_parse_samples(sample_sheet_file):
             n2 = int(re.search(regex_filter, file_list[1]).group(1))
             return (n1 != n2) and (n1 == 1 or n1 == 2) and (n2 == 1 or n2 == 2)
 
-    sample_list = parse_samples(sample_sheet_file)
-    sample_sheet_dir = path.dirname(sample_sheet_file)
+    sample_sheet = _as_parsed_sample_sheet(sample_sheet_file)
+    sample_list = parse_samples(sample_sheet)
+    sample_sheet_dir = path.dirname(sample_sheet.path)
     data_dir = path.join(sample_sheet_dir, "Data", "Intensities", "BaseCalls")
     data_dir_file_list = next(walk(data_dir))[2]  # Create a file list of the data directory, only hit the os once
+    data_dir_file_index = index_fastq_files(data_dir_file_list)
     uploader_info_file = path.join(sample_sheet_dir, ".miseqUploaderInfo")
 
     try:
@@ -148,35 +233,18 @@ def complete_parse_samples(sample_sheet_file):
         uploader_info = None
 
     for sample in sample_list:
-        properties_dict = parse_out_sequence_file(sample)
-        # this is the Illumina-defined pattern for naming fastq files, from:
-        # http://blog.basespace.illumina.com/2014/08/18/fastq-upload-in-now-available-in-basespace/
-        file_pattern = "{sample_name}_S{sample_number}_L\\d{{3}}_R(\\d+)_\\S+\\.fastq.*$".format(
-            sample_name=re.escape(sample.sample_name), sample_number=sample.sample_number)
-        logging.info("Looking for files with pattern {}".format(file_pattern))
-        regex = re.compile(file_pattern)
-        pf_list = filter(regex.search, data_dir_file_list)
+        properties_schema, properties = sample.split_columns(sample_keys)
+        pf_list = find_sample_files(sample, data_dir_file_index, data_dir_file_list)
         if not pf_list:
-            # OK. So we didn't find any files using the **correct** file name
-            # definition according to Illumina. Let's try again with our deprecated
-            # behaviour, where we didn't actually care about the sample number:
-            file_pattern = "{sample_name}_S\\d+_L\\d{{3}}_R(\\d+)_\\S+\\.fastq.*$".format(
-                sample_name=re.escape(sample.get_id()))
-            logging.info("Looking for files with pattern {}".format(file_pattern))
-
-            regex = re.compile(file_pattern)
-            pf_list = filter(regex.search, data_dir_file_list)
-
-            if not pf_list:
-                # we **still** didn't find anything. It's pretty likely, then that
-                # there aren't any fastq files in the directory that match what
-                # the sample sheet says...
-                raise SequenceFileError(
-                    ("The uploader was unable to find an files with a file name that ends with "
-                     ".fastq.gz for the sample in your sample sheet with name {} in the directory {}. "
-                     "This usually happens when the Illumina MiSeq Reporter tool "
-                     "does not generate any FastQ data.").format(
-                        sample.get_id(), data_dir), ["Sample {}".format(sample.get_id())])
+            # we **still** didn't find anything. It's pretty likely, then that
+            # there aren't any fastq files in the directory that match what
+            # the sample sheet says...
+            raise SequenceFileError(
+                ("The uploader was unable to find an files with a file name that ends with "
+                 ".fastq.gz for the sample in your sample sheet with name {} in the directory {}. "
+                 "This usually happens when the Illumina MiSeq Reporter tool "
+                 "does not generate any FastQ data.").format(
+                    sample.get_id(), data_dir), ["Sample {}".format(sample.get_id())])
 
         # List of files may be invalid if directory searching in has been modified by user
         if not validate_pf_list(pf_list):
@@ -189,8 +257,7 @@ def complete_parse_samples(sample_sheet_file):
         for i in xrange(len(pf_list)):
             pf_list[i] = path.join(data_dir, pf_list[i])
 
-        sq = SequenceFile(properties_dict, pf_list)
-        sample.set_seq_file(deepcopy(sq))
+        sample.set_seq_file(SequenceFile.from_row(properties_schema, properties, pf_list))
 
         if uploader_info is not None:
             try:
@@ -203,6 +270,73 @@ def complete_parse_samples(sample_sheet_file):
     return sample_list
 
 
+def index_fastq_files(file_list):
+
+    """
+    Index the fastq files in a directory by the sample name and sample number
+        in their names, so that the files for each sample can be found
+        without searching the whole directory listing for each sample
+
+    arguments:
+            file_list -- the names of the files in the directory
+
+    returns a FastqFileIndex
+    """
+
+    by_name_and_number = {}
+    by_name = {}
+    for file_name in file_list:
+        match = fastq_file_name_pattern.match(file_name)
+        if match:
+            sample_name, sample_number = match.group(1, 2)
+            by_name_and_number.setdefault((sample_name, sample_number), []).append(file_name)
+            by_name.setdefault(sample_name, []).append(file_name)
+
+    return FastqFileIndex(by_name_and_number, by_name)
+
+
+def find_sample_files(sample, file_index, file_list):
+
+    """
+    Find the fastq files for a sample, looking for (in order):
+        files named with the sample name and the sample number (the
+            Illumina-defined file names)
+        files named with the sample ID and any sample number (our
+            deprecated behaviour, where we didn't care about the sample number)
+    Files are looked up in the index by name. Only when that doesn't find any
+        files is the directory listing searched for the patterns anywhere in
+        the file names, as they always used to be.
+
+    arguments:
+            sample -- the Sample to find files for
+            file_index -- a FastqFileIndex of the directory
+            file_list -- the names of the files in the directory
+
+    returns a list of file names, empty if no files were found
+    """
+
+    pf_list = file_index.by_name_and_number.get((sample.sample_name, str(sample.sample_number)))
+    if not pf_list:
+        pf_list = file_index.by_name.get(sample.get_id())
+    if pf_list:
+        return list(pf_list)
+
+    file_pattern = "{sample_name}_S{sample_number}_L\\d{{3}}_R(\\d+)_\\S+\\.fastq.*$".format(
+        sample_name=re.escape(sample.sample_name), sample_number=sample.sample_number)
+    logging.info("Looking for files with pattern {}".format(file_pattern))
+    pf_list = filter(re.compile(file_pattern).search, file_list)
+    if not pf_list:
+        # OK. So we didn't find any files using the **correct** file name
+        # definition according to Illumina. Let's try again with our deprecated
+        # behaviour, where we didn't actually care about the sample number:
+        file_pattern = "{sample_name}_S\\d+_L\\d{{3}}_R(\\d+)_\\S+\\.fastq.*$".format(
+            sample_name=re.escape(sample.get_id()))
+        logging.info("Looking for files with pattern {}".format(file_pattern))
+        pf_list = filter(re.compile(file_pattern).search, file_list)
+
+    return pf_list
+
+
 def parse_samples(sample_sheet_file):
 
     """
@@ -212,13 +346,14 @@ def parse_samples(sample_sheet_file):
     All other keys keep the same name that they have in .csv file
 
     arguments:
-            sample_sheet_file -- path to SampleSheet.csv
+            sample_sheet_file -- path to SampleSheet.csv, or a
+                ParsedSampleSheet
 
     returns	a list containing Sample objects that have been created by a
         dictionary from the parsed out key:pair values from .csv file
     """
 
-    csv_reader = get_csv_reader(sample_sheet_file)
+    sample_sheet = _as_parsed_sample_sheet(sample_sheet_file)
     # start with an ordered dictionary so that keys are ordered in the same
     # way that they are inserted.
     sample_dict = OrderedDict()
@@ -234,28 +369,26 @@ def parse_samples(sample_sheet_file):
     parse_samples.sample_key_translation_dict = sample_key_translation_dict
 
     # initilize dictionary keys from first line (data headers/attributes)
-    set_attributes = False
-    for line in csv_reader:
-
-        if set_attributes:
-            for item in line:
-
-                if item in sample_key_translation_dict:
-                    key_name = sample_key_translation_dict[item]
-                else:
-                    key_name = item
+    for item in sample_sheet.data_headers or ():
 
-                sample_dict[key_name] = ""
+        if item in sample_key_translation_dict:
+            key_name = sample_key_translation_dict[item]
+        else:
+            key_name = item
 
-            break
+        sample_dict[key_name] = ""
 
-        if "[Data]" in line:
-            set_attributes = True
+    # every sample in the sheet shares the column names, only the values are
+    # stored for each sample
+    schema = RowSchema.for_keys(sample_dict.keys())
+    key_count = len(schema.keys)
+    sample_name_position = schema.position("sampleName")
+    sample_id_position = schema.position("sequencerSampleId")
 
-    # fill in values for keys. line is currently below the [Data] headers
-    for sample_number, line in enumerate(csv_reader):
+    # fill in values for keys from the lines below the [Data] headers
+    for sample_number, line in enumerate(sample_sheet.data_rows):
 
-        if len(sample_dict.keys()) != len(line):
+        if key_count != len(line):
             """
             if there is one more Data header compared to the length of
             data values then add an empty string to the end of data values
@@ -266,28 +399,31 @@ def parse_samples(sample_sheet_file):
             Shaun said this issue may come up when a user edits the
             SampleSheet from within the MiSeq software
             """
-            if len(sample_dict.keys()) - len(line) == 1:
-                line.append("")
+            if key_count - len(line) == 1:
+                line = line + ("",)
             else:
                 raise SampleSheetError(
                     "Number of values doesn't match number of " +
                     "[Data] headers. " +
                     ("Number of [Data] headers: {data_len}. " +
                      "Number of values: {val_len}").format(
-                        data_len=len(sample_dict.keys()),
+                        data_len=key_count,
                         val_len=len(line)
                     ), [("Your sample sheet is malformed. I expected to find {} "
                          "columns the [Data] section, but I only found {} columns "
-                         "for line {}.".format(len(sample_dict.keys()), len(line), line))]
+                         "for line {}.".format(key_count, len(line), line))]
                 )
 
-        for index, key in enumerate(sample_dict.keys()):
-            sample_dict[key] = line[index].strip()  # assumes values are never empty
+        values = [value.strip() for value in line[:key_count]]  # assumes values are never empty
 
-        if len(sample_dict["sampleName"]) == 0:
-            sample_dict["sampleName"] = sample_dict["sequencerSampleId"]
+        if sample_name_position is None:
+            raise KeyError("sampleName")
+        if len(values[sample_name_position]) == 0:
+            if sample_id_position is None:
+                raise KeyError("sequencerSampleId")
+            values[sample_name_position] = values[sample_id_position]
 
-        sample = Sample(deepcopy(sample_dict), sample_number=sample_number+1)
+        sample = Sample.from_row(schema, values, sample_number=sample_number+1)
         sample_list.append(sample)
 
     return sample_list
@@ -307,16 +443,8 @@ def parse_out_sequence_file(sample):
         create a SequenceFile object
     """
 
-    sample_keys = ["sampleName", "description",
-                   "sequencerSampleId", "sampleProject"]
-    sequence_file_dict = {}
-    sample_dict = sample.get_dict()
-    for key in sample_dict.keys()[:]:  # iterate through a copy
-        if key not in sample_keys:
-            sequence_file_dict[key] = sample_dict[key]
-            del sample_dict[key]
-
-    return sequence_file_dict
+    properties_schema, properties = sample.split_columns(sample_keys)
+    return properties_schema.as_dict(properties)
 
 
 def get_csv_reader(sample_sheet_file):
@@ -335,14 +463,12 @@ def get_csv_reader(sample_sheet_file):
     """
 
     if path.isfile(sample_sheet_file):
-        csv_file = open(sample_sheet_file, "rb")
-        # strip any trailing newline characters from the end of the line
-        # including Windows newline characters (\r\n)
-        csv_lines = [x.rstrip('\n') for x in csv_file]
-        csv_lines = [x.rstrip('\r') for x in csv_lines]
-
         # open and read file in binary then send it to be parsed by csv's
-        # reader
+        # reader, stripping any trailing newline characters from the end of
+        # the line including Windows newline characters (\r\n)
+        with open(sample_sheet_file, "rb") as csv_file:
+            csv_lines = [x.rstrip('\n').rstrip('\r') for x in csv_file]
+
         csv_reader = reader(csv_lines)
     else:
         msg = sample_sheet_file + " is not a valid SampleSheet file (it's"
@@ -0,0 +1,67 @@
+import pytest
+import gzip
+import random
+import shutil
+import tempfile
+from os import path
+from timeit import default_timer
+
+from API.qualitycontrol import fastq_stats_for_files
+
+FILE_COUNT = 4
+READS_PER_FILE = 100000
+READ_LENGTH = 150
+
+
+def legacy_fastq_stats(filename):
+    """How fastq_stats used to count reads and bases, a line at a time."""
+    total_bases = 0
+    total_reads = 0
+    for i, line in enumerate(gzip.open(filename)):
+        if i % 4 == 1:
+            total_reads += 1
+            total_bases += len(line.rstrip('\n'))
+    return (total_reads, total_bases)
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--benchmark"), reason = "skipped benchmarks")
+class TestFastqStatsBenchmark:
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.filenames = []
+        random.seed(1)
+        # a pool of distinct records, so the files don't compress unrealistically well
+        records = ["@M00000:1:000000000-A0000:1:1101:{}:1 1:N:0:1\n{}\n+\n{}\n".format(
+            i, "".join(random.choice("ACGT") for _ in xrange(READ_LENGTH)),
+            "".join(random.choice("#<FGI") for _ in xrange(READ_LENGTH))) for i in xrange(1000)]
+        for i in xrange(FILE_COUNT):
+            filename = path.join(self.directory, "sample{}_S{}_L001_R1_001.fastq.gz".format(i, i + 1))
+            fastq = gzip.open(filename, "wb", compresslevel=1)
+            for read in xrange(READS_PER_FILE):
+                fastq.write(records[(read * 7 + i) % len(records)])
+            fastq.close()
+            self.filenames.append(filename)
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def _time(self, stats):
+        start = default_timer()
+        result = stats()
+        return default_timer() - start, result
+
+    def test_fastq_stats(self):
+        legacy_time, legacy = self._time(lambda: [legacy_fastq_stats(filename) for filename in self.filenames])
+        single_time, single = self._time(lambda: fastq_stats_for_files(self.filenames, processes=1))
+        pool_time, pooled = self._time(lambda: fastq_stats_for_files(self.filenames))
+
+        megabytes = FILE_COUNT * READS_PER_FILE * (2 * READ_LENGTH + 50) / 1048576.0
+        print ("\nStatistics for {} files ({:.0f} MB uncompressed): line at a time {:.2f}s, "
+               "blocks {:.2f}s, blocks with a process per file {:.2f}s").format(
+            FILE_COUNT, megabytes, legacy_time, single_time, pool_time)
+
+        assert [(stats.reads, stats.bases) for stats in single] == legacy
+        assert pooled == single
+        assert single[0].length_distribution == {READ_LENGTH: READS_PER_FILE}
+        assert single_time < legacy_time
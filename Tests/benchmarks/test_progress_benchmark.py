@@ -0,0 +1,71 @@
+import pytest
+import time
+from mock import patch
+
+from API.pubsub import pub, send_message, ProgressMessages
+
+FILE_SIZE = 1024 * 1024 * 1024
+BLOCK_SIZE = 32768
+# the simulated speed of the connection, in bytes per second
+UPLOAD_RATE = 50 * 1024 * 1024
+
+
+class FakeProgressListener(object):
+    """Does the same work as `RunPanel._handle_progress` for each message, and
+    keeps track of how much CPU time it's taken (what the GUI thread spends)."""
+
+    def __init__(self):
+        self.messages = 0
+        self.cpu_time = 0
+        self._progress_value = 0
+        self._last_progress = {}
+
+    def handle_progress(self, progress, topic=pub.AUTO_TOPIC):
+        start = time.clock()
+        topic_name = topic.getName()
+        last_progress = self._last_progress.get(topic_name, 0)
+        if progress < last_progress:
+            last_progress = 0
+        self._progress_value += progress - last_progress
+        self._last_progress[topic_name] = progress
+        self.messages += 1
+        self.cpu_time += time.clock() - start
+
+
+def upload_progress(report):
+    """Report progress for every block of a file, like `_send_file` did."""
+    start = time.clock()
+    for bytes_read in xrange(BLOCK_SIZE, FILE_SIZE + 1, BLOCK_SIZE):
+        report(bytes_read)
+    return time.clock() - start
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--benchmark"), reason = "skipped benchmarks")
+class TestProgressBenchmark:
+
+    def test_progress_messages(self):
+        every_block = FakeProgressListener()
+        pub.subscribe(every_block.handle_progress, "benchmark.progress")
+        every_block_cpu = upload_progress(
+            lambda bytes_read: send_message("benchmark.progress.sample", progress=bytes_read))
+        pub.unsubscribe(every_block.handle_progress, "benchmark.progress")
+
+        throttled = FakeProgressListener()
+        pub.subscribe(throttled.handle_progress, "benchmark.progress")
+        progress = ProgressMessages("benchmark.progress.sample")
+        # the clock moves as fast as the file would be sent over the connection
+        upload_clock = lambda: float(progress._progress) / UPLOAD_RATE
+        with patch("API.pubsub.time", new=upload_clock):
+            throttled_cpu = upload_progress(progress.update)
+            progress.finish()
+        pub.unsubscribe(throttled.handle_progress, "benchmark.progress")
+
+        print "\nProgress for a {} MB file sent in {} KB blocks at {} MB/s:".format(
+            FILE_SIZE / (1024 * 1024), BLOCK_SIZE / 1024, UPLOAD_RATE / (1024 * 1024))
+        print "every block: {} messages, {:.3f}s CPU in the upload thread, {:.3f}s in the listener".format(
+            every_block.messages, every_block_cpu - every_block.cpu_time, every_block.cpu_time)
+        print "throttled: {} messages, {:.3f}s CPU in the upload thread, {:.3f}s in the listener".format(
+            throttled.messages, throttled_cpu - throttled.cpu_time, throttled.cpu_time)
+
+        assert throttled._progress_value == every_block._progress_value == FILE_SIZE
+        assert throttled.messages < every_block.messages
@@ -0,0 +1,63 @@
+import pytest
+import json
+import httplib
+from timeit import default_timer
+from mock import patch, MagicMock
+
+from API.apiCalls import ApiCalls
+from Model.Sample import Sample
+from Validation.onlineValidation import sample_exists
+
+SERVER_SAMPLE_COUNT = 20000
+LOCAL_SAMPLE_COUNT = 384
+
+
+def linear_sample_exists(api, sample):
+    """The previous implementation of `sample_exists`, kept for comparison."""
+    sample_list = api.get_samples(sample=sample)
+    return any([s.get_id().lower() == sample.get_id().lower() for s in sample_list])
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--benchmark"), reason = "skipped benchmarks")
+class TestSampleLookupBenchmark:
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_sample_exists(self, mock_cs):
+        ApiCalls.close()
+        api = ApiCalls("", "", "", "", "")
+
+        server_samples = [{"sampleName": "Sample-{:05d}".format(i), "identifier": str(i)}
+                          for i in xrange(SERVER_SAMPLE_COUNT)]
+        server_response = json.dumps({"resource": {"resources": server_samples}})
+        response = MagicMock()
+        response.status_code = httplib.OK
+        response.iter_content.side_effect = lambda chunk_size: (server_response[i:i + chunk_size]
+                                                                for i in xrange(0, len(server_response), chunk_size))
+        session = MagicMock()
+        session.get.return_value = response
+        api.session = session
+        api.get_link = lambda x, y, targ_dict="": None
+
+        # half of the local samples are already on the server
+        local_samples = [Sample({"sequencerSampleId": "sample-{:05d}".format(i * 2 * SERVER_SAMPLE_COUNT / LOCAL_SAMPLE_COUNT),
+                                 "sampleName": "sample", "sampleProject": "1"})
+                         for i in xrange(LOCAL_SAMPLE_COUNT)]
+
+        # load the samples into the cache so only the lookups are timed
+        api.get_samples(sample=local_samples[0])
+
+        start = default_timer()
+        linear = [linear_sample_exists(api, sample) for sample in local_samples]
+        linear_time = default_timer() - start
+
+        start = default_timer()
+        indexed = [sample_exists(api, sample) for sample in local_samples]
+        indexed_time = default_timer() - start
+
+        print "\n{} local samples against {} server samples:".format(LOCAL_SAMPLE_COUNT, SERVER_SAMPLE_COUNT)
+        print "linear scan: {:.3f}s, indexed lookup: {:.4f}s ({:.0f}x)".format(
+            linear_time, indexed_time, linear_time / indexed_time)
+
+        assert linear == indexed
+        assert indexed_time < linear_time
+        ApiCalls.close()
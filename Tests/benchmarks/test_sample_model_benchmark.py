@@ -0,0 +1,126 @@
+import pytest
+import sys
+from collections import OrderedDict
+from copy import deepcopy
+from timeit import default_timer
+
+from Parsers.miseqParser import ParsedSampleSheet, parse_samples, sample_keys
+from Model.SequenceFile import SequenceFile
+
+ROW_COUNT = 10000
+
+DATA_HEADERS = ("Sample_ID", "Sample_Name", "Sample_Plate", "Sample_Well", "I7_Index_ID", "index",
+                "I5_Index_ID", "index2", "Sample_Project", "Description")
+
+
+class LegacySample(object):
+    """How a Sample used to be stored: a dictionary of its own, and a free-form instance dictionary."""
+
+    def __init__(self, new_samp_dict, run=None, sample_number=None):
+        self.sample_dict = dict(new_samp_dict)
+        self.seq_file = None
+        self._run = run
+        self._sample_number = sample_number
+        self._already_uploaded = False
+
+
+class LegacySequenceFile:
+
+    def __init__(self, properties_dict, file_list):
+        self.properties_dict = properties_dict
+        self.file_list = file_list
+        self.file_list.sort()
+        self.checksums = {}
+
+
+def legacy_samples(sample_sheet):
+    """Build the samples the way parse_samples and complete_parse_samples used to."""
+    translation = {"Sample_Name": "sampleName", "Description": "description",
+                   "Sample_ID": "sequencerSampleId", "Sample_Project": "sampleProject"}
+    sample_dict = OrderedDict((translation.get(item, item), "") for item in sample_sheet.data_headers)
+    samples = []
+    for sample_number, line in enumerate(sample_sheet.data_rows):
+        for index, key in enumerate(sample_dict.keys()):
+            sample_dict[key] = line[index].strip()
+        samples.append(LegacySample(deepcopy(sample_dict), sample_number=sample_number + 1))
+
+    for sample in samples:
+        properties_dict = {}
+        for key in sample.sample_dict.keys()[:]:
+            if key not in sample_keys:
+                properties_dict[key] = sample.sample_dict.pop(key)
+        sample.seq_file = deepcopy(LegacySequenceFile(properties_dict, [sample.sample_dict["sampleName"] + "_R1.fastq.gz",
+                                                                      sample.sample_dict["sampleName"] + "_R2.fastq.gz"]))
+    return samples
+
+
+def samples(sample_sheet):
+    """Build the samples the way complete_parse_samples does (without looking for files)."""
+    sample_list = parse_samples(sample_sheet)
+    for sample in sample_list:
+        properties_schema, properties = sample.split_columns(sample_keys)
+        sample.set_seq_file(SequenceFile.from_row(properties_schema, properties,
+                                                  [sample.sample_name + "_R1.fastq.gz",
+                                                   sample.sample_name + "_R2.fastq.gz"]))
+    return sample_list
+
+
+def deep_size(objects):
+    """The memory used by the objects and everything they refer to, counting shared objects once."""
+    seen = set()
+    pending = list(objects)
+    size = 0
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or obj is None or isinstance(obj, (int, bool, type)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set)):
+            pending.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                pending.append(obj.__dict__)
+            for slots in (getattr(cls, "__slots__", ()) for cls in type(obj).__mro__):
+                pending.extend(getattr(obj, slot, None) for slot in slots)
+    return size
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--benchmark"), reason = "skipped benchmarks")
+class TestSampleModelBenchmark:
+
+    def setup_method(self, method):
+        rows = tuple(("{0:05d}".format(i), "sample-{}".format(i), "1", "A01", "N701", "TAAGGCGA", "S502", "CTCTCTAT",
+                      str(i % 7), "") for i in xrange(ROW_COUNT))
+        self.sample_sheet = ParsedSampleSheet("SampleSheet.csv", ("[Data]",), (), (), (), (), DATA_HEADERS, rows)
+
+    def _time(self, build):
+        start = default_timer()
+        result = build(self.sample_sheet)
+        return default_timer() - start, result
+
+    def test_sample_memory(self):
+        legacy_time, legacy = self._time(legacy_samples)
+        new_time, new = self._time(samples)
+
+        # the values are the same strings either way, only the containers are compared
+        values = set()
+        for sample in new:
+            values.update(sample.get_dict().values())
+            values.update(sample.get_sample_metadata().values())
+            values.update(sample.get_files())
+        values_size = deep_size(values)
+        legacy_size = deep_size(legacy) - values_size
+        new_size = deep_size(new) - values_size
+
+        print "\nBuilding {} samples: dictionaries {:.3f}s {:.1f}MB, shared columns {:.3f}s {:.1f}MB".format(
+            ROW_COUNT, legacy_time, legacy_size / 1048576.0, new_time, new_size / 1048576.0)
+
+        assert [sample.get_dict() for sample in new] == [sample.sample_dict for sample in legacy]
+        assert [sample.get_sample_metadata() for sample in new] == [sample.seq_file.properties_dict
+                                                                    for sample in legacy]
+        assert new_size < legacy_size / 2
+        assert new_time < legacy_time
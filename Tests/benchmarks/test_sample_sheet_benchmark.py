@@ -0,0 +1,56 @@
+import pytest
+import os
+import shutil
+import tempfile
+from timeit import default_timer
+
+from Parsers.miseqParser import read_sample_sheet, parse_metadata, parse_samples
+from Validation.offlineValidation import validate_sample_sheet
+
+ROW_COUNT = 10000
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--benchmark"), reason = "skipped benchmarks")
+class TestSampleSheetBenchmark:
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.sample_sheet = os.path.join(self.directory, "SampleSheet.csv")
+        with open(self.sample_sheet, "wb") as sample_sheet:
+            sample_sheet.write("[Header]\r\nIEMFileVersion,4\r\nWorkflow,GenerateFASTQ\r\n\r\n"
+                               "[Reads]\r\n251\r\n251\r\n\r\n[Settings]\r\nReverseComplement,0\r\n\r\n[Data]\r\n"
+                               "Sample_ID,Sample_Name,Sample_Plate,Sample_Well,I7_Index_ID,index,"
+                               "I5_Index_ID,index2,Sample_Project,Description\r\n")
+            for i in xrange(ROW_COUNT):
+                sample_sheet.write("{0:05d},sample-{0},1,A01,N701,TAAGGCGA,S502,CTCTCTAT,{1},\r\n".format(i, i % 7))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def _time(self, parse):
+        start = default_timer()
+        result = parse()
+        return default_timer() - start, result
+
+    def test_parse_sheet(self):
+        def read_each_time():
+            # how the parsers and validator used to be called, each reading the sheet
+            return (parse_metadata(self.sample_sheet), parse_samples(self.sample_sheet),
+                    validate_sample_sheet(self.sample_sheet))
+
+        def read_once():
+            sample_sheet = read_sample_sheet(self.sample_sheet)
+            return (parse_metadata(sample_sheet), parse_samples(sample_sheet), validate_sample_sheet(sample_sheet))
+
+        read_time, sheet = self._time(lambda: read_sample_sheet(self.sample_sheet))
+        each_time, (each_metadata, each_samples, each_validation) = self._time(read_each_time)
+        once_time, (once_metadata, once_samples, once_validation) = self._time(read_once)
+
+        print "\nParsing a {}-row sample sheet: tokenizing {:.3f}s, read three times {:.3f}s, read once {:.3f}s".format(
+            ROW_COUNT, read_time, each_time, once_time)
+
+        assert len(sheet.data_rows) == ROW_COUNT
+        assert once_metadata == each_metadata
+        assert [sample.get_dict() for sample in once_samples] == [sample.get_dict() for sample in each_samples]
+        assert once_validation.is_valid() and each_validation.is_valid()
+        assert once_time < each_time
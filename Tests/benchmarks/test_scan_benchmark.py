@@ -0,0 +1,108 @@
+import pytest
+import os
+import json
+import shutil
+import tempfile
+import __builtin__
+from os import path
+from timeit import default_timer
+
+from mock import patch
+
+from API.directoryscanner import find_runs_in_directory
+
+RUN_COUNT = 2000
+# the round trip for each file system call on a network (SMB) share
+SHARE_LATENCY = 0.005
+path_to_fixtures = path.join(path.dirname(path.dirname(path.abspath(__file__))), "unitTests")
+
+
+class FileSystemCalls(object):
+    """Count the calls to the file system made while scanning; on a network
+    share, each one is a round trip to the server.
+    """
+
+    def __init__(self):
+        self.opens = 0
+        self.other_calls = 0
+
+    def _count(self, function, is_open=False):
+        def counted(*args, **kwargs):
+            if is_open:
+                self.opens += 1
+            else:
+                self.other_calls += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def patches(self):
+        patches = [patch("os." + name, self._count(getattr(os, name))) for name in ["stat", "lstat", "listdir", "access"]]
+        patches.append(patch("__builtin__.open", self._count(__builtin__.open, is_open=True)))
+        return patches
+
+    @property
+    def total(self):
+        return self.opens + self.other_calls
+
+    @property
+    def round_trips(self):
+        # a file that's opened is also read and closed
+        return 3 * self.opens + self.other_calls
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--benchmark"), reason = "skipped benchmarks")
+class TestScanBenchmark:
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.runs_directory = path.join(self.directory, "runs")
+        os.mkdir(self.runs_directory)
+        fixture = path.join(path_to_fixtures, "single_end")
+        # most of the runs on a share have already been uploaded
+        for i in xrange(RUN_COUNT):
+            run_directory = path.join(self.runs_directory, "run{}".format(i))
+            os.mkdir(run_directory)
+            shutil.copy(path.join(fixture, "SampleSheet.csv"), run_directory)
+            os.symlink(path.join(fixture, "Data"), path.join(run_directory, "Data"))
+            if i % 10:
+                with open(path.join(run_directory, ".miseqUploaderInfo"), "w") as info_file:
+                    json.dump({"Upload Status": "Complete"}, info_file)
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def _scan(self):
+        calls = FileSystemCalls()
+        patches = calls.patches()
+        for p in patches:
+            p.start()
+        try:
+            start = default_timer()
+            runs = find_runs_in_directory(self.runs_directory)
+            elapsed = default_timer() - start
+        finally:
+            for p in patches:
+                p.stop()
+        # the time the scan would take if each call to the file system was a round trip to a share
+        share_time = elapsed + calls.round_trips * SHARE_LATENCY
+        print "\n{} files opened, {} other file system calls, {:.2f}s here, about {:.1f}s on a share".format(
+            calls.opens, calls.other_calls, elapsed, share_time)
+        return runs, calls
+
+    def test_repeat_scan(self):
+        print "\nScanning {} run directories".format(RUN_COUNT)
+        with patch("API.directoryscanner.open_scan_index", return_value=None):
+            unindexed_runs, unindexed_calls = self._scan()
+
+        with patch("API.directoryscanner.scan_index_file", path.join(self.directory, "scan-index.sqlite")):
+            first_runs, first_calls = self._scan()
+            repeat_runs, repeat_calls = self._scan()
+
+        uploaded_runs = RUN_COUNT - RUN_COUNT / 10
+        assert len(unindexed_runs) == len(first_runs) == len(repeat_runs) == RUN_COUNT - uploaded_runs
+        # nothing in an unchanged run directory is read again: the uploader info
+        # file of an uploaded run is stat'ed, and the files of the other runs are
+        # stat'ed and their directories listed
+        assert repeat_calls.opens == 0
+        assert repeat_calls.total <= uploaded_runs + 10 * (RUN_COUNT - uploaded_runs) + 2
+        assert repeat_calls.round_trips * 4 < unindexed_calls.round_trips
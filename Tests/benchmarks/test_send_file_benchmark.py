@@ -0,0 +1,74 @@
+import pytest
+import hashlib
+import os
+import shutil
+import tempfile
+from timeit import default_timer
+
+from API.fileblocks import read_file_blocks
+
+FILE_SIZE = 256 * 1024 * 1024
+
+
+def legacy_file_blocks(filename, read_size=32768):
+    """The previous way that `_send_file` read files, kept for comparison."""
+    with open(filename, "rb", read_size) as fastq_file:
+        data = fastq_file.read(read_size)
+        while data:
+            yield data
+            data = fastq_file.read(read_size)
+
+
+def throughput(blocks, consume):
+    start = default_timer()
+    bytes_read = 0
+    block_count = 0
+    for block in blocks:
+        consume(block)
+        bytes_read += len(block)
+        block_count += 1
+    elapsed = default_timer() - start
+    return bytes_read / elapsed / (1024 * 1024), block_count
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--benchmark"), reason = "skipped benchmarks")
+class TestSendFileBenchmark:
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "01-1111_S1_L001_R1_001.fastq.gz")
+        with open(self.filename, "wb") as fastq:
+            for i in xrange(FILE_SIZE / (1024 * 1024)):
+                fastq.write(os.urandom(1024 * 1024))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def test_read_throughput(self):
+        # warm the page cache so that both readers are reading from memory
+        for block in legacy_file_blocks(self.filename):
+            pass
+
+        def read_only(block):
+            pass
+
+        def read_and_hash(block):
+            md5.update(block)
+            sha256.update(block)
+
+        print "\nReading a {} MB file:".format(FILE_SIZE / (1024 * 1024))
+        for name, consume in [("read", read_only), ("read + checksums", read_and_hash)]:
+            md5 = hashlib.md5()
+            sha256 = hashlib.sha256()
+            legacy_rate, legacy_blocks = throughput(legacy_file_blocks(self.filename), consume)
+            legacy_digest = sha256.hexdigest()
+
+            md5 = hashlib.md5()
+            sha256 = hashlib.sha256()
+            adaptive_rate, adaptive_blocks = throughput(read_file_blocks(self.filename), consume)
+
+            print "{}: 32 KB reads {:.0f} MB/s ({} blocks), adaptive readinto {:.0f} MB/s ({} blocks)".format(
+                name, legacy_rate, legacy_blocks, adaptive_rate, adaptive_blocks)
+
+            assert sha256.hexdigest() == legacy_digest
+            assert adaptive_blocks < legacy_blocks
@@ -3,7 +3,7 @@ import logging
 import threading
 
 from os import path, remove
-from wx.lib.pubsub import pub
+from API.pubsub import pub
 from Model.Project import Project
 from API.runuploader import upload_run_to_server
 from API.directoryscanner import find_runs_in_directory
@@ -0,0 +1,109 @@
+import json
+import threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+
+class ResumableUploadServer(ThreadingMixIn, HTTPServer):
+
+    """
+    A local stand-in for an IRIDA server that accepts resumable (tus) uploads
+    at /uploads and creates sequence files from them at
+    /samples/<sample>/sequenceFiles.
+
+    Failures can be injected part way through a file with `fail_at`: the first
+    chunk that would take an upload past that many bytes fails, either with a
+    server error (`fail_with="error"`, nothing in the chunk is kept) or by
+    dropping the connection after keeping the bytes before `fail_at`
+    (`fail_with="disconnect"`).
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), ResumableUploadHandler)
+        self.uploads = {}
+        self.sequence_files = []
+        self.requests = []
+        self.fail_at = None
+        self.fail_with = "error"
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ResumableUploadHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _upload_id(self):
+        return self.path.split("/")[-1]
+
+    def _respond(self, status, headers={}, body=""):
+        self.send_response(status)
+        self.send_header("Tus-Resumable", "1.0.0")
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.getheader("Content-Length", 0)))
+
+    def do_POST(self):
+        self.server.requests.append(("POST", self.path, None))
+        if self.path == "/uploads":
+            upload_id = str(len(self.server.uploads) + 1)
+            self.server.uploads[upload_id] = {
+                "length": int(self.headers.getheader("Upload-Length")),
+                "metadata": self.headers.getheader("Upload-Metadata"),
+                "data": ""
+            }
+            self._respond(201, {"Location": "/uploads/" + upload_id})
+        else:
+            form = json.loads(self._read_body())
+            self.server.sequence_files.append(form)
+            self._respond(201, body=json.dumps({"resource": {"form": form}}))
+
+    def do_HEAD(self):
+        self.server.requests.append(("HEAD", self.path, None))
+        upload = self.server.uploads.get(self._upload_id())
+        if upload:
+            self._respond(200, {"Upload-Offset": str(len(upload["data"])),
+                                "Upload-Length": str(upload["length"])})
+        else:
+            self._respond(404)
+
+    def do_PATCH(self):
+        offset = int(self.headers.getheader("Upload-Offset"))
+        self.server.requests.append(("PATCH", self.path, offset))
+        upload = self.server.uploads.get(self._upload_id())
+        chunk = self._read_body()
+
+        if not upload:
+            self._respond(404)
+        elif offset != len(upload["data"]):
+            self._respond(409)
+        elif self.server.fail_at is not None and offset + len(chunk) > self.server.fail_at:
+            fail_at = self.server.fail_at
+            self.server.fail_at = None
+            if self.server.fail_with == "disconnect":
+                upload["data"] += chunk[:fail_at - offset]
+                self.close_connection = 1
+            else:
+                self._respond(500)
+        else:
+            upload["data"] += chunk
+            self._respond(204, {"Upload-Offset": str(len(upload["data"]))})
@@ -1,12 +1,21 @@
 import unittest
 import json
 import httplib
+import gzip
+import hashlib
+import shutil
+import tempfile
+import threading
+from os import path
+from time import time, sleep
 from urllib2 import URLError
 
 from mock import patch, MagicMock
+from requests import Request, Session
 from requests.exceptions import HTTPError as request_HTTPError
 from Model.SequenceFile import SequenceFile
 from Model.SequencingRun import SequencingRun
+from API.pubsub import pub
 
 import API
 
@@ -21,6 +30,20 @@ class Foo(object):
         pass
 
 
+def resource_collection_response(json_obj):
+    """
+    Create a response for a resource collection that can be read with json()
+    or streamed with iter_content()
+    """
+
+    response = Foo()
+    setattr(response, "json", lambda: json_obj)
+    setattr(response, "status_code", httplib.OK)
+    setattr(response, "iter_content", lambda chunk_size=1: iter([json.dumps(json_obj)]))
+    setattr(response, "close", lambda: None)
+    return response
+
+
 class TestApiCalls(unittest.TestCase):
 
     def setUp(self):
@@ -264,6 +287,207 @@ class TestApiCalls(unittest.TestCase):
         self.assertTrue(expectedErrMsg in str(err.exception))
         mock_validate_url_form.assert_called_with("/")
 
+    @patch("API.apiCalls.ApiCalls.get_access_token")
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_session_reused_until_token_expires(self, mock_cs, mock_get_access_token):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        session = MagicMock()
+        api._session = session
+        api._token_expires_at = time() + 3600
+
+        self.assertTrue(api.session is session)
+        self.assertTrue(api.session is session)
+
+        # no probing requests and no new tokens while the token is still valid
+        self.assertFalse(session.options.called)
+        self.assertFalse(mock_get_access_token.called)
+
+    @patch("API.apiCalls.ApiCalls.add_timeout_backoff")
+    @patch("API.apiCalls.ApiCalls.get_access_token")
+    @patch("API.apiCalls.ApiCalls.get_oauth_service")
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_session_renewed_before_token_expires(self, mock_cs, mock_get_oauth_service,
+                                                  mock_get_access_token, mock_add_timeout_backoff):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        new_session = MagicMock()
+        mock_add_timeout_backoff.side_effect = [new_session]
+
+        def get_access_token(oauth_service):
+            api._token_expires_at = time() + 3600
+            return "new-token"
+
+        mock_get_access_token.side_effect = get_access_token
+
+        api._session = MagicMock()
+        api._token_expires_at = time() + API.apiCalls.TOKEN_REFRESH_MARGIN / 2
+
+        self.assertTrue(api.session is new_session)
+        self.assertTrue(api.session is new_session)
+        mock_get_access_token.assert_called_once_with(mock_get_oauth_service.return_value)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_get_access_token_counts_and_records_expiry(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        def get_access_token(decoder=None, **kwargs):
+            token_response = decoder(json.dumps({"access_token": "token", "expires_in": 600}))
+            return token_response["access_token"]
+
+        oauth_service = Foo()
+        setattr(oauth_service, "get_access_token", get_access_token)
+
+        before = time()
+        self.assertEqual("token", api.get_access_token(oauth_service))
+        self.assertEqual(1, api.auth_request_count)
+        self.assertTrue(before + 600 <= api._token_expires_at <= time() + 600)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_access_token_kept_in_catalog_cache(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password="",
+            catalog_cache_file=path.join(directory, "catalog-cache.sqlite")
+        )
+
+        def get_access_token(decoder=None, **kwargs):
+            token_response = decoder(json.dumps({"access_token": "token", "expires_in": 600}))
+            return token_response["access_token"]
+
+        oauth_service = MagicMock()
+        oauth_service.get_access_token.side_effect = get_access_token
+        api.get_oauth_service = lambda: oauth_service
+        api.http_max_retries = API.apiCalls.HTTP_MAX_RETRIES
+        api.http_backoff_factor = API.apiCalls.HTTP_BACKOFF_FACTOR
+
+        api._renew_session(use_cached_token=True)
+        expires_at = api._token_expires_at
+        # the next session uses the same token, until it's rejected
+        api._renew_session(use_cached_token=True)
+        self.assertEqual(api._token_expires_at, expires_at)
+        api._renew_session()
+
+        self.assertEqual(api.auth_request_count, 2)
+        self.assertEqual([args for args, kwargs in oauth_service.get_session.call_args_list],
+                         [("token",)] * 3)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_connection_pool_kept_when_session_renewed(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password="",
+            http_pool_size=4,
+            http_pool_block=True
+        )
+
+        oauth_service = MagicMock()
+        oauth_service.get_access_token.return_value = "token"
+        oauth_service.get_session.side_effect = lambda token: Session()
+        api.get_oauth_service = lambda: oauth_service
+        api.http_max_retries = API.apiCalls.HTTP_MAX_RETRIES
+        api.http_backoff_factor = API.apiCalls.HTTP_BACKOFF_FACTOR
+
+        api._renew_session()
+        first_session = api.session
+        pool = first_session.get_adapter("http://localhost:8080/api").poolmanager.connection_from_url(
+            "http://localhost:8080/api")
+        pool.num_requests = 5
+        pool.num_connections = 2
+        api._renew_session()
+
+        self.assertIsNot(api.session, first_session)
+        adapter = api.session.get_adapter("https://localhost:8080/api")
+        self.assertIs(adapter, first_session.get_adapter("https://localhost:8080/api"))
+        self.assertIs(adapter, api.session.get_adapter("http://localhost:8080/api"))
+        self.assertEqual((adapter._pool_maxsize, adapter._pool_block), (4, True))
+        # the connections opened by the old session are still counted
+        self.assertEqual(api.connection_counts(), (5, 2))
+
+    @patch("API.apiCalls.ApiCalls._renew_session")
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_handle_unauthorized_retries_with_new_token(self, mock_cs, mock_renew_session):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        expired_session = Foo()
+        setattr(expired_session, "access_token", "old-token")
+        new_session = Foo()
+        setattr(new_session, "access_token", "new-token")
+        setattr(new_session, "send", MagicMock(return_value="retried"))
+
+        def renew_session():
+            api._session = new_session
+
+        mock_renew_session.side_effect = renew_session
+        api._session = expired_session
+
+        response = MagicMock()
+        response.status_code = httplib.UNAUTHORIZED
+        response.request = Request("GET", "http://localhost:8080/api/projects",
+                                   headers={"Authorization": "Bearer old-token"}).prepare()
+
+        self.assertEqual("retried", api._handle_unauthorized(expired_session, response, timeout=20))
+
+        retry = new_session.send.call_args[0][0]
+        self.assertEqual("Bearer new-token", retry.headers["Authorization"])
+        self.assertEqual({"timeout": 20}, new_session.send.call_args[1])
+        self.assertTrue(mock_renew_session.called)
+
+        # a second rejection of the retried request is returned as-is
+        response.request = retry
+        self.assertTrue(api._handle_unauthorized(new_session, response) is response)
+        self.assertEqual(1, mock_renew_session.call_count)
+
     @patch("API.apiCalls.ApiCalls.create_session")
     @patch("API.apiCalls.ApiCalls.validate_URL_existence")
     def test_get_link_valid(self,
@@ -298,6 +522,7 @@ class TestApiCalls(unittest.TestCase):
 
         session_response = Foo()
         setattr(session_response, "json", lambda: json_obj)
+        setattr(session_response, "status_code", httplib.OK)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -305,9 +530,13 @@ class TestApiCalls(unittest.TestCase):
 
         api.session = session
         link = api.get_link(targ_URL, targ_key)
+        cached_link = api.get_link(targ_URL, targ_key)
 
-        api.session.get.assert_called_with(targ_URL)
+        # the resource is only requested once, and not at all once its links are cached
+        api.session.get.assert_called_once_with(targ_URL)
+        self.assertEqual(mock_validate_url_existence.call_count, 0)
         self.assertEqual(link, targ_link)
+        self.assertEqual(cached_link, targ_link)
 
     @patch("API.apiCalls.ApiCalls.create_session")
     @patch("API.apiCalls.ApiCalls.validate_URL_existence")
@@ -345,8 +574,7 @@ class TestApiCalls(unittest.TestCase):
             }
         }
 
-        session_response = Foo()
-        setattr(session_response, "json", lambda: json_obj)
+        session_response = resource_collection_response(json_obj)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -356,16 +584,75 @@ class TestApiCalls(unittest.TestCase):
         t_dict = {"key": "identifier", "value": "1"}
         link = api.get_link(targ_URL, targ_key, targ_dict=t_dict)
 
-        api.session.get.assert_called_with(targ_URL)
+        api.session.get.assert_called_with(targ_URL, stream=True)
         self.assertEqual(link, targ_link)
 
     @patch("API.apiCalls.ApiCalls.create_session")
     @patch("API.apiCalls.ApiCalls.validate_URL_existence")
-    def test_get_link_invalid_url_not_found(self,
-                                            mock_validate_url_existence,
-                                            mock_cs):
+    def test_get_link_cached(self,
+                             mock_validate_url_existence,
+                             mock_cs):
+
+        mock_validate_url_existence.return_value = True
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        targ_URL = "http://localhost:8080/api/projects/1/samples"
+        targ_key = "sample/sequenceFiles"
+
+        json_obj = {
+            "resource": {
+                "resources": [{
+                    "sampleName": sample_name,
+                    "links": [
+                        {
+                            "rel": targ_key,
+                            "href": targ_URL + "/" + sample_name + "/sequenceFiles"
+                        }
+                    ]
+                } for sample_name in ["01-1111", "02-2222"]]
+            }
+        }
+
+        session_response = resource_collection_response(json_obj)
+
+        session_get = MagicMock(return_value=session_response)
+        session = Foo()
+        setattr(session, "get", session_get)
+
+        api.session = session
+        link1 = api.get_link(targ_URL, targ_key, targ_dict={"key": "sampleName", "value": "01-1111"})
+        # the second sample comes from the same resource list, so no more requests are made
+        link2 = api.get_link(targ_URL, targ_key, targ_dict={"key": "sampleName", "value": "02-2222"})
+        link1_again = api.get_link(targ_URL, targ_key, targ_dict={"key": "sampleName", "value": "01-1111"})
+
+        self.assertEqual(link1, targ_URL + "/01-1111/sequenceFiles")
+        self.assertEqual(link2, targ_URL + "/02-2222/sequenceFiles")
+        self.assertEqual(link1, link1_again)
+        self.assertEqual(api.session.get.call_count, 1)
+        # the list is only requested once, not checked with another request first
+        self.assertEqual(mock_validate_url_existence.call_count, 0)
+
+        # links are retrieved again once they've been cleared from the cache
+        api.clear_link_cache(targ_URL)
+        api.get_link(targ_URL, targ_key, targ_dict={"key": "sampleName", "value": "01-1111"})
+        self.assertEqual(api.session.get.call_count, 2)
+
+        # or once they've expired
+        with patch("API.apiCalls.time", return_value=time() + API.apiCalls.LINK_CACHE_TIME_TO_LIVE + 1):
+            api.get_link(targ_URL, targ_key, targ_dict={"key": "sampleName", "value": "02-2222"})
+        self.assertEqual(api.session.get.call_count, 3)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_get_link_invalid_url_not_found(self, mock_cs):
 
-        mock_validate_url_existence.side_effect = [False]
         mock_cs.side_effect = [None]
 
         api = API.apiCalls.ApiCalls(
@@ -379,12 +666,59 @@ class TestApiCalls(unittest.TestCase):
         targ_URL = "http://localhost:8080/api/"
         targ_key = "project"
 
+        session_response = Foo()
+        setattr(session_response, "status_code", httplib.NOT_FOUND)
+        setattr(session_response, "close", MagicMock())
+        session = Foo()
+        setattr(session, "get", MagicMock(return_value=session_response))
+        api.session = session
+
         with self.assertRaises(request_HTTPError) as err:
             api.get_link(targ_URL, targ_key)
+        self.assertTrue("not a valid URL" in str(err.exception))
 
+        # lists that aren't found are reported the same way
+        with self.assertRaises(request_HTTPError) as err:
+            api.get_link(targ_URL, targ_key, targ_dict={"key": "identifier", "value": "1"})
         self.assertTrue("not a valid URL" in str(err.exception))
-        mock_validate_url_existence.assert_called_with(targ_URL,
-                                                       use_session=True)
+
+        self.assertEqual(api.session.get.call_count, 2)
+        session_response.close.assert_called_with()
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_get_link_cache_miss_one_request(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        targ_URL = "http://localhost:8080/api/projects/1/samples"
+        targ_key = "sample/sequenceFiles"
+
+        json_obj = {
+            "resource": {
+                "resources": [{
+                    "sampleName": "01-1111",
+                    "links": [{"rel": targ_key, "href": targ_URL + "/1/sequenceFiles"}]
+                }]
+            }
+        }
+
+        session = Foo()
+        setattr(session, "get", MagicMock(return_value=resource_collection_response(json_obj)))
+        api.session = session
+
+        link = api.get_link(targ_URL, targ_key, targ_dict={"key": "sampleName", "value": "01-1111"})
+
+        self.assertEqual(link, targ_URL + "/1/sequenceFiles")
+        # the list is streamed once, it isn't downloaded to check that it exists first
+        api.session.get.assert_called_once_with(targ_URL, stream=True)
 
     @patch("API.apiCalls.ApiCalls.create_session")
     @patch("API.apiCalls.ApiCalls.validate_URL_existence")
@@ -421,6 +755,7 @@ class TestApiCalls(unittest.TestCase):
 
         session_response = Foo()
         setattr(session_response, "json", lambda: json_obj)
+        setattr(session_response, "status_code", httplib.OK)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -471,8 +806,7 @@ class TestApiCalls(unittest.TestCase):
             }
         }
 
-        session_response = Foo()
-        setattr(session_response, "json", lambda: json_obj)
+        session_response = resource_collection_response(json_obj)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -484,7 +818,7 @@ class TestApiCalls(unittest.TestCase):
             api.get_link(targ_URL, targ_key, targ_dict=t_dict)
 
         self.assertTrue(t_dict["value"] + " not found." in str(err.exception))
-        api.session.get.assert_called_with(targ_URL)
+        api.session.get.assert_called_with(targ_URL, stream=True)
 
     @patch("API.apiCalls.ApiCalls.create_session")
     @patch("API.apiCalls.ApiCalls.validate_URL_existence")
@@ -522,8 +856,7 @@ class TestApiCalls(unittest.TestCase):
             }
         }
 
-        session_response = Foo()
-        setattr(session_response, "json", lambda: json_obj)
+        session_response = resource_collection_response(json_obj)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -536,7 +869,7 @@ class TestApiCalls(unittest.TestCase):
 
         self.assertTrue(t_dict["key"] + " not found." in str(err.exception))
         self.assertTrue("Available keys: identifier" in str(err.exception))
-        api.session.get.assert_called_with(targ_URL)
+        api.session.get.assert_called_with(targ_URL, stream=True)
 
     @patch("API.apiCalls.ApiCalls.create_session")
     def test_get_projects_valid(self, mock_cs):
@@ -574,6 +907,7 @@ class TestApiCalls(unittest.TestCase):
 
         session_response = Foo()
         setattr(session_response, "json", lambda: json_obj)
+        setattr(session_response, "status_code", httplib.OK)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -595,6 +929,45 @@ class TestApiCalls(unittest.TestCase):
         self.assertEqual(proj_list[1].get_description(),
                          p2_dict["projectDescription"])
 
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_get_project_indexed(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        json_obj = {
+            "resource": {
+                "resources": [
+                    {"identifier": "1", "name": "project1", "projectDescription": ""},
+                    {"identifier": "2", "name": "project2", "projectDescription": "p2"}
+                ]
+            }
+        }
+
+        session_response = Foo()
+        setattr(session_response, "json", lambda: json_obj)
+        setattr(session_response, "status_code", httplib.OK)
+
+        session_get = MagicMock(side_effect=[session_response])
+        session = Foo()
+        setattr(session, "get", session_get)
+
+        api.session = session
+        api.get_link = lambda x, y: None
+
+        self.assertEqual(api.get_project("2").get_name(), "project2")
+        self.assertEqual(api.get_project("1").get_name(), "project1")
+        self.assertTrue(api.get_project("3") is None)
+        # the projects are only loaded from the server once
+        self.assertEqual(api.session.get.call_count, 1)
+
     @patch("API.apiCalls.ApiCalls.create_session")
     def test_get_projects_invalid_missing_key(self, mock_cs):
 
@@ -631,6 +1004,7 @@ class TestApiCalls(unittest.TestCase):
 
         session_response = Foo()
         setattr(session_response, "json", lambda: json_obj)
+        setattr(session_response, "status_code", httplib.OK)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -674,8 +1048,7 @@ class TestApiCalls(unittest.TestCase):
             }
         }
 
-        session_response = Foo()
-        setattr(session_response, "json", lambda: json_obj)
+        session_response = resource_collection_response(json_obj)
 
         session_get = MagicMock(side_effect=[session_response])
         session = Foo()
@@ -691,6 +1064,269 @@ class TestApiCalls(unittest.TestCase):
         self.assertEqual(sample_dict.items(),
                          sample_list[0].get_dict().items())
 
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_get_sample_indexed(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        json_obj = {
+            "resource": {
+                "resources": [
+                    {"sampleName": "03-3333", "identifier": "1"},
+                    {"sampleName": "ABC-4444", "identifier": "2"}
+                ]
+            }
+        }
+
+        session_response = resource_collection_response(json_obj)
+
+        session_get = MagicMock(side_effect=[session_response])
+        session = Foo()
+        setattr(session, "get", session_get)
+
+        api.session = session
+        api.get_link = lambda x, y, targ_dict="": None
+
+        def local_sample(sample_id):
+            return API.apiCalls.Sample({"sequencerSampleId": sample_id, "sampleName": sample_id,
+                                        "sampleProject": "1"})
+
+        self.assertEqual(api.get_sample(local_sample("03-3333")).get("identifier"), "1")
+        # sample identifiers are compared case-insensitively
+        self.assertEqual(api.get_sample(local_sample("abc-4444")).get("identifier"), "2")
+        self.assertTrue(api.get_sample(local_sample("05-5555")) is None)
+        # the samples are only loaded from the server once
+        self.assertEqual(api.session.get.call_count, 1)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_prefetch_samples(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        api.get_project = lambda project_id: (None if project_id == "3" else
+                                              API.apiCalls.Project("project", "", project_id))
+        api.get_link = lambda x, y, targ_dict="": targ_dict and "project{}/samples".format(targ_dict["value"])
+        active = []
+        most_active = []
+        fetched = []
+
+        def iter_resources(url):
+            active.append(url)
+            most_active.append(len(active))
+            fetched.append(url)
+            sleep(0.05)
+            active.remove(url)
+            if url == "project4/samples":
+                raise request_HTTPError("disconnected")
+            return [{"sampleName": "sample-" + url, "identifier": "1"}]
+
+        api.iter_resources = iter_resources
+
+        self.assertEqual(api.prefetch_samples(["1", "2", "1", "3", "4", "5", "6"], max_concurrent_requests=3), 4)
+
+        # the projects that exist are fetched at the same time, once each
+        self.assertEqual(sorted(fetched), ["project{}/samples".format(i) for i in [1, 2, 4, 5, 6]])
+        self.assertEqual(max(most_active), 3)
+        sample = API.apiCalls.Sample({"sampleName": "sample-project2/samples", "sampleProject": "2"})
+        self.assertEqual(api.get_sample(sample).get("identifier"), "1")
+        self.assertEqual(len(fetched), 5)
+        # projects that couldn't be fetched are fetched again when they're used
+        self.assertEqual(api.prefetch_samples(["1", "4"]), 0)
+        self.assertEqual(len(fetched), 6)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_catalog_revalidated(self, mock_cs):
+
+        mock_cs.side_effect = [None, None]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password="",
+            catalog_cache_file=path.join(directory, "catalog-cache.sqlite")
+        )
+
+        projects = {"resource": {"resources": [{"identifier": "1", "name": "project1", "projectDescription": ""}]}}
+        samples = {"resource": {"resources": [{"sampleName": "03-3333", "identifier": "1"}]}}
+
+        def response(status_code, json_obj=None):
+            session_response = resource_collection_response(json_obj)
+            setattr(session_response, "status_code", status_code)
+            setattr(session_response, "headers", {"ETag": '"v1"'} if json_obj else {})
+            setattr(session_response, "content", json.dumps(json_obj))
+            return session_response
+
+        session = Foo()
+        setattr(session, "get", MagicMock(side_effect=[response(httplib.OK, projects), response(httplib.OK, samples),
+                                                       response(httplib.NOT_MODIFIED),
+                                                       response(httplib.NOT_MODIFIED)]))
+        api.session = session
+        api.get_link = lambda x, y, targ_dict="": "samples" if targ_dict else "projects"
+
+        sample = API.apiCalls.Sample({"sampleName": "03-3333", "sampleProject": "1"})
+        self.assertEqual(api.get_project("1").get_name(), "project1")
+        self.assertEqual(api.get_sample(sample).get("identifier"), "1")
+        api.session.get.assert_called_with("samples", stream=True)
+
+        # a new session only asks whether the lists have changed
+        API.apiCalls.ApiCalls.close()
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password="",
+            catalog_cache_file=path.join(directory, "catalog-cache.sqlite")
+        )
+        api.session = session
+        api.get_link = lambda x, y, targ_dict="": "samples" if targ_dict else "projects"
+
+        self.assertEqual(api.get_project("1").get_name(), "project1")
+        self.assertEqual(api.get_sample(sample).get("identifier"), "1")
+        api.session.get.assert_called_with("samples", stream=True, headers={"If-None-Match": '"v1"'})
+        self.assertEqual(api.session.get.call_count, 4)
+
+        # samples that we create are added to the lists
+        created = Foo()
+        setattr(created, "status_code", httplib.CREATED)
+        setattr(created, "text", json.dumps({"resource": {"sampleName": "04-4444", "identifier": "2"}}))
+        setattr(session, "post", MagicMock(return_value=created))
+        api.send_samples([API.apiCalls.Sample({"sampleName": "04-4444", "sampleProject": "1"})])
+
+        new_sample = API.apiCalls.Sample({"sampleName": "04-4444", "sampleProject": "1"})
+        self.assertEqual(api.get_sample(new_sample).get("identifier"), "2")
+        self.assertEqual(api.session.get.call_count, 4)
+        self.assertEqual(len(json.loads(api.catalog_cache.response("samples").body)["resource"]["resources"]), 2)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_catalog_warm_start_only_revalidates(self, mock_cs):
+
+        mock_cs.side_effect = [None, None]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        base_URL = "http://localhost:8080/api/"
+
+        documents = {
+            base_URL: {"resource": {"links": [{"rel": "projects", "href": base_URL + "projects"}]}},
+            base_URL + "projects": {"resource": {"resources": [
+                {"identifier": "1", "name": "project1", "projectDescription": "",
+                 "links": [{"rel": "project/samples", "href": base_URL + "projects/1/samples"}]}]}},
+            base_URL + "projects/1/samples": {"resource": {"resources": [
+                {"sampleName": "01-1111", "identifier": "1", "links": []}]}}
+        }
+        requests_sent = []
+
+        def get(url, stream=False, headers=None):
+            etag = '"{}"'.format(sorted(documents).index(url))
+            if headers and headers.get("If-None-Match") == etag:
+                response = Foo()
+                setattr(response, "status_code", httplib.NOT_MODIFIED)
+                setattr(response, "close", lambda: None)
+            else:
+                response = resource_collection_response(documents[url])
+                setattr(response, "headers", {"ETag": etag})
+                setattr(response, "content", json.dumps(documents[url]))
+            requests_sent.append((url, headers, response.status_code))
+            return response
+
+        session = Foo()
+        setattr(session, "get", get)
+
+        def start_session():
+            API.apiCalls.ApiCalls.close()
+            api = API.apiCalls.ApiCalls(
+                client_id="",
+                client_secret="",
+                base_URL=base_URL,
+                username="",
+                password="",
+                catalog_cache_file=path.join(directory, "catalog-cache.sqlite")
+            )
+            api.session = session
+            del requests_sent[:]
+            self.assertEqual(api.get_project("1").get_name(), "project1")
+            api.prefetch_samples(["1"])
+            self.assertEqual(api.get_sample(API.apiCalls.Sample({"sampleName": "01-1111", "sampleProject": "1"}))
+                             .get("identifier"), "1")
+            return list(requests_sent)
+
+        cold_start = start_session()
+        warm_start = start_session()
+
+        self.assertEqual([url for url, headers, status in warm_start], [url for url, headers, status in cold_start])
+        self.assertTrue(httplib.OK in [status for url, headers, status in cold_start])
+        # nothing is downloaded again, every request only asks whether it has changed
+        self.assertEqual(set(status for url, headers, status in warm_start), set([httplib.NOT_MODIFIED]))
+        self.assertTrue(all(headers and "If-None-Match" in headers for url, headers, status in warm_start))
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_find_resource_stops_at_match(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        json_obj = {
+            "resource": {
+                "resources": [{"sampleName": "{:02d}-1111".format(i), "identifier": str(i)}
+                              for i in range(100)]
+            }
+        }
+        document = json.dumps(json_obj)
+        chunks_read = []
+
+        def iter_content(chunk_size):
+            for i in range(0, len(document), 64):
+                chunks_read.append(i)
+                yield document[i:i + 64]
+
+        session_response = resource_collection_response(json_obj)
+        setattr(session_response, "iter_content", iter_content)
+        setattr(session_response, "close", MagicMock())
+
+        session_get = MagicMock(return_value=session_response)
+        session = Foo()
+        setattr(session, "get", session_get)
+
+        api.session = session
+        targ_URL = "http://localhost:8080/api/projects/1/samples"
+
+        resource = api.find_resource(targ_URL, "sampleName", "02-1111")
+
+        self.assertEqual(resource["identifier"], "2")
+        api.session.get.assert_called_with(targ_URL, stream=True)
+        # only the start of the response was read, and the response was closed
+        self.assertTrue(len(chunks_read) < len(document) / 64 / 2)
+        session_response.close.assert_called_with()
+
+        self.assertTrue(api.find_resource(targ_URL, "sampleName", "not-a-sample") is None)
+
     @patch("API.apiCalls.ApiCalls.create_session")
     def test_get_samples_invalid_proj_id(self, mock_cs):
 
@@ -860,6 +1496,41 @@ class TestApiCalls(unittest.TestCase):
         json_res = api.send_project(proj)
         self.assertEqual(json_dict, json_res)
 
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_send_project_clears_link_cache(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        projects_url = "http://localhost:8080/api/projects"
+        samples_url = "http://localhost:8080/api/projects/1/samples"
+
+        session_response = Foo()
+        setattr(session_response, "status_code", httplib.CREATED)
+        setattr(session_response, "text", json.dumps({"resource": {}}))
+
+        session = Foo()
+        setattr(session, "post", MagicMock(side_effect=[session_response]))
+
+        api.session = session
+        api.get_link = lambda x, y, targ_dict="": projects_url
+        api.cached_links = {
+            (projects_url, "project/samples", "identifier", "1"): (samples_url, time()),
+            (samples_url, "sample/sequenceFiles", "sampleName", "01-1111"): (samples_url + "/1", time())
+        }
+
+        api.send_project(API.apiCalls.Project("project1", "projectDescription"))
+
+        self.assertEqual([(samples_url, "sample/sequenceFiles", "sampleName", "01-1111")],
+                         api.cached_links.keys())
+
     @patch("API.apiCalls.ApiCalls.create_session")
     def test_send_project_invalid_name(self, mock_cs):
 
@@ -1065,6 +1736,114 @@ class TestApiCalls(unittest.TestCase):
         self.assertTrue(str(session_response.status_code) + ": " +
                         session_response.text in str(err.exception))
 
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_create_samples_batch(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        links = []
+
+        def get_link(targ_url, target_key, targ_dict=""):
+            links.append((target_key, targ_dict and targ_dict["value"]))
+            if targ_dict and targ_dict["value"] == "3":
+                raise KeyError("3 not found.")
+            return targ_dict and "project{}/samples".format(targ_dict["value"])
+
+        api.get_link = get_link
+
+        def post(url, json_obj, headers):
+            sample_name = json.loads(json_obj)["sampleName"]
+            response = Foo()
+            if sample_name == "rejected":
+                setattr(response, "status_code", httplib.CONFLICT)
+                setattr(response, "text", "An entity already exists with that identifier")
+            else:
+                setattr(response, "status_code", httplib.CREATED)
+                setattr(response, "text", json.dumps({"resource": {"sampleName": sample_name, "url": url}}))
+            return response
+
+        session = Foo()
+        setattr(session, "post", MagicMock(side_effect=post))
+        api.session = session
+
+        samples = [API.apiCalls.Sample({"sampleProject": project, "sampleName": name})
+                   for project, name in [("1", "one"), ("2", "two"), ("1", "rejected"), ("3", "missing"),
+                                         ("1", "four"), ("2", "five")]]
+        sequencing_run = SequencingRun(sample_sheet="sheet", sample_list=samples)
+        sequencing_run._sample_sheet_name = "sheet"
+        for sample in samples:
+            sample.set_seq_file(SequenceFile({}, []))
+            sample.run = sequencing_run
+
+        results = api.create_samples(samples, max_concurrent_requests=3)
+
+        self.assertEqual([result["resource"] for result in results[:2] + results[4:]],
+                         [{"sampleName": "one", "url": "project1/samples"},
+                          {"sampleName": "two", "url": "project2/samples"},
+                          {"sampleName": "four", "url": "project1/samples"},
+                          {"sampleName": "five", "url": "project2/samples"}])
+        self.assertTrue(isinstance(results[2], API.apiCalls.SampleError))
+        self.assertTrue(isinstance(results[3], API.apiCalls.ProjectError))
+        self.assertEqual(session.post.call_count, 5)
+        # each project's sample list is only looked up once
+        self.assertEqual(sorted(link for link in links if link[0] == "project/samples"),
+                         [("project/samples", "1"), ("project/samples", "2"), ("project/samples", "3")])
+
+        with self.assertRaises(API.apiCalls.SampleError):
+            api.send_samples(samples, max_concurrent_requests=3)
+        # the samples after the failure are still sent
+        self.assertEqual(session.post.call_count, 10)
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_created_sample_links_cached(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        samples_url = "http://localhost:8080/api/projects/1/samples"
+        other_link = samples_url + "/1/sequenceFiles"
+        api.cached_links = {
+            ("", "projects", None, None): ("projects", time()),
+            ("projects", "project/samples", "identifier", "1"): (samples_url, time()),
+            (samples_url, "sample/sequenceFiles", "sampleName", "01-1111"): (other_link, time())
+        }
+
+        created = Foo()
+        setattr(created, "status_code", httplib.CREATED)
+        setattr(created, "text", json.dumps({"resource": {
+            "sampleName": "02-2222", "identifier": "2",
+            "links": [{"rel": "sample/sequenceFiles", "href": samples_url + "/2/sequenceFiles"}]}}))
+        session = Foo()
+        setattr(session, "post", MagicMock(return_value=created))
+        setattr(session, "get", MagicMock())
+        api.session = session
+
+        api.send_samples([API.apiCalls.Sample({"sampleName": "02-2222", "sampleProject": "1"})])
+
+        # the new sample's link comes from the response, and the links of the
+        # other samples are kept, so the sample list isn't requested again
+        self.assertEqual(api.get_link(samples_url, "sample/sequenceFiles",
+                                      targ_dict={"key": "sampleName", "value": "02-2222"}),
+                         samples_url + "/2/sequenceFiles")
+        self.assertEqual(api.get_link(samples_url, "sample/sequenceFiles",
+                                      targ_dict={"key": "sampleName", "value": "01-1111"}), other_link)
+        self.assertFalse(session.get.called)
+
     @patch("API.apiCalls.ApiCalls.create_session")
     @patch("os.path.getsize")
     def test_send_sequence_files_valid(self, getsize, mock_cs):
@@ -1129,6 +1908,346 @@ class TestApiCalls(unittest.TestCase):
         json_res = json_res_list[0]
         self.assertEqual(json_res, json_dict)
 
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_send_sequence_files_checksums(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = []
+        for read in ["R1", "R2"]:
+            files.append(path.join(directory, "03-3333_S1_L001_{}_001.fastq".format(read)))
+            with open(files[-1], "wb") as fastq:
+                fastq.write("@read-{}\nACGT\n+\nIIII\n".format(read) * 10000)
+
+        sent = []
+
+        def session_post(url, data=None, headers=None):
+            # the file contents are sent as views of a re-used buffer
+            sent.append("".join(block if isinstance(block, str) else block.tobytes() for block in data))
+            session_response = Foo()
+            setattr(session_response, "status_code", httplib.CREATED)
+            setattr(session_response, "text", json.dumps({}))
+            return session_response
+
+        session = Foo()
+        setattr(session, "post", session_post)
+
+        api.get_link = lambda x, y, targ_dict="": None
+        api.session = session
+
+        sample = API.apiCalls.Sample({
+            "sequencerSampleId": "03-3333",
+            "sampleName": "03-3333",
+            "sampleProject": "1"
+        })
+        sample.set_seq_file(SequenceFile({"Sample_Name": "03-3333"}, files))
+        sample.run = SequencingRun(sample_sheet="sheet", sample_list=[sample])
+        sample.run._sample_sheet_name = "sheet"
+
+        api.send_sequence_files(samples_list=[sample])
+
+        for filename, parameter_name in zip(files, ["parameters1", "parameters2"]):
+            with open(filename, "rb") as fastq:
+                contents = fastq.read()
+            checksums = {"md5": hashlib.md5(contents).hexdigest(),
+                         "sha256": hashlib.sha256(contents).hexdigest()}
+            self.assertEqual(sample.seq_file.checksums[filename], checksums)
+
+            # the checksums are sent with the metadata for each file
+            parameters = sent[0].split("name=\"{}\"".format(parameter_name))[1]
+            parameters = json.loads(parameters.split("\r\n\r\n")[1].split("\r\n")[0])
+            self.assertEqual(parameters["uploadMd5"], checksums["md5"])
+            self.assertEqual(parameters["uploadSha256"], checksums["sha256"])
+            self.assertEqual(parameters["Sample_Name"], "03-3333")
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_send_sequence_files_qc_stats(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = []
+        for read, count in [("R1", 10000), ("R2", 9999)]:
+            files.append(path.join(directory, "03-3333_S1_L001_{}_001.fastq.gz".format(read)))
+            fastq = gzip.open(files[-1], "wb")
+            fastq.write("@read-{}\nACGG\n+\nIIII\n".format(read) * count)
+            fastq.close()
+
+        def session_post(url, data=None, headers=None):
+            for block in data:
+                pass
+            session_response = Foo()
+            setattr(session_response, "status_code", httplib.CREATED)
+            setattr(session_response, "text", json.dumps({}))
+            return session_response
+
+        session = Foo()
+        setattr(session, "post", session_post)
+
+        api.get_link = lambda x, y, targ_dict="": None
+        api.session = session
+
+        sample = API.apiCalls.Sample({
+            "sequencerSampleId": "03-3333",
+            "sampleName": "03-3333",
+            "sampleProject": "1"
+        })
+        sample.set_seq_file(SequenceFile({"Sample_Name": "03-3333"}, files))
+        sample.run = SequencingRun(sample_sheet="sheet", sample_list=[sample])
+        sample.run._sample_sheet_name = "sheet"
+
+        api.send_sequence_files(samples_list=[sample], qc_stats=True)
+
+        # the statistics are calculated from the blocks that were sent
+        stats = [sample.seq_file.qc_stats[filename] for filename in files]
+        self.assertEqual([(s.reads, s.bases) for s in stats], [(10000, 40000), (9999, 39996)])
+        self.assertEqual(stats[0].mean_quality, 40)
+        self.assertEqual(stats[0].gc_content, 0.75)
+
+        # and not calculated unless they're asked for
+        sample.seq_file.qc_stats.clear()
+        api.send_sequence_files(samples_list=[sample])
+        self.assertEqual(sample.seq_file.qc_stats, {})
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_send_sequence_files_concurrent_valid(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        def session_post(url, data=None, headers=None):
+            # the first chunk of the upload is the header for the first file,
+            # which tells us which sample is being sent.
+            first_chunk = next(data)
+            session_response = Foo()
+            setattr(session_response, "status_code", httplib.CREATED)
+            setattr(session_response, "text", json.dumps({"header": first_chunk}))
+            return session_response
+
+        session = Foo()
+        setattr(session, "post", MagicMock(side_effect=session_post))
+
+        api.get_link = lambda x, y, targ_dict="": None
+        api.session = session
+        api.get_file_size_list = MagicMock()
+
+        samples = []
+        for sample_id in ["01-1111", "02-2222", "03-3333", "04-4444", "05-5555"]:
+            sample = API.apiCalls.Sample({
+                "sequencerSampleId": sample_id,
+                "sampleName": sample_id,
+                "sampleProject": "1"
+            })
+            sample.set_seq_file(SequenceFile({}, [sample_id + "_S1_L001_R1_001.fastq.gz"]))
+            samples.append(sample)
+        run = SequencingRun(sample_sheet="sheet", sample_list=samples)
+        run._sample_sheet_name = "sheet"
+
+        json_res_list = api.send_sequence_files(samples_list=samples, max_concurrent_uploads=3)
+
+        self.assertEqual(len(json_res_list), len(samples))
+        self.assertEqual(api.session.post.call_count, len(samples))
+        for sample, json_res in zip(samples, json_res_list):
+            self.assertIn(sample.get_files()[0], json_res["header"])
+
+    @patch("API.apiCalls.ApiCalls.create_session")
+    def test_send_sequence_files_concurrent_failure(self, mock_cs):
+
+        mock_cs.side_effect = [None]
+
+        api = API.apiCalls.ApiCalls(
+            client_id="",
+            client_secret="",
+            base_URL="",
+            username="",
+            password=""
+        )
+
+        session_response = Foo()
+        setattr(session_response, "status_code", httplib.INTERNAL_SERVER_ERROR)
+        setattr(session_response, "reason", "Internal Server Error")
+        setattr(session_response, "text", "")
+
+        session = Foo()
+        setattr(session, "post", MagicMock(return_value=session_response))
+
+        api.get_link = lambda x, y, targ_dict="": None
+        api.session = session
+        api.get_file_size_list = MagicMock()
+
+        samples = []
+        for sample_id in ["01-1111", "02-2222", "03-3333"]:
+            sample = API.apiCalls.Sample({
+                "sequencerSampleId": sample_id,
+                "sampleName": sample_id,
+                "sampleProject": "1"
+            })
+            sample.set_seq_file(SequenceFile({}, [sample_id + "_S1_L001_R1_001.fastq.gz"]))
+            samples.append(sample)
+        run = SequencingRun(sample_sheet="sheet", sample_list=samples)
+        run._sample_sheet_name = "sheet"
+
+        with self.assertRaises(API.apiCalls.SequenceFileError) as err:
+            api.send_sequence_files(samples_list=samples, max_concurrent_uploads=2)
+
+        self.assertIn("Internal Server Error", str(err.exception))
+        # no new samples are started after the first failure
+        self.assertTrue(api.session.post.call_count <= 2)
+
+    def _prepared_upload_api(self, events):
+        with patch("API.apiCalls.ApiCalls.create_session"):
+            api = API.apiCalls.ApiCalls(
+                client_id="",
+                client_secret="",
+                base_URL="",
+                username="",
+                password=""
+            )
+
+        def session_post(url, data=None, headers=None):
+            first_chunk = next(data)
+            events.append(("uploaded", [sample_id for sample_id in ["01-1111", "02-2222", "03-3333"]
+                                        if sample_id in first_chunk][0]))
+            session_response = Foo()
+            setattr(session_response, "status_code", httplib.CREATED)
+            setattr(session_response, "text", json.dumps({"header": first_chunk}))
+            return session_response
+
+        session = Foo()
+        setattr(session, "post", MagicMock(side_effect=session_post))
+        api.get_link = lambda x, y, targ_dict="": None
+        api.session = session
+        api.get_file_size_list = MagicMock()
+
+        samples = []
+        for sample_id in ["01-1111", "02-2222", "03-3333"]:
+            sample = API.apiCalls.Sample({
+                "sequencerSampleId": sample_id,
+                "sampleName": sample_id,
+                "sampleProject": "1"
+            })
+            sample.set_seq_file(SequenceFile({}, [sample_id + "_S1_L001_R1_001.fastq.gz"]))
+            samples.append(sample)
+        run = SequencingRun(sample_sheet="sheet", sample_list=samples)
+        run._sample_sheet_name = "sheet"
+        return api, samples
+
+    def test_send_sequence_files_prepared(self):
+        events = []
+        api, samples = self._prepared_upload_api(events)
+        first_uploaded = threading.Event()
+
+        def prepare_sample(sample):
+            events.append(("prepared", sample.get_id()))
+            if sample is samples[1]:
+                # the first sample is uploaded while the next ones are prepared
+                first_uploaded.wait(5)
+
+        def session_post(url, data=None, headers=None):
+            response = original_post(url, data, headers)
+            first_uploaded.set()
+            return response
+        original_post = api.session.post.side_effect
+        api.session.post.side_effect = session_post
+
+        json_res_list = api.send_sequence_files(samples_list=samples, prepare_sample=prepare_sample)
+
+        self.assertEqual(len(json_res_list), len(samples))
+        self.assertEqual(events[:3], [("prepared", "01-1111"), ("prepared", "02-2222"), ("uploaded", "01-1111")])
+        self.assertEqual(sorted(events[3:]), [("prepared", "03-3333"), ("uploaded", "02-2222"),
+                                              ("uploaded", "03-3333")])
+        self.assertTrue(events.index(("prepared", "03-3333")) < events.index(("uploaded", "03-3333")))
+
+    def test_send_sequence_files_prepare_failure(self):
+        events = []
+        api, samples = self._prepared_upload_api(events)
+        failed_samples = []
+
+        def prepare_sample(sample):
+            if sample is samples[1]:
+                raise API.apiCalls.SampleError("rejected", [])
+
+        def upload_failed(exception=None):
+            failed_samples.append(exception)
+        pub.subscribe(upload_failed, samples[1].upload_failed_topic)
+
+        try:
+            with self.assertRaises(API.apiCalls.SampleError):
+                api.send_sequence_files(samples_list=samples, prepare_sample=prepare_sample, max_concurrent_uploads=2)
+        finally:
+            pub.unsubscribe(upload_failed, samples[1].upload_failed_topic)
+
+        # only the sample that couldn't be prepared fails, the samples before
+        # and after it are still uploaded
+        self.assertEqual(sorted(events), [("uploaded", "01-1111"), ("uploaded", "03-3333")])
+        self.assertEqual(len(failed_samples), 1)
+        self.assertIn("rejected", str(failed_samples[0]))
+
+    def test_send_sequence_files_halted(self):
+        events = []
+        api, samples = self._prepared_upload_api(events)
+        setattr(api.session, "close", MagicMock())
+        first_sending = threading.Event()
+        second_sent = threading.Event()
+
+        def session_post(url, data=None, headers=None):
+            response = original_post(url, data, headers)
+            if events[-1] == ("uploaded", "01-1111"):
+                first_sending.set()
+                second_sent.wait(5)
+            return response
+        original_post = api.session.post.side_effect
+        api.session.post.side_effect = session_post
+
+        failures = []
+
+        def send_first():
+            try:
+                api.send_sequence_files(samples_list=[samples[0]])
+            except Exception as e:
+                failures.append(e)
+        first = threading.Thread(target=send_first)
+        first.start()
+        self.assertTrue(first_sending.wait(5))
+        api._kill_connections()
+
+        # an upload started after the first one was halted isn't stopped, and
+        # doesn't undo the request to stop the first one
+        json_res_list = api.send_sequence_files(samples_list=[samples[1]])
+        second_sent.set()
+        first.join(5)
+
+        self.assertEqual(len(json_res_list), 1)
+        self.assertEqual(len(failures), 1)
+        self.assertIn("halted", str(failures[0]))
+        self.assertEqual(api._upload_stop_events, set())
+
     @patch("API.apiCalls.ApiCalls.create_session")
     def test_send_sequence_files_invalid_proj_id(self, mock_cs):
 
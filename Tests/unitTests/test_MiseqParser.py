@@ -1,3 +1,4 @@
+import gc
 import unittest
 from os import path
 from csv import reader
@@ -5,12 +6,16 @@ from StringIO import StringIO
 from mock import patch
 
 from Model.Sample import Sample
+from Model.RowSchema import RowSchema
+from Model.SequencingRun import SequencingRun
 from Parsers.miseqParser import (
-    parse_metadata, parse_samples, get_csv_reader,
+    parse_metadata, parse_samples, get_csv_reader, read_sample_sheet,
     get_pair_files,
     get_all_fastq_files,
     parse_out_sequence_file,
-    complete_parse_samples)
+    complete_parse_samples,
+    index_fastq_files,
+    find_sample_files)
 from Exceptions.SampleSheetError import SampleSheetError
 
 path_to_module = path.abspath(path.dirname(__file__))
@@ -135,6 +140,46 @@ class TestMiSeqParser(unittest.TestCase):
             pf_list = get_pair_files(fastq_files, sample.get_id())
             self.assertEqual(pf_list, sample.get_files())
 
+    def test_complete_parse_samples_shares_columns(self):
+
+        sheet_file = path.join(path_to_module, "fake_ngs_data",
+                               "SampleSheet.csv")
+
+        sample_list = complete_parse_samples(sheet_file)
+
+        # the column names are stored once for the run, not in every sample
+        self.assertEqual(len(set(id(sample._schema) for sample in sample_list)), 1)
+        self.assertEqual(len(set(id(sample.seq_file._schema) for sample in sample_list)), 1)
+        self.assertEqual(sample_list[0].seq_file.get("Sample_Well"), "01")
+        self.assertEqual(sample_list[0].seq_file.get("sampleName"), None)
+        self.assertEqual(sample_list[1].get_sample_metadata()["index"], "GGGGGGGG")
+
+        run = SequencingRun({}, sample_list, sheet_file)
+        self.assertEqual(sample_list[0].upload_completed_topic, run.upload_completed_topic + ".01-1111")
+        self.assertIs(sample_list[0].upload_completed_topic, sample_list[0].upload_completed_topic)
+
+        # samples are compact: no per-instance dictionary for extra attributes
+        with self.assertRaises(AttributeError):
+            sample_list[0].pair_files_byte_size = 1
+
+    def test_columns_released_with_samples(self):
+
+        sheet_file = path.join(path_to_module, "fake_ngs_data",
+                               "SampleSheet.csv")
+        sample_list = complete_parse_samples(sheet_file)
+        sheet_keys = sample_list[0]._schema.keys
+        # e.g. a sample from the server, with columns that no sheet has
+        server_sample = Sample({"sampleName": "01-1111", "createdDate": 1, "sequencerSampleId": "01-1111"})
+        server_keys = server_sample._schema.keys
+        self.assertIs(RowSchema.for_keys(server_keys), server_sample._schema)
+
+        del sample_list, server_sample
+        gc.collect()
+
+        # the column names aren't kept once no sample uses them
+        self.assertNotIn(sheet_keys, RowSchema._schemas)
+        self.assertNotIn(server_keys, RowSchema._schemas)
+
     def test_parse_samples(self):
 
         sheet_file = path.join(path_to_module, "fake_ngs_data",
@@ -401,3 +446,54 @@ class TestMiSeqParser(unittest.TestCase):
             self.assertTrue(sample.is_paired_end())
             for file_name in sample.get_files():
                 self.assertTrue(path.basename(file_name).startswith(sample.sample_name))
+
+    def test_read_sample_sheet(self):
+        sheet_file = path.join(path_to_module, "fake_ngs_data", "SampleSheet.csv")
+
+        sample_sheet = read_sample_sheet(sheet_file)
+
+        self.assertEqual(sample_sheet.path, sheet_file)
+        self.assertEqual(sample_sheet.sections, ("[Header]", "[Reads]", "[Settings]", "[Data]"))
+        self.assertEqual(sample_sheet.preamble, ())
+        self.assertEqual(sample_sheet.header[0], ("IEMFileVersion", "4"))
+        self.assertEqual(sample_sheet.reads, (("251",), ("250",)))
+        self.assertEqual(sample_sheet.settings, (("ReverseComplement", "0"), ("Adapter", "AAAAGGGGAAAAGGGGAAA")))
+        self.assertEqual(sample_sheet.data_headers[0], "Sample_ID")
+        self.assertEqual(len(sample_sheet.data_rows), 3)
+        self.assertEqual(sample_sheet.data_rows[2][0], "03-3333")
+
+        # the parsers give the same results from the path or the sheet that was read
+        self.assertEqual(parse_metadata(sample_sheet), parse_metadata(sheet_file))
+        self.assertEqual([sample.get_dict() for sample in parse_samples(sample_sheet)],
+                         [sample.get_dict() for sample in parse_samples(sheet_file)])
+
+    def test_read_sample_sheet_without_data(self):
+        sample_sheet = read_sample_sheet(path.join(path_to_module, "testSampleSheets", "emptySampleSheet.csv"))
+
+        self.assertFalse("[Data]" in sample_sheet.sections)
+        self.assertEqual(sample_sheet.data_headers, None)
+        self.assertEqual(sample_sheet.data_rows, ())
+
+    def test_find_sample_files(self):
+        file_list = ["01-1_S1_L001_R1_001.fastq.gz", "01-1_S1_L001_R2_001.fastq.gz",
+                     "01-11_S2_L001_R1_001.fastq.gz", "01-11_S2_L002_R1_001.fastq.gz",
+                     "01-111_S7_L001_R1_001.fastq.gz",
+                     "run-01-1111_S4_L001_R1_001.fastq.gz",
+                     "01-1_S1_L001_R1_001.txt", "Undetermined_S0_L001_R1_001.fastq.gz"]
+        file_index = index_fastq_files(file_list)
+
+        def sample(sample_id, sample_number):
+            return Sample({"sequencerSampleId": sample_id, "sampleName": sample_id}, sample_number=sample_number)
+
+        # files named with the sample name and number
+        self.assertEqual(sorted(find_sample_files(sample("01-1", 1), file_index, file_list)),
+                         ["01-1_S1_L001_R1_001.fastq.gz", "01-1_S1_L001_R2_001.fastq.gz"])
+        self.assertEqual(find_sample_files(sample("01-11", 2), file_index, file_list),
+                         ["01-11_S2_L001_R1_001.fastq.gz", "01-11_S2_L002_R1_001.fastq.gz"])
+        # files named with the sample ID and a different sample number
+        self.assertEqual(find_sample_files(sample("01-111", 3), file_index, file_list),
+                         ["01-111_S7_L001_R1_001.fastq.gz"])
+        # files with the sample name in the middle of the file name
+        self.assertEqual(find_sample_files(sample("01-1111", 4), file_index, file_list),
+                         ["run-01-1111_S4_L001_R1_001.fastq.gz"])
+        self.assertEqual(find_sample_files(sample("02-2222", 5), file_index, file_list), [])
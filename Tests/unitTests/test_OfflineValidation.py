@@ -1,11 +1,18 @@
 import unittest
+import gzip
+import os
+import shutil
+import tempfile
 from os import path
 
 from Validation.offlineValidation import (
     validate_sample_sheet,
     validate_sample_list,
+    validate_sequence_files,
+    validate_read_counts,
     validate_URL_form)
 from Model.Sample import Sample
+from Model.SequenceFile import SequenceFile
 
 path_to_module = path.dirname(__file__)
 if len(path_to_module) == 0:
@@ -66,6 +73,14 @@ class TestOfflineValidation(unittest.TestCase):
         self.assertTrue(
             "[Header] section not found in SampleSheet" in v_res.get_errors())
 
+    def test_validate_sample_sheet_header_sect_after_data(self):
+
+        # the [Header] section is found after [Data] as well as before it
+        csv_file = path.join(
+            path_to_module, "testSampleSheets", "headerAfterData.csv")
+        v_res = validate_sample_sheet(csv_file)
+        self.assertTrue(v_res.is_valid())
+
     def test_validate_sample_list_valid(self):
 
         sample1 = Sample({
@@ -190,6 +205,74 @@ class TestOfflineValidation(unittest.TestCase):
         self.assertTrue(
             "The given list of samples is empty" in v_res.get_errors())
 
+    def test_validate_sequence_files(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = []
+        for read in ["R1", "R2"]:
+            files.append(path.join(directory, "01-1111_S1_L001_{}_001.fastq.gz".format(read)))
+            fastq = gzip.open(files[-1], "wb")
+            fastq.write("@read\nACGT\n+\nIIII\n" * 100)
+            fastq.close()
+        sample = Sample({"sampleName": "01-1111", "sampleProject": "1"})
+        sample.set_seq_file(SequenceFile({}, list(files)))
+
+        self.assertTrue(validate_sequence_files([sample]).is_valid())
+        self.assertTrue(validate_sequence_files([sample], verify_crc=True).is_valid())
+
+        # a copy of the file that was interrupted
+        with open(files[1], "r+b") as fastq:
+            fastq.truncate(path.getsize(files[1]) - 10)
+        v_res = validate_sequence_files([sample])
+        self.assertFalse(v_res.is_valid())
+        self.assertEqual(v_res.error_count(), 1)
+        self.assertTrue(files[1] + " is truncated" in v_res.get_errors())
+
+    def test_validate_sequence_files_single_large_member(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = path.join(directory, "01-1111_S1_L001_R1_001.fastq.gz")
+        # doesn't compress, so the start of the only member isn't in the part of the file that's read
+        fastq = gzip.open(filename, "wb")
+        fastq.write(os.urandom(256 * 1024))
+        fastq.close()
+        sample = Sample({"sampleName": "01-1111", "sampleProject": "1"})
+        sample.set_seq_file(SequenceFile({}, [filename]))
+
+        self.assertTrue(validate_sequence_files([sample]).is_valid())
+
+        # the end of the file doesn't show that it was cut short, so the whole file is checked
+        with open(filename, "r+b") as fastq:
+            fastq.truncate(path.getsize(filename) - 10)
+        v_res = validate_sequence_files([sample])
+        self.assertFalse(v_res.is_valid())
+        self.assertTrue(filename + " is damaged or truncated" in v_res.get_errors())
+
+    def test_validate_read_counts(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = []
+        for read, count in [("R1", 100), ("R2", 99)]:
+            files.append(path.join(directory, "01-1111_S1_L001_{}_001.fastq.gz".format(read)))
+            fastq = gzip.open(files[-1], "wb")
+            fastq.write("@read\nACGT\n+\nIIII\n" * count)
+            fastq.close()
+        sample = Sample({"sequencerSampleId": "01-1111", "sampleName": "01-1111", "sampleProject": "1"})
+        sample.set_seq_file(SequenceFile({}, list(files)))
+        single_end = Sample({"sequencerSampleId": "02-2222", "sampleName": "02-2222", "sampleProject": "1"})
+        single_end.set_seq_file(SequenceFile({}, [files[0]]))
+
+        v_res = validate_read_counts([sample, single_end])
+        self.assertFalse(v_res.is_valid())
+        self.assertEqual(v_res.error_list(), [
+            "Sample 01-1111 has 100 reads in {} but 99 reads in {}, "
+            "the files should have the same number of reads.".format(files[0], files[1])])
+
+        self.assertTrue(validate_read_counts([single_end]).is_valid())
+
     def test_validate_URL_form(self):
 
         url_list = [
@@ -0,0 +1,62 @@
+import unittest
+import os
+import stat
+import shutil
+import tempfile
+from os import path
+from time import time
+
+from API.catalogcache import CatalogCache, CachedResponse, conditional_headers, open_catalog_cache
+
+
+class TestCatalogCache(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        self.cache_file = path.join(self.directory, "cache", "catalog-cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_responses_kept_between_sessions(self):
+        cache = CatalogCache(self.cache_file)
+        cache.store_response("projects", '"v1"', None, '{"resource": {"resources": []}}')
+        # responses that can't be revalidated aren't kept
+        cache.store_response("samples", None, None, '{"resource": {"resources": []}}')
+        cache.close()
+
+        cache = CatalogCache(self.cache_file)
+        self.assertEqual(cache.response("projects"), CachedResponse('"v1"', None, '{"resource": {"resources": []}}'))
+        self.assertTrue(cache.response("samples") is None)
+
+        cache.update_body("projects", '{"resource": {"resources": [{}]}}')
+        self.assertEqual(cache.response("projects"),
+                         CachedResponse('"v1"', None, '{"resource": {"resources": [{}]}}'))
+        cache.close()
+
+    def test_conditional_headers(self):
+        self.assertEqual(conditional_headers(CachedResponse('"v1"', "Tue, 01 May 2018 00:00:00 GMT", "")),
+                         {"If-None-Match": '"v1"', "If-Modified-Since": "Tue, 01 May 2018 00:00:00 GMT"})
+        self.assertEqual(conditional_headers(CachedResponse(None, "Tue, 01 May 2018 00:00:00 GMT", "")),
+                         {"If-Modified-Since": "Tue, 01 May 2018 00:00:00 GMT"})
+
+    def test_access_tokens_expire(self):
+        cache = CatalogCache(self.cache_file)
+        cache.store_access_token("user", "token", time() + 100)
+        cache.store_access_token("other-user", "other-token", time() - 1)
+
+        self.assertEqual(cache.access_token("user")[0], "token")
+        self.assertTrue(cache.access_token("user", margin=200) is None)
+        self.assertTrue(cache.access_token("other-user") is None)
+        self.assertTrue(cache.access_token("nobody") is None)
+        cache.close()
+
+    def test_only_readable_by_user(self):
+        CatalogCache(self.cache_file).close()
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache_file).st_mode), 0600)
+        self.assertEqual(stat.S_IMODE(os.stat(path.dirname(self.cache_file)).st_mode) & 0077, 0)
+
+    def test_unusable_cache(self):
+        self.assertTrue(open_catalog_cache(self.directory) is None)
@@ -0,0 +1,66 @@
+import unittest
+import sys
+import subprocess
+from os import path
+
+from mock import patch, MagicMock
+
+import run_IRIDA_Uploader_cli
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+
+    def test_cli_does_not_import_wx(self):
+        package_dir = path.dirname(path.abspath(run_IRIDA_Uploader_cli.__file__))
+        imports_wx = subprocess.check_output([sys.executable, "-c",
+                                              "import sys, run_IRIDA_Uploader_cli; print 'wx' in sys.modules"],
+                                             cwd=package_dir)
+
+        self.assertEqual(imports_wx.strip(), "False")
+
+    @patch("run_IRIDA_Uploader_cli.upload_run_to_server")
+    @patch("run_IRIDA_Uploader_cli.find_runs_in_directory")
+    @patch("run_IRIDA_Uploader_cli.connect_to_irida")
+    def test_upload_runs(self, connect_to_irida, find_runs_in_directory, upload_run_to_server):
+        runs = [MagicMock(), MagicMock()]
+        find_runs_in_directory.return_value = runs
+
+        self.assertTrue(run_IRIDA_Uploader_cli.upload_runs("/runs"))
+
+        find_runs_in_directory.assert_called_with("/runs")
+        self.assertEqual([kwargs["sequencing_run"] for args, kwargs in upload_run_to_server.call_args_list], runs)
+        self.assertTrue(all(kwargs["api"] is connect_to_irida.return_value
+                            for args, kwargs in upload_run_to_server.call_args_list))
+
+    @patch("run_IRIDA_Uploader_cli.upload_run_to_server")
+    @patch("run_IRIDA_Uploader_cli.find_runs_in_directory")
+    @patch("run_IRIDA_Uploader_cli.connect_to_irida")
+    def test_upload_runs_continues_after_failure(self, connect_to_irida, find_runs_in_directory,
+                                                 upload_run_to_server):
+        find_runs_in_directory.return_value = [MagicMock(), MagicMock()]
+        upload_run_to_server.side_effect = [Exception("failed"), None]
+
+        self.assertFalse(run_IRIDA_Uploader_cli.upload_runs("/runs"))
+        self.assertEqual(upload_run_to_server.call_count, 2)
+
+    @patch("run_IRIDA_Uploader_cli.find_runs_in_directory")
+    @patch("run_IRIDA_Uploader_cli.connect_to_irida")
+    def test_upload_runs_connection_failure(self, connect_to_irida, find_runs_in_directory):
+        connect_to_irida.side_effect = ValueError("garbled")
+
+        self.assertFalse(run_IRIDA_Uploader_cli.upload_runs("/runs"))
+        self.assertFalse(find_runs_in_directory.called)
+
+    @patch("run_IRIDA_Uploader_cli.read_config_option", return_value=None)
+    @patch("run_IRIDA_Uploader_cli._configure_logging")
+    @patch("run_IRIDA_Uploader_cli.upload_run_to_server")
+    @patch("run_IRIDA_Uploader_cli.connect_to_irida")
+    def test_invalid_sample_sheet_exit_status(self, connect_to_irida, upload_run_to_server, configure_logging,
+                                              read_config_option):
+        invalid_run = path.join(path.dirname(path.abspath(__file__)), "super-invalid-sample-sheet")
+
+        self.assertEqual(run_IRIDA_Uploader_cli.main([invalid_run]), 1)
+        self.assertFalse(upload_run_to_server.called)
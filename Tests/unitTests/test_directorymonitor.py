@@ -0,0 +1,129 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+import threading
+from os import path
+
+from mock import patch
+
+import API.directorymonitor
+from API.directorymonitor import watch_directory, monitor_directory
+from API.inotify import filesystem_type, can_watch
+
+
+@unittest.skipIf(not can_watch(tempfile.gettempdir()), "inotify isn't available")
+class TestWatchDirectory(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        self.uploaded = []
+        self.on_created = patch("API.directorymonitor.on_created",
+                                new=lambda completed_job_info, cond: self.uploaded.append(completed_job_info))
+        self.on_created.start()
+        API.directorymonitor.start_monitoring()
+
+    def tearDown(self):
+        API.directorymonitor.stop_monitoring()
+        self.watcher.join()
+        self.on_created.stop()
+        API.directorymonitor.start_monitoring()
+        shutil.rmtree(self.directory)
+
+    def _make_run(self, name, completed=False, uploaded=False):
+        run_directory = path.join(self.directory, name)
+        os.mkdir(run_directory)
+        if completed:
+            open(path.join(run_directory, "CompletedJobInfo.xml"), "w").close()
+        if uploaded:
+            open(path.join(run_directory, ".miseqUploaderInfo"), "w").close()
+        return run_directory
+
+    def _watch(self):
+        self.watcher = threading.Thread(target=watch_directory, args=(self.directory, threading.Condition()))
+        self.watcher.start()
+        # wait for the runs that were already finished to be searched for
+        time.sleep(0.2)
+
+    def _wait_for_uploads(self, count):
+        deadline = time.time() + 5
+        while len(self.uploaded) < count and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_finished_run_uploaded(self):
+        run_directory = self._make_run("run1")
+        self._watch()
+        self.assertEqual(self.uploaded, [])
+
+        with open(path.join(run_directory, "CompletedJobInfo.xml"), "w") as completed_job_info:
+            completed_job_info.write("<CompletedJobInfo/>")
+        self._wait_for_uploads(1)
+
+        self.assertEqual(self.uploaded, [path.join(run_directory, "CompletedJobInfo.xml")])
+
+    def test_new_run_directory_uploaded(self):
+        self._watch()
+
+        run_directory = self._make_run("run1")
+        time.sleep(0.2)
+        open(path.join(run_directory, "CompletedJobInfo.xml"), "w").close()
+        # a finished run that's copied in is found too
+        copied_run = path.join(self.directory, "run2")
+        staging = tempfile.mkdtemp()
+        open(path.join(staging, "CompletedJobInfo.xml"), "w").close()
+        os.rename(staging, copied_run)
+        self._wait_for_uploads(2)
+
+        self.assertEqual(sorted(self.uploaded), [path.join(run_directory, "CompletedJobInfo.xml"),
+                                                 path.join(copied_run, "CompletedJobInfo.xml")])
+
+    def test_runs_finished_before_watching_uploaded(self):
+        finished_run = self._make_run("run1", completed=True)
+        self._make_run("run2", completed=True, uploaded=True)
+        self._make_run("run3")
+        self._watch()
+
+        self.assertEqual(self.uploaded, [path.join(finished_run, "CompletedJobInfo.xml")])
+
+
+class TestMonitorDirectory(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+
+    def test_filesystem_type(self):
+        mounts = tempfile.NamedTemporaryFile()
+        mounts.write("/dev/sda1 / ext4 rw 0 0\n"
+                     "server:/export /mnt/miseq nfs4 rw 0 0\n"
+                     "//server/runs /mnt/miseq\\040runs cifs rw 0 0\n")
+        mounts.flush()
+
+        self.assertEqual(filesystem_type("/mnt/miseq/run1", mounts.name), "nfs4")
+        self.assertEqual(filesystem_type("/mnt/miseq runs/run1", mounts.name), "cifs")
+        self.assertEqual(filesystem_type("/mnt/miseq2", mounts.name), "ext4")
+
+    @patch("API.directorymonitor.time.sleep")
+    @patch("API.directorymonitor.poll_directory")
+    @patch("API.directorymonitor.watch_directory")
+    @patch("API.directorymonitor.can_watch")
+    def test_polls_when_events_unavailable(self, can_watch, watch_directory, poll_directory, sleep):
+        can_watch.return_value = False
+
+        monitor_directory("/runs", None)
+
+        self.assertFalse(watch_directory.called)
+        poll_directory.assert_called_with("/runs", None)
+
+    @patch("API.directorymonitor.time.sleep")
+    @patch("API.directorymonitor.poll_directory")
+    @patch("API.directorymonitor.watch_directory")
+    @patch("API.directorymonitor.can_watch")
+    def test_polls_when_watching_fails(self, can_watch, watch_directory, poll_directory, sleep):
+        can_watch.return_value = True
+        watch_directory.side_effect = OSError(28, "No space left on device")
+
+        monitor_directory("/runs", None)
+
+        poll_directory.assert_called_with("/runs", None)
@@ -1,7 +1,19 @@
 import unittest
+import os
+import json
+import time
+import gzip
+import shutil
+import tempfile
 from os import path
 
-from API.directoryscanner import find_runs_in_directory
+from mock import patch
+
+from API.pubsub import pub
+from Parsers.miseqParser import get_csv_reader
+from API.directoryscanner import find_runs_in_directory, process_sample_sheet, discover_runs, DirectoryScannerTopics, \
+    ValidationSettings
+from Exceptions.SequenceFileError import SequenceFileError
 
 path_to_module = path.abspath(path.dirname(__file__))
 
@@ -31,3 +43,206 @@ class TestDirectoryScanner(unittest.TestCase):
     def test_find_sample_sheet_name_variations(self):
         runs = find_runs_in_directory(path.join(path_to_module, "sample-sheet-name-variations"))
         self.assertEqual(1, len(runs))
+
+    def test_sample_sheet_read_once(self):
+        sheet_file = path.join(path_to_module, "single_end", "SampleSheet.csv")
+        with patch("Parsers.miseqParser.get_csv_reader", wraps=get_csv_reader) as csv_reader:
+            process_sample_sheet(sheet_file)
+
+        csv_reader.assert_called_once_with(sheet_file)
+
+    def test_truncated_file(self):
+        run_directory = path.join(tempfile.mkdtemp(), "extra-metadata")
+        self.addCleanup(shutil.rmtree, path.dirname(run_directory))
+        shutil.copytree(path.join(path_to_module, "extra-metadata"), run_directory)
+        self.assertEqual(process_sample_sheet(path.join(run_directory, "SampleSheet.csv")).sample_list[0].get_id(),
+                         "C16")
+
+        fastq = path.join(run_directory, "Data", "Intensities", "BaseCalls", "C16_S1_L001_R2_001.fastq.gz")
+        with open(fastq, "r+b") as fastq_file:
+            fastq_file.truncate(500)
+        with self.assertRaises(SequenceFileError) as context:
+            process_sample_sheet(path.join(run_directory, "SampleSheet.csv"))
+        self.assertTrue(fastq + " is truncated" in context.exception.message)
+
+    def test_mismatched_read_counts(self):
+        run_directory = path.join(tempfile.mkdtemp(), "extra-metadata")
+        self.addCleanup(shutil.rmtree, path.dirname(run_directory))
+        shutil.copytree(path.join(path_to_module, "extra-metadata"), run_directory)
+        base_calls = path.join(run_directory, "Data", "Intensities", "BaseCalls")
+        reads = gzip.open(path.join(base_calls, "C16_S1_L001_R1_001.fastq.gz")).read()
+        fastq = gzip.open(path.join(base_calls, "C16_S1_L001_R2_001.fastq.gz"), "wb")
+        fastq.write("\n".join(reads.split("\n")[:-5]) + "\n")
+        fastq.close()
+
+        options = {"verify_read_counts": True}
+        with patch("API.directoryscanner.read_config_option",
+                   side_effect=lambda key, expected_type=None, default_value=None: options.get(key, default_value)):
+            with self.assertRaises(SequenceFileError) as context:
+                process_sample_sheet(path.join(run_directory, "SampleSheet.csv"))
+            self.assertTrue("Sample C16 has" in context.exception.message)
+
+            # the counts are only checked when they're asked for
+            options["verify_read_counts"] = False
+            process_sample_sheet(path.join(run_directory, "SampleSheet.csv"))
+
+
+class TestScanIndex(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        self.runs_directory = path.join(self.directory, "runs")
+        os.mkdir(self.runs_directory)
+        for run in ["single_end", "completed"]:
+            shutil.copytree(path.join(path_to_module, run), path.join(self.runs_directory, run), symlinks=True)
+        self.scan_index_file = patch("API.directoryscanner.scan_index_file",
+                                     path.join(self.directory, "index", "scan-index.sqlite"))
+        self.scan_index_file.start()
+
+    def tearDown(self):
+        self.scan_index_file.stop()
+        shutil.rmtree(self.directory)
+
+    def _find_runs(self):
+        discovered = []
+        listener = lambda run: discovered.append(run)
+        pub.subscribe(listener, DirectoryScannerTopics.run_discovered)
+        try:
+            with patch("API.directoryscanner.process_sample_sheet", wraps=process_sample_sheet) as process, \
+                    patch("API.directoryscanner.json.load", wraps=json.load) as load_info:
+                runs = find_runs_in_directory(self.runs_directory)
+        finally:
+            pub.unsubscribe(listener, DirectoryScannerTopics.run_discovered)
+        self.assertEqual(discovered, runs)
+        return runs, process.call_count, load_info.call_count
+
+    def test_unchanged_runs_not_parsed_again(self):
+        runs, parsed, info_files_read = self._find_runs()
+        self.assertEqual((len(runs), parsed, info_files_read), (1, 1, 1))
+
+        cached_runs, parsed, info_files_read = self._find_runs()
+
+        self.assertEqual((len(cached_runs), parsed, info_files_read), (1, 0, 0))
+        self.assertIsNot(cached_runs[0], runs[0])
+        self.assertEqual(cached_runs[0].sample_sheet, runs[0].sample_sheet)
+        self.assertEqual([sample.get_files() for sample in cached_runs[0].sample_list],
+                         [sample.get_files() for sample in runs[0].sample_list])
+        self.assertTrue(all(sample.run is cached_runs[0] for sample in cached_runs[0].sample_list))
+
+    def test_changed_runs_parsed_again(self):
+        self._find_runs()
+        run_directory = path.join(self.runs_directory, "single_end")
+        sample_sheet = path.join(run_directory, "SampleSheet.csv")
+        os.utime(sample_sheet, (0, path.getmtime(sample_sheet) + 1))
+        with open(path.join(self.runs_directory, "completed", ".miseqUploaderInfo"), "w") as info_file:
+            json.dump({"Upload Status": "Complete"}, info_file)
+
+        runs, parsed, info_files_read = self._find_runs()
+
+        self.assertEqual((len(runs), parsed, info_files_read), (1, 1, 1))
+
+    def test_runs_checked_again_when_files_rewritten(self):
+        self._find_runs()
+        base_calls = path.join(self.runs_directory, "single_end", "Data", "Intensities", "BaseCalls")
+        fastq = path.join(base_calls, "01-1111_S1_L001_R1_001.fastq.gz")
+        # copied again over the old file, so the listing of the directory doesn't change
+        with open(fastq, "rb") as fastq_file:
+            contents = fastq_file.read()
+        with open(fastq, "r+b") as fastq_file:
+            fastq_file.write(contents)
+        os.utime(fastq, (0, path.getmtime(fastq) + 10))
+
+        runs, parsed, info_files_read = self._find_runs()
+
+        self.assertEqual((len(runs), parsed), (1, 1))
+
+    def test_runs_checked_again_when_checks_turned_on(self):
+        self._find_runs()
+
+        with patch("API.directoryscanner.validation_settings",
+                   return_value=ValidationSettings(verify_gzip_crc=False, verify_read_counts=True)):
+            runs, parsed, info_files_read = self._find_runs()
+
+        self.assertEqual((len(runs), parsed), (1, 1))
+
+    def test_runs_found_without_index(self):
+        with patch("API.directoryscanner.scan_index_file", path.join(self.runs_directory, "completed",
+                                                                      "SampleSheet.csv", "scan-index.sqlite")):
+            runs, parsed, info_files_read = self._find_runs()
+
+        self.assertEqual((len(runs), parsed, info_files_read), (1, 1, 1))
+
+
+class TestDiscoverRuns(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        for run in ["run1", "run2", "run3"]:
+            shutil.copytree(path.join(path_to_module, "single_end"), path.join(self.directory, run), symlinks=True)
+        shutil.copytree(path.join(path_to_module, "super-invalid-sample-sheet"),
+                        path.join(self.directory, "invalid"), symlinks=True)
+        os.mkdir(path.join(self.directory, "missing-files"))
+        shutil.copy(path.join(path_to_module, "single_end", "SampleSheet.csv"), path.join(self.directory, "missing-files"))
+        os.makedirs(path.join(self.directory, "missing-files", "Data", "Intensities", "BaseCalls"))
+
+        self.messages = []
+        self.listeners = {}
+        for topic in [DirectoryScannerTopics.run_discovered, DirectoryScannerTopics.garbled_sample_sheet,
+                      DirectoryScannerTopics.missing_files]:
+            self.listeners[topic] = lambda topic=topic, **kwargs: self.messages.append((topic, kwargs))
+            pub.subscribe(self.listeners[topic], topic)
+
+    def tearDown(self):
+        for topic, listener in self.listeners.items():
+            pub.unsubscribe(listener, topic)
+        shutil.rmtree(self.directory)
+
+    def _find_runs(self, max_concurrent_scans):
+        del self.messages[:]
+        with patch("API.directoryscanner.open_scan_index", return_value=None), \
+                patch("API.directoryscanner.read_config_option", return_value=max_concurrent_scans):
+            runs = find_runs_in_directory(self.directory)
+        errors = sorted((topic, kwargs["sample_sheet"], str(kwargs["error"]))
+                        for topic, kwargs in self.messages if topic != DirectoryScannerTopics.run_discovered)
+        discovered = [kwargs["run"] for topic, kwargs in self.messages if topic == DirectoryScannerTopics.run_discovered]
+        return runs, discovered, errors
+
+    def test_concurrent_scan_same_as_serial(self):
+        runs, discovered, errors = self._find_runs(1)
+        concurrent_runs, concurrent_discovered, concurrent_errors = self._find_runs(4)
+
+        self.assertEqual(len(runs), 3)
+        self.assertEqual([run.sample_sheet for run in concurrent_runs], [run.sample_sheet for run in runs])
+        self.assertEqual(sorted(concurrent_discovered), sorted(concurrent_runs))
+        self.assertEqual(len(errors), 2)
+        self.assertEqual([topic for topic, sheet, error in errors],
+                         [DirectoryScannerTopics.garbled_sample_sheet, DirectoryScannerTopics.missing_files])
+        self.assertEqual(concurrent_errors, errors)
+
+    def test_sheets_parsed_concurrently(self):
+        sheets = ["sheet{}".format(i) for i in xrange(6)]
+        active = []
+        most_active = []
+
+        def process_sample_sheet(sheet):
+            active.append(sheet)
+            most_active.append(len(active))
+            time.sleep(0.05)
+            active.remove(sheet)
+            return sheet.upper()
+
+        with patch("API.directoryscanner.process_sample_sheet", side_effect=process_sample_sheet):
+            runs = discover_runs(sheets, max_concurrent_scans=3)
+
+        self.assertEqual(runs, [sheet.upper() for sheet in sheets])
+        self.assertEqual(max(most_active), 3)
+
+    def test_unexpected_error_raised(self):
+        with patch("API.directoryscanner.process_sample_sheet", side_effect=IOError("disconnected")) as process:
+            with self.assertRaises(IOError):
+                discover_runs(["sheet{}".format(i) for i in xrange(6)], max_concurrent_scans=2)
+
+        # no more sheets are started once a sheet has failed
+        self.assertTrue(process.call_count <= 2)
@@ -0,0 +1,48 @@
+import unittest
+import shutil
+import tempfile
+from os import path, urandom
+
+from mock import patch
+
+from API.fileblocks import read_file_blocks
+
+
+class TestFileBlocks(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        self.filename = path.join(self.directory, "01-1111_S1_L001_R1_001.fastq.gz")
+        self.contents = urandom(100000)
+        with open(self.filename, "wb") as fastq:
+            fastq.write(self.contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read(self, block_times):
+        blocks = []
+        with patch("API.fileblocks.time", side_effect=block_times):
+            for block in read_file_blocks(self.filename, min_read_size=1000, max_read_size=16000,
+                                          target_block_time=1):
+                blocks.append(block.tobytes())
+        return blocks
+
+    def test_blocks_grow_when_consumed_quickly(self):
+        blocks = self._read([0, 0] * 100)
+
+        self.assertEqual("".join(blocks), self.contents)
+        self.assertEqual([len(block) for block in blocks[:6]], [1000, 2000, 4000, 8000, 16000, 16000])
+
+    def test_blocks_shrink_when_consumed_slowly(self):
+        # two quick blocks, then every block takes 3 times too long
+        blocks = self._read([0, 0, 0, 0] + [0, 3] * 100)
+
+        self.assertEqual("".join(blocks), self.contents)
+        self.assertEqual([len(block) for block in blocks[:5]], [1000, 2000, 4000, 2000, 1000])
+
+    def test_empty_file(self):
+        open(self.filename, "wb").close()
+
+        self.assertEqual(list(read_file_blocks(self.filename)), [])
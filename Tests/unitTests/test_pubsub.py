@@ -0,0 +1,131 @@
+import unittest
+import gc
+
+from mock import patch
+
+from API.pubsub import Publisher, ProgressMessages
+
+
+class Listener(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def on_progress(self, progress):
+        self.messages.append(progress)
+
+    def on_completed(self, sample=None):
+        self.messages.append(sample)
+
+    def on_anything(self, **kwargs):
+        self.messages.append(kwargs)
+
+    def on_topic(self, progress, topic=Publisher.AUTO_TOPIC):
+        self.messages.append((topic.getName(), progress))
+
+
+class TestPublisher(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.pub = Publisher()
+        self.listener = Listener()
+
+    def test_send_message(self):
+        self.pub.subscribe(self.listener.on_progress, "run.progress")
+
+        self.pub.sendMessage("run.progress", progress=10)
+        self.pub.sendMessage("run.completed", sample="01-1111")
+
+        self.assertEqual(self.listener.messages, [10])
+
+    def test_subtopics_delivered_to_parent_listeners(self):
+        self.pub.subscribe(self.listener.on_topic, "run.progress")
+        self.pub.subscribe(self.listener.on_completed, "run.completed")
+
+        self.pub.sendMessage("run.progress.01-1111", progress=10)
+        self.pub.sendMessage("run.progress", progress=20)
+        self.pub.sendMessage("run.completed.01-1111", sample="01-1111")
+        self.pub.sendMessage("run.completed")
+
+        self.assertEqual(self.listener.messages, [("run.progress.01-1111", 10), ("run.progress", 20),
+                                                  "01-1111", None])
+
+    def test_listeners_only_get_arguments_they_accept(self):
+        self.pub.subscribe(self.listener.on_progress, "run.progress")
+        self.pub.subscribe(self.listener.on_anything, "run.progress")
+
+        self.pub.sendMessage("run.progress", progress=10, sample="01-1111")
+
+        self.assertEqual(self.listener.messages, [10, {"progress": 10, "sample": "01-1111"}])
+
+    def test_function_listener(self):
+        received = []
+
+        def on_progress(progress):
+            received.append(progress)
+
+        self.pub.subscribe(on_progress, "run.progress")
+        # subscribing again doesn't send messages twice
+        self.pub.subscribe(on_progress, "run.progress")
+        self.pub.sendMessage("run.progress", progress=10)
+
+        self.assertEqual(received, [10])
+
+    def test_unsubscribe(self):
+        self.pub.subscribe(self.listener.on_progress, "run.progress")
+        self.assertTrue(self.pub.isSubscribed(self.listener.on_progress, "run.progress"))
+
+        self.pub.unsubscribe(self.listener.on_progress, "run.progress")
+        self.pub.sendMessage("run.progress", progress=10)
+
+        self.assertFalse(self.pub.isSubscribed(self.listener.on_progress, "run.progress"))
+        self.assertEqual(self.listener.messages, [])
+
+    def test_listener_unsubscribed_when_deleted(self):
+        self.pub.subscribe(self.listener.on_progress, "run.progress")
+
+        self.listener = None
+        gc.collect()
+        self.pub.sendMessage("run.progress", progress=10)
+
+        self.assertEqual(self.pub._listeners, {})
+
+
+@patch("API.pubsub.send_message")
+class TestProgressMessages(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+
+    def _sent(self, send_message):
+        return [kwargs["progress"] for args, kwargs in send_message.call_args_list]
+
+    def test_progress_coalesced_by_time(self, send_message):
+        progress = ProgressMessages("sample.progress", interval=1, min_bytes=10)
+
+        with patch("API.pubsub.time", side_effect=[10, 10.5, 11, 11.2, 12]):
+            for sent in [100, 200, 300, 400, 500]:
+                progress.update(sent)
+
+        self.assertEqual(self._sent(send_message), [100, 300, 500])
+        send_message.assert_called_with("sample.progress", progress=500)
+
+    def test_progress_coalesced_by_bytes(self, send_message):
+        progress = ProgressMessages("sample.progress", interval=0, min_bytes=100)
+
+        for sent in [50, 99, 100, 150, 250]:
+            progress.update(sent)
+
+        self.assertEqual(self._sent(send_message), [100, 250])
+
+    def test_finish_sends_final_progress(self, send_message):
+        progress = ProgressMessages("sample.progress", interval=60, min_bytes=10)
+
+        progress.update(100)
+        progress.update(150)
+        progress.finish()
+        # nothing new to send
+        progress.finish()
+
+        self.assertEqual(self._sent(send_message), [100, 150])
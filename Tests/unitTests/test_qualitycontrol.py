@@ -0,0 +1,245 @@
+import unittest
+import gzip
+import zlib
+import random
+import os
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from os import path
+
+from mock import patch
+
+from API.qualitycontrol import (fastq_file_stats, fastq_stats, fastq_stats_for_files, FastqStatsStream,
+                                gzip_end_status, gzip_crc_valid, verify_gzip_files, count_reads,
+                                count_reads_in_files, GZIP_COMPLETE,
+                                GZIP_TRUNCATED, GZIP_UNKNOWN, GZIP_NOT_COMPRESSED, GZIP_MAGIC, GZIP_PROBE_SIZE)
+
+# two 4-base reads and one 6-base read: 6 of the 14 bases are G or C, and the
+# quality scores are 40 ("I") and 20 ("5")
+FASTQ = ("@read1\nACGT\n+\nIIII\n"
+         "@read2\nGGCCAA\n+\n555555\n"
+         "@read3\nAATT\n+\nIIII\n")
+
+
+class _CountingFile(object):
+    """Count the bytes that are read from a file."""
+
+    def __init__(self, wrapped, bytes_read):
+        self._file = wrapped
+        self._bytes_read = bytes_read
+
+    def read(self, *args):
+        data = self._file.read(*args)
+        self._bytes_read.append(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+class TestQualityControl(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, *members):
+        filename = path.join(self.directory, name)
+        with open(filename, "wb") as fastq:
+            for member in members:
+                if name.endswith(".gz"):
+                    compressed = gzip.GzipFile(fileobj=fastq, mode="wb")
+                    compressed.write(member)
+                    compressed.close()
+                else:
+                    fastq.write(member)
+        return filename
+
+    def _assert_stats(self, stats):
+        self.assertEqual(stats.reads, 3)
+        self.assertEqual(stats.bases, 14)
+        self.assertAlmostEqual(stats.mean_quality, (8 * 40 + 6 * 20) / 14.0)
+        self.assertAlmostEqual(stats.gc_content, 6 / 14.0)
+        self.assertEqual(stats.length_distribution, {4: 2, 6: 1})
+
+    def test_fastq_file_stats(self):
+        filename = self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ)
+
+        self._assert_stats(fastq_file_stats(filename))
+        self.assertEqual(fastq_stats(filename), (3, 14))
+
+    def test_records_split_across_blocks(self):
+        filename = self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ)
+
+        for block_size in (1, 7, 16):
+            self._assert_stats(fastq_file_stats(filename, block_size=block_size))
+
+    def test_several_gzip_members(self):
+        # e.g. bgzip writes a member for each block; records can span members
+        filename = self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ[:30], FASTQ[30:])
+
+        self._assert_stats(fastq_file_stats(filename, block_size=10))
+
+    def test_uncompressed_without_trailing_new_line(self):
+        filename = self._write("01-1111_S1_L001_R1_001.fastq", FASTQ.rstrip("\n"))
+
+        self._assert_stats(fastq_file_stats(filename, block_size=5))
+
+    def test_fastq_stats_for_files(self):
+        filenames = [self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ),
+                     self._write("01-1111_S1_L001_R2_001.fastq.gz", FASTQ[:40])]
+
+        stats = fastq_stats_for_files(filenames, processes=2)
+
+        self._assert_stats(stats[0])
+        self.assertEqual((stats[1].reads, stats[1].bases), (2, 10))
+        self.assertEqual(fastq_stats_for_files([]), [])
+
+    def test_stats_stream(self):
+        filename = self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ)
+        with open(filename, "rb") as fastq:
+            contents = bytearray(fastq.read())
+
+        # the blocks are views of one buffer, overwritten after each update
+        stream = FastqStatsStream(filename)
+        buffer = bytearray(10)
+        for offset in xrange(0, len(contents), 10):
+            block = contents[offset:offset + 10]
+            buffer[:len(block)] = block
+            stream.update(memoryview(buffer)[:len(block)])
+
+        self._assert_stats(stream.stats())
+
+    def test_stats_stream_not_gzip(self):
+        stream = FastqStatsStream("01-1111_S1_L001_R1_001.fastq.gz")
+        stream.update("\x1f\x8bnot really gzip")
+        stream.update("more")
+
+        self.assertIsNone(stream.stats())
+
+    def test_count_reads(self):
+        filename = self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ[:30], FASTQ[30:])
+        unterminated = self._write("01-1111_S1_L001_R2_001.fastq", FASTQ.rstrip("\n"))
+
+        self.assertEqual(count_reads(filename, block_size=7), 3)
+        self.assertEqual(count_reads(unterminated), 3)
+
+    def test_read_counts_cached(self):
+        filename = self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ)
+
+        with patch("API.qualitycontrol.count_reads", wraps=count_reads) as counter:
+            with patch("API.qualitycontrol._map_in_background", new=map):
+                self.assertEqual(count_reads_in_files([filename]), [3])
+                self.assertEqual(count_reads_in_files([filename]), [3])
+                self.assertEqual(counter.call_count, 1)
+
+                # the file is counted again once it changes
+                self._write("01-1111_S1_L001_R1_001.fastq.gz", FASTQ + FASTQ)
+                os.utime(filename, (0, 0))
+                self.assertEqual(count_reads_in_files([filename]), [6])
+                self.assertEqual(counter.call_count, 2)
+
+
+class TestGzipChecks(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        random.seed(1)
+        # doesn't compress well, so the files are bigger than the tail that's read
+        self.reads = "".join("@read{}\n{}\n+\n{}\n".format(i, "".join(random.choice("ACGT") for _ in xrange(100)),
+                                                          "".join(random.choice("#<FGI") for _ in xrange(100)))
+                             for i in xrange(2000))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, contents, member_size=None, truncate=0):
+        # like bgzip, write a member for every member_size bytes
+        member_size = member_size or max(len(contents), 1)
+        compressed = []
+        for offset in xrange(0, len(contents), member_size):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            compressed.append(compressor.compress(contents[offset:offset + member_size]) + compressor.flush())
+        compressed = "".join(compressed)
+        filename = path.join(self.directory, name)
+        with open(filename, "wb") as gzip_file:
+            gzip_file.write(compressed[:len(compressed) - truncate])
+        return filename
+
+    def test_small_file(self):
+        complete = self._write("complete.fastq.gz", FASTQ)
+        truncated = self._write("truncated.fastq.gz", FASTQ, truncate=4)
+        empty = self._write("empty.fastq.gz", "")
+
+        self.assertEqual(gzip_end_status(complete), GZIP_COMPLETE)
+        self.assertEqual(gzip_end_status(truncated), GZIP_TRUNCATED)
+        self.assertEqual(gzip_end_status(empty), GZIP_TRUNCATED)
+
+    def test_many_members(self):
+        complete = self._write("complete.fastq.gz", self.reads, member_size=65536)
+        truncated = self._write("truncated.fastq.gz", self.reads, member_size=65536, truncate=1000)
+
+        self.assertEqual(gzip_end_status(complete, tail_size=100000), GZIP_COMPLETE)
+        self.assertEqual(gzip_end_status(truncated, tail_size=100000), GZIP_TRUNCATED)
+
+    def test_small_last_member_found_in_probe(self):
+        complete = self._write("complete.fastq.gz", self.reads, member_size=4096)
+        truncated = self._write("truncated.fastq.gz", self.reads, member_size=4096, truncate=100)
+
+        for filename, status in [(complete, GZIP_COMPLETE), (truncated, GZIP_TRUNCATED)]:
+            bytes_read = []
+            with patch("API.qualitycontrol.open", create=True,
+                       side_effect=lambda *args: _CountingFile(open(*args), bytes_read)):
+                self.assertEqual(gzip_end_status(filename), status)
+            self.assertTrue(sum(bytes_read) <= len(GZIP_MAGIC) + GZIP_PROBE_SIZE)
+
+    def test_single_large_member(self):
+        # the start of the only member isn't in the tail, so only the full check can tell
+        complete = self._write("complete.fastq.gz", self.reads)
+        truncated = self._write("truncated.fastq.gz", self.reads, truncate=1000)
+
+        self.assertEqual(gzip_end_status(complete, tail_size=10000), GZIP_UNKNOWN)
+        self.assertEqual(gzip_end_status(truncated, tail_size=10000), GZIP_UNKNOWN)
+        self.assertTrue(gzip_crc_valid(complete, block_size=10000))
+        self.assertFalse(gzip_crc_valid(truncated, block_size=10000))
+
+    def test_not_compressed(self):
+        filename = path.join(self.directory, "reads.fastq")
+        with open(filename, "wb") as fastq:
+            fastq.write(FASTQ)
+
+        self.assertEqual(gzip_end_status(filename), GZIP_NOT_COMPRESSED)
+        self.assertTrue(gzip_crc_valid(filename))
+
+    def test_verify_gzip_files(self):
+        complete = self._write("complete.fastq.gz", self.reads, member_size=65536)
+        truncated = self._write("truncated.fastq.gz", self.reads, truncate=1)
+        damaged = self._write("damaged.fastq.gz", self.reads)
+        with open(damaged, "r+b") as gzip_file:
+            gzip_file.seek(-8, 2)
+            gzip_file.write("XXXX")
+
+        self.assertEqual(verify_gzip_files([complete, truncated, damaged]), [True, False, False])
+        self.assertEqual(verify_gzip_files([]), [])
+
+    @patch("API.qualitycontrol.multiprocessing.cpu_count", return_value=2)
+    def test_background_processes_finished(self, cpu_count):
+        complete = self._write("complete.fastq.gz", self.reads, member_size=65536)
+        threads = threading.active_count()
+
+        self.assertEqual(verify_gzip_files([complete, complete]), [True, True])
+
+        self.assertEqual(multiprocessing.active_children(), [])
+        self.assertEqual(threading.active_count(), threads)
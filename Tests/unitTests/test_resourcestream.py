@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+
+from mock import patch, MagicMock
+
+from API.resourcestream import parse_resources
+
+
+def chunked(document, chunk_size):
+    return (document[i:i + chunk_size] for i in xrange(0, len(document), chunk_size))
+
+
+class TestResourceStream(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+
+        self.resources = [{"sampleName": u"sample-{}-é".format(i), "identifier": str(i),
+                           "links": [{"rel": "self", "href": "http://localhost/api/samples/{}".format(i)}]}
+                          for i in xrange(50)]
+        # the links come before the resources, and one of them looks like the
+        # start of the resources array
+        self.document = json.dumps({"resource": {
+            "links": [{"rel": "self", "href": "\"resources\": [ {\"not\": \"this\"}"}],
+            "resources": self.resources
+        }})
+
+    def test_parse_resources_any_chunk_size(self):
+        for chunk_size in [1, 2, 7, 64, 4096, len(self.document)]:
+            parsed = list(parse_resources(chunked(self.document, chunk_size)))
+            self.assertEqual(parsed, self.resources, "chunk size {}".format(chunk_size))
+
+    def test_parse_resources_empty(self):
+        document = json.dumps({"resource": {"links": [], "resources": []}})
+        self.assertEqual(list(parse_resources(chunked(document, 3))), [])
+
+    def test_parse_resources_stops_reading_early(self):
+        chunks = chunked(self.document, 16)
+        resources = parse_resources(chunks)
+        self.assertEqual(next(resources), self.resources[0])
+        # the rest of the document hasn't been read yet
+        self.assertTrue(len(list(chunks)) > 0)
+
+    def test_parse_resources_large_entry(self):
+        resource = {"sampleName": "large", "description": "x" * 64 * 1024}
+        document = json.dumps({"resource": {"links": [], "resources": [resource, self.resources[0]]}})
+        decoder = MagicMock(wraps=json.JSONDecoder())
+
+        with patch("API.resourcestream._json_decoder", decoder):
+            parsed = list(parse_resources(chunked(document, 16)))
+
+        self.assertEqual(parsed, [resource, self.resources[0]])
+        # the entry is decoded again each time the part that's been received
+        # has doubled, not after each of its 4000 or so chunks
+        self.assertTrue(decoder.raw_decode.call_count < 20)
+
+    def test_parse_resources_truncated(self):
+        with self.assertRaises(ValueError) as err:
+            list(parse_resources(chunked(self.document[:-100], 64)))
+
+        self.assertTrue("ended before all of the resources" in str(err.exception))
+
+    def test_parse_resources_missing_array(self):
+        with self.assertRaises(ValueError):
+            list(parse_resources(chunked(json.dumps({"resource": {"links": []}}), 64)))
@@ -0,0 +1,228 @@
+import unittest
+import json
+import hashlib
+import shutil
+import tempfile
+from os import path, urandom
+
+from mock import patch, MagicMock
+from requests import Session
+
+import API
+from API.uploadjournal import UploadJournal
+from Exceptions.SequenceFileError import SequenceFileError
+from Model.SequenceFile import SequenceFile
+from Model.SequencingRun import SequencingRun
+from Tests.unitTests.resumableuploadserver import ResumableUploadServer
+
+
+class TestUploadJournal(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        self.journal_path = path.join(self.directory, ".miseqUploaderJournal")
+        self.fastq = path.join(self.directory, "01-1111_S1_L001_R1_001.fastq.gz")
+        with open(self.fastq, "wb") as fastq:
+            fastq.write("@read\nACGT\n+\nIIII\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_committed_after_reload(self):
+        journal = UploadJournal(self.journal_path)
+        self.assertEqual(journal.committed(self.fastq), (None, 0))
+
+        journal.record(self.fastq, "http://localhost/uploads/1", 0)
+        journal.record(self.fastq, "http://localhost/uploads/1", 10)
+
+        self.assertEqual(UploadJournal(self.journal_path).committed(self.fastq),
+                         ("http://localhost/uploads/1", 10))
+
+    def test_incomplete_entry_ignored(self):
+        journal = UploadJournal(self.journal_path)
+        journal.record(self.fastq, "http://localhost/uploads/1", 10)
+        with open(self.journal_path, "ab") as journal_file:
+            journal_file.write('{"file": "' + self.fastq)
+
+        self.assertEqual(UploadJournal(self.journal_path).committed(self.fastq),
+                         ("http://localhost/uploads/1", 10))
+
+    def test_changed_file_not_committed(self):
+        journal = UploadJournal(self.journal_path)
+        journal.record(self.fastq, "http://localhost/uploads/1", 10)
+        with open(self.fastq, "ab") as fastq:
+            fastq.write("@read2\nACGT\n+\nIIII\n")
+
+        self.assertEqual(UploadJournal(self.journal_path).committed(self.fastq), (None, 0))
+
+    def test_forget_removes_journal(self):
+        journal = UploadJournal(self.journal_path)
+        journal.record(self.fastq, "http://localhost/uploads/1", 10)
+        journal.forget([self.fastq])
+
+        self.assertEqual(journal.committed(self.fastq), (None, 0))
+        self.assertFalse(path.exists(self.journal_path))
+
+    def test_remove(self):
+        journal = UploadJournal(self.journal_path)
+        journal.record(self.fastq, "http://localhost/uploads/1", 10)
+        journal.remove()
+
+        self.assertEqual(journal.committed(self.fastq), (None, 0))
+        self.assertFalse(path.exists(self.journal_path))
+
+
+@patch("API.resumableupload.UPLOAD_CHUNK_SIZE", 1000)
+class TestResumableUpload(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        API.apiCalls.ApiCalls.close()
+
+        self.server = ResumableUploadServer()
+        self.server.start()
+
+        self.directory = tempfile.mkdtemp()
+        self.journal_path = path.join(self.directory, ".miseqUploaderJournal")
+        self.file_contents = [urandom(4500), urandom(3000)]
+        files = []
+        for read, contents in zip(["R1", "R2"], self.file_contents):
+            files.append(path.join(self.directory, "01-1111_S1_L001_{}_001.fastq.gz".format(read)))
+            with open(files[-1], "wb") as fastq:
+                fastq.write(contents)
+
+        self.sample = API.apiCalls.Sample({
+            "sequencerSampleId": "01-1111",
+            "sampleName": "01-1111",
+            "sampleProject": "1"
+        })
+        self.sample.set_seq_file(SequenceFile({"Sample_Name": "01-1111"}, files))
+        self.sample.run = SequencingRun(sample_sheet="sheet", sample_list=[self.sample])
+        self.sample.run._sample_sheet_name = "sheet"
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+        API.apiCalls.ApiCalls.close()
+
+    def _api(self, server_supports_resumable=True):
+        with patch("API.apiCalls.ApiCalls.create_session"):
+            api = API.apiCalls.ApiCalls(
+                client_id="",
+                client_secret="",
+                base_URL="",
+                username="",
+                password=""
+            )
+
+        def get_link(targ_url, target_key, targ_dict=""):
+            if target_key == "sample/sequenceFiles/uploads":
+                if not server_supports_resumable:
+                    raise KeyError(target_key + " not found in links.")
+                return self.server.url + "/uploads"
+            elif target_key == "sample/sequenceFiles/pairs":
+                return self.server.url + "/samples/1/pairs"
+            return self.server.url + "/samples/1/sequenceFiles"
+
+        api.get_link = get_link
+        api.session = Session()
+        return api
+
+    def _send(self):
+        return self._api().send_sequence_files([self.sample], upload_journal=UploadJournal(self.journal_path))
+
+    def _patches(self, upload_id):
+        return [offset for method, url, offset in self.server.requests
+                if method == "PATCH" and url == "/uploads/" + upload_id]
+
+    def _assert_uploaded(self, json_res_list):
+        self.assertEqual([self.server.uploads[upload_id]["data"] for upload_id in ["1", "2"]],
+                         self.file_contents)
+        self.assertEqual(len(self.server.sequence_files), 1)
+        form = self.server.sequence_files[0]
+        self.assertEqual(form["file1"], self.server.url + "/uploads/1")
+        self.assertEqual(form["file2"], self.server.url + "/uploads/2")
+        self.assertEqual(form["parameters1"]["miseqRunId"], "1")
+        # the checksums cover the whole file, even when the upload was resumed
+        self.assertEqual(form["parameters1"]["uploadSha256"], hashlib.sha256(self.file_contents[0]).hexdigest())
+        self.assertEqual(form["parameters2"]["uploadMd5"], hashlib.md5(self.file_contents[1]).hexdigest())
+        self.assertEqual(json_res_list, [{"resource": {"form": form}}])
+        # the journal is removed once everything is uploaded
+        self.assertFalse(path.exists(self.journal_path))
+
+    def test_upload_in_chunks(self):
+        json_res_list = self._send()
+
+        self._assert_uploaded(json_res_list)
+        self.assertEqual(self._patches("1"), [0, 1000, 2000, 3000, 4000])
+        self.assertEqual(self._patches("2"), [0, 1000, 2000])
+
+    def test_resume_after_server_error(self):
+        self.server.fail_at = 2500
+
+        with self.assertRaises(SequenceFileError):
+            self._send()
+        self.assertEqual(UploadJournal(self.journal_path).committed(self.sample.get_files()[0]),
+                         (self.server.url + "/uploads/1", 2000))
+
+        json_res_list = self._send()
+
+        self._assert_uploaded(json_res_list)
+        # the chunks that were acknowledged before the failure aren't sent again
+        self.assertEqual(self._patches("1"), [0, 1000, 2000, 2000, 3000, 4000])
+        self.assertEqual(len(self.server.uploads), 2)
+
+    def test_resume_after_dropped_connection(self):
+        # the server keeps part of the chunk before the connection is dropped
+        self.server.fail_with = "disconnect"
+        self.server.fail_at = 4200
+
+        with self.assertRaises(Exception):
+            self._send()
+
+        json_res_list = self._send()
+
+        self._assert_uploaded(json_res_list)
+        # the upload continues from where the server says it got to
+        self.assertEqual(self._patches("1"), [0, 1000, 2000, 3000, 4000, 4200])
+
+    def test_restart_when_server_forgets_upload(self):
+        self.server.fail_at = 2500
+
+        with self.assertRaises(SequenceFileError):
+            self._send()
+        self.server.uploads.clear()
+
+        self._send()
+
+        self.assertEqual(self.server.uploads["1"]["data"], self.file_contents[0])
+        self.assertEqual(self._patches("1")[-5:], [0, 1000, 2000, 3000, 4000])
+
+    def test_server_without_resumable_uploads(self):
+        api = self._api(server_supports_resumable=False)
+
+        with patch.object(api.session, "post") as post:
+            post.return_value.status_code = 201
+            post.return_value.text = json.dumps({"resource": {}})
+            api.send_sequence_files([self.sample], upload_journal=UploadJournal(self.journal_path))
+
+        # the sample is sent in one multipart request instead
+        self.assertEqual(post.call_count, 1)
+        self.assertTrue("multipart/form-data" in post.call_args[1]["headers"]["Content-Type"])
+        self.assertEqual(self.server.requests, [])
+
+    def test_resumable_uploads_link_looked_for_once(self):
+        api = self._api(server_supports_resumable=False)
+        get_link = MagicMock(wraps=api.get_link)
+        api.get_link = get_link
+
+        with patch.object(api.session, "post") as post, patch("API.apiCalls.logging.warning") as warning:
+            post.return_value.status_code = 201
+            post.return_value.text = json.dumps({"resource": {}})
+            api.send_sequence_files([self.sample, self.sample], upload_journal=UploadJournal(self.journal_path))
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(warning.call_count, 1)
+        self.assertEqual([args[1] for args, kwargs in get_link.call_args_list].count("sample/sequenceFiles/uploads"),
+                         1)
@@ -0,0 +1,106 @@
+import unittest
+import json
+import shutil
+import tempfile
+import threading
+from os import path
+
+from mock import patch, MagicMock
+
+from API.pubsub import send_message
+from API.runuploader import upload_run_to_server
+from Model.Sample import Sample
+from Model.SequenceFile import SequenceFile
+from Model.SequencingRun import SequencingRun
+
+
+class TestRunUploader(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        self.samples = []
+        for sample_id in ["01-1111", "02-2222"]:
+            sample = Sample({"sequencerSampleId": sample_id, "sampleName": sample_id, "sampleProject": "1"})
+            sample.set_seq_file(SequenceFile({}, [path.join(self.directory, sample_id + "_S1_L001_R1_001.fastq.gz")]))
+            self.samples.append(sample)
+        self.run = SequencingRun(sample_sheet=path.join(self.directory, "SampleSheet.csv"), sample_list=self.samples)
+
+        self.api = MagicMock()
+        self.api.auth_request_count = 0
+        self.api.connection_counts.return_value = (0, 0)
+        self.api.create_seq_run.return_value = {"resource": {"identifier": "7"}}
+        self.api.send_sequence_files.side_effect = self._send_sequence_files
+
+        self.events = []
+        self.options = {}
+        self.patches = [patch("API.runuploader.read_config_option",
+                              side_effect=lambda key, expected_type=None, default_value=None:
+                              self.options.get(key, default_value)),
+                        patch("API.runuploader.project_exists", return_value=True),
+                        patch("API.runuploader.sample_exists", return_value=False)]
+        self.project_exists, self.sample_exists = [p.start() for p in self.patches][1:]
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def _send_sequence_files(self, samples_list, prepare_sample=None, **kwargs):
+        for sample in samples_list:
+            if prepare_sample:
+                prepare_sample(sample)
+            self.events.append(("uploaded", sample.get_id()))
+            filename = sample.get_files()[0]
+            sample.seq_file.checksums[filename] = {"md5": sample.get_id() + "-md5",
+                                                   "sha256": sample.get_id() + "-sha256"}
+            send_message(sample.upload_completed_topic, sample=sample)
+        return [{} for _ in samples_list]
+
+    def _uploader_info(self):
+        with open(path.join(self.directory, ".miseqUploaderInfo"), "rb") as reader:
+            return json.load(reader)
+
+    def test_checksums_kept_when_run_completes(self):
+        upload_run_to_server(api=self.api, sequencing_run=self.run, condition=threading.Condition())
+
+        uploader_info = self._uploader_info()
+        self.assertEqual(uploader_info["Upload Status"], "Complete")
+        self.assertEqual(uploader_info["Upload ID"], "7")
+        self.assertEqual(sorted(uploader_info["uploaded_samples"]), ["01-1111", "02-2222"])
+        for sample in self.samples:
+            self.assertEqual(uploader_info["checksums"][sample.get_files()[0]],
+                             {"md5": sample.get_id() + "-md5", "sha256": sample.get_id() + "-sha256"})
+        self.api.set_seq_run_complete.assert_called_once_with("7")
+
+    def test_upload_journal_removed_when_run_completes(self):
+        self.options["resumable_uploads"] = True
+        journal_path = path.join(self.directory, ".miseqUploaderJournal")
+        # an entry left from a sample that was sent in one request
+        with open(journal_path, "wb") as journal:
+            journal.write(json.dumps({"file": "other.fastq.gz", "size": 1, "mtime": 1,
+                                      "location": "http://localhost/uploads/1", "offset": 0}) + "\n")
+
+        upload_run_to_server(api=self.api, sequencing_run=self.run, condition=threading.Condition())
+
+        self.assertTrue(self.api.send_sequence_files.call_args[1]["upload_journal"] is not None)
+        self.assertFalse(path.exists(journal_path))
+
+    def test_pipelined_uploads_check_each_sample_before_its_files(self):
+        self.options["pipelined_uploads"] = True
+
+        def sample_exists(api, sample):
+            self.events.append(("checked", sample.get_id()))
+            return False
+        self.sample_exists.side_effect = sample_exists
+
+        upload_run_to_server(api=self.api, sequencing_run=self.run, condition=threading.Condition())
+
+        # each sample is checked and created just before its files are sent,
+        # instead of every sample being checked before any files are sent
+        self.assertEqual(self.events, [("checked", "01-1111"), ("uploaded", "01-1111"),
+                                       ("checked", "02-2222"), ("uploaded", "02-2222")])
+        self.assertEqual(self.project_exists.call_count, 2)
+        self.assertFalse(self.api.prefetch_samples.called)
+        self.assertEqual([c[0][0] for c in self.api.send_samples.call_args_list], [[sample] for sample in self.samples])
+        self.api.set_seq_run_complete.assert_called_once_with("7")
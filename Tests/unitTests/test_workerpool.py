@@ -0,0 +1,71 @@
+import unittest
+import threading
+
+from API.workerpool import map_concurrently
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        print "\nStarting " + self.__module__ + ": " + self._testMethodName
+
+    def test_results_in_order(self):
+        running = []
+        most_running = []
+        lock = threading.Lock()
+
+        def square(item):
+            with lock:
+                running.append(item)
+                most_running.append(len(running))
+            result = item * item
+            with lock:
+                running.remove(item)
+            return result
+
+        self.assertEqual(map_concurrently(square, range(20), 3), [item * item for item in range(20)])
+        self.assertTrue(max(most_running) <= 3)
+        self.assertEqual(map_concurrently(square, [], 3), [])
+
+    def test_generator_items_started_as_produced(self):
+        first_finished = threading.Event()
+        events = []
+
+        def produce():
+            yield 1
+            # the first item is started before the second one is produced
+            self.assertTrue(first_finished.wait(5))
+            events.append("produced 2")
+            yield 2
+
+        def record(item):
+            events.append("finished {}".format(item))
+            first_finished.set()
+            return item
+
+        self.assertEqual(map_concurrently(record, produce(), 1), [1, 2])
+        self.assertEqual(events, ["finished 1", "produced 2", "finished 2"])
+
+    def test_failure_stops_new_items(self):
+        started = []
+
+        def fail_on_second(item):
+            started.append(item)
+            if item == 2:
+                raise ValueError("item 2")
+            return item
+
+        with self.assertRaises(ValueError) as err:
+            map_concurrently(fail_on_second, [1, 2, 3, 4], 1)
+
+        self.assertEqual(str(err.exception), "item 2")
+        self.assertEqual(started, [1, 2])
+        self.assertEqual([thread for thread in threading.enumerate() if thread.name.startswith("Worker-")], [])
+
+    def test_should_stop(self):
+        started = []
+
+        results = map_concurrently(started.append, [1, 2, 3], 1, should_stop=lambda: len(started) >= 2)
+
+        self.assertEqual(started, [1, 2])
+        self.assertEqual(results, [None, None, None])
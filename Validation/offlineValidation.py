@@ -2,8 +2,10 @@ from copy import deepcopy
 from urlparse import urlparse
 from os import path
 
-from Parsers.miseqParser import get_csv_reader
+from Parsers.miseqParser import read_sample_sheet, ParsedSampleSheet
 from Model.ValidationResult import ValidationResult
+from API.qualitycontrol import (gzip_end_status, verify_gzip_files, count_reads_in_files, GZIP_TRUNCATED,
+                                GZIP_UNKNOWN, GZIP_NOT_COMPRESSED)
 
 
 def validate_sample_sheet(sample_sheet_file):
@@ -15,21 +17,24 @@ def validate_sample_sheet(sample_sheet_file):
         Sample_ID, Sample_Name, Sample_Project and Description table headers
 
     arguments:
-            sample_sheet_file -- path to SampleSheet.csv
+            sample_sheet_file -- path to SampleSheet.csv, or a
+                ParsedSampleSheet
 
     returns ValidationResult object - stores bool valid and
         list of string error messages
     """
 
-    csv_reader = get_csv_reader(sample_sheet_file)
+    if isinstance(sample_sheet_file, ParsedSampleSheet):
+        sample_sheet = sample_sheet_file
+    else:
+        sample_sheet = read_sample_sheet(sample_sheet_file)
 
     v_res = ValidationResult()
 
     valid = False
     all_data_headers_found = False
-    data_sect_found = False
-    header_sect_found = False
-    check_data_headers = False
+    data_sect_found = "[Data]" in sample_sheet.sections
+    header_sect_found = "[Header]" in sample_sheet.sections
 
     # status of required data headers
     found_data_headers = {
@@ -38,26 +43,15 @@ def validate_sample_sheet(sample_sheet_file):
         "Sample_Project": False,
         "Description": False}
 
-    for line in csv_reader:
-
-        if "[Data]" in line:
-            data_sect_found = True
-            check_data_headers = True  # next line contains data headers
-
-        elif "[Header]" in line:
-            header_sect_found = True
-
-        elif check_data_headers:
-
-            for data_header in found_data_headers.keys():
-                if data_header in line:
-                    found_data_headers[data_header] = True
+    if sample_sheet.data_headers is not None:
 
-            # if all required dataHeaders are found
-            if all(found_data_headers.values()):
-                all_data_headers_found = True
+        for data_header in found_data_headers.keys():
+            if data_header in sample_sheet.data_headers:
+                found_data_headers[data_header] = True
 
-            check_data_headers = False
+        # if all required dataHeaders are found
+        if all(found_data_headers.values()):
+            all_data_headers_found = True
 
     if all([header_sect_found, data_sect_found, all_data_headers_found]):
         valid = True
@@ -119,6 +113,84 @@ def validate_sample_list(sample_list):
     return v_res
 
 
+def validate_sequence_files(sample_list, verify_crc=False):
+
+    """
+    Checks that the gzip compressed sequence files of the samples were
+        completely written (e.g. not cut short by an interrupted copy),
+        reading only the end of each file (see gzip_end_status). Files
+        whose end can't be checked that way (a single large gzip member)
+        are decompressed to check them instead, in a pool of background
+        processes
+
+    arguments:
+            sample_list -- list containing Sample objects
+            verify_crc -- also decompress every file to check the CRCs of
+                all of its gzip members, in a pool of background processes
+
+    returns ValidationResult object - stores bool valid and
+        list of string error messages
+    """
+
+    v_res = ValidationResult()
+    files_to_verify = []
+    for sample in sample_list:
+        for filename in sample.get_files():
+            try:
+                status = gzip_end_status(filename)
+            except (IOError, OSError), e:
+                v_res.add_error_msg("{} could not be read: {}".format(filename, e))
+                continue
+
+            if status == GZIP_TRUNCATED:
+                v_res.add_error_msg(("{} is truncated, the file ends part of the way through "
+                                     "its compressed data.").format(filename))
+            elif status == GZIP_NOT_COMPRESSED and filename.endswith(".gz"):
+                v_res.add_error_msg("{} is not a gzip compressed file.".format(filename))
+            elif status == GZIP_UNKNOWN or verify_crc:
+                files_to_verify.append(filename)
+
+    for filename, intact in zip(files_to_verify, verify_gzip_files(files_to_verify)):
+        if not intact:
+            v_res.add_error_msg("{} is damaged or truncated, the compressed data can't be read.".format(filename))
+
+    v_res.set_valid(v_res.error_count() == 0)
+    return v_res
+
+
+def validate_read_counts(sample_list):
+
+    """
+    Checks that both files of each paired-end sample have the same number of
+        reads (e.g. that R2 wasn't cut short). The files are counted at the
+        same time, in a pool of background processes.
+
+    arguments:
+            sample_list -- list containing Sample objects
+
+    returns ValidationResult object - stores bool valid and
+        list of string error messages
+    """
+
+    v_res = ValidationResult()
+    paired_samples = [sample for sample in sample_list if sample.is_paired_end()]
+    file_list = [filename for sample in paired_samples for filename in sample.get_files()]
+    read_counts = dict(zip(file_list, count_reads_in_files(file_list)))
+
+    for sample in paired_samples:
+        forward, reverse = sample.get_files()
+        for filename in [forward, reverse]:
+            if read_counts[filename] is None:
+                v_res.add_error_msg("{} could not be decompressed to count its reads.".format(filename))
+        if None not in (read_counts[forward], read_counts[reverse]) and read_counts[forward] != read_counts[reverse]:
+            v_res.add_error_msg(("Sample {} has {} reads in {} but {} reads in {}, "
+                                 "the files should have the same number of reads.").format(
+                sample.get_id(), read_counts[forward], forward, read_counts[reverse], reverse))
+
+    v_res.set_valid(v_res.error_count() == 0)
+    return v_res
+
+
 def sample_id_name_match(sample):
 
     """
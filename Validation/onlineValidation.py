@@ -3,24 +3,16 @@ from requests import ConnectionError
 
 def project_exists(api, project_id, message_id=None):
     try:
-        proj_list = api.get_projects()
-        project = next(proj for proj in proj_list if proj.get_id() == project_id)
-        if message_id:
-            send_message(message_id, project=project)
-        return True
+        project = api.get_project(project_id)
     except ConnectionError:
         if message_id:
             send_message(message_id, project=None)
-    except StopIteration:
-        if message_id:
-            send_message(message_id, project=None)
-        return False
+        return
 
-def sample_exists(api, sample):
+    if message_id:
+        send_message(message_id, project=project)
+    return project is not None
 
-    sample_list = api.get_samples(sample=sample)
+def sample_exists(api, sample):
 
-    if any([s.get_id().lower() == sample.get_id().lower() for s in sample_list]):
-        return True
-    else:
-        return False
+    return api.get_sample(sample) is not None
@@ -13,7 +13,7 @@ from distutils.version import LooseVersion
 from github3 import GitHub
 from GUI import UploaderAppFrame, SettingsDialog
 from appdirs import user_config_dir, user_log_dir
-from wx.lib.pubsub import pub
+from API.pubsub import pub
 
 path_to_module = path.dirname(__file__)
 app_config = path.join(path_to_module, 'irida-uploader.cfg')
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""Upload sequencing runs to IRIDA from the command line.
+
+This uploads runs the same way that the GUI does (using the settings in the
+uploader's config file), but without the GUI, so it doesn't need wx or an
+X server. It's meant for unattended upload nodes, e.g., run from cron:
+
+    python run_IRIDA_Uploader_cli.py /path/to/MiSeqOutput
+
+The exit status is 0 when every run was uploaded, and 1 otherwise (including
+when a run couldn't be uploaded because its sample sheet is garbled or its
+sequence files are missing).
+"""
+
+import os
+import sys
+import logging
+import argparse
+import threading
+
+from os import path, makedirs
+from appdirs import user_log_dir
+
+from API.pubsub import pub
+from API.config import read_config_option, user_config_file
+from API.APIConnector import connect_to_irida
+from API.directoryscanner import find_runs_in_directory, DirectoryScannerTopics
+from API.runuploader import upload_run_to_server
+
+log_format = '%(asctime)s %(levelname)s\t%(filename)s:%(funcName)s:%(lineno)d - %(message)s'
+
+def _configure_logging():
+    if not path.exists(user_log_dir("iridaUploader")):
+        makedirs(user_log_dir("iridaUploader"))
+
+    logging.getLogger().handlers = []
+    logging.basicConfig(level=logging.DEBUG,
+                        filename=path.join(user_log_dir("iridaUploader"), 'irida-uploader-cli.log'),
+                        format=log_format,
+                        filemode='w')
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter(log_format))
+    logging.getLogger().addHandler(console)
+
+def upload_runs(directory):
+    """Find the runs in a directory that haven't been uploaded, and upload them.
+
+    Args:
+        directory: the directory to look for runs in.
+
+    Returns:
+        True if every run was uploaded, False otherwise (including when a run
+        has a garbled sample sheet or missing sequence files).
+    """
+    try:
+        api = connect_to_irida()
+    except:
+        logging.exception("Couldn't connect to IRIDA, check the settings in {}".format(user_config_file))
+        return False
+
+    invalid_sample_sheets = []
+    def _handle_invalid_sample_sheet(sample_sheet=None, error=None):
+        logging.error("Not uploading the run for {}: {}".format(sample_sheet, error))
+        invalid_sample_sheets.append(sample_sheet)
+
+    topics = [DirectoryScannerTopics.garbled_sample_sheet, DirectoryScannerTopics.missing_files]
+    for topic in topics:
+        pub.subscribe(_handle_invalid_sample_sheet, topic)
+    try:
+        runs = find_runs_in_directory(directory)
+    finally:
+        for topic in topics:
+            pub.unsubscribe(_handle_invalid_sample_sheet, topic)
+    logging.info("Found [{}] runs to upload in {}".format(len(runs), directory))
+
+    # upload_run_to_server notifies the condition when a run is finished (the
+    # directory monitor waits on it), nothing is waiting on it here.
+    condition = threading.Condition()
+    uploaded_all = not invalid_sample_sheets
+    for run in runs:
+        try:
+            upload_run_to_server(api=api, sequencing_run=run, condition=condition)
+        except:
+            logging.exception("Failed to upload the run in {}".format(run.sample_sheet_dir))
+            uploaded_all = False
+
+    return uploaded_all
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Upload sequencing runs to IRIDA without the GUI.")
+    parser.add_argument("directory", nargs="?",
+                        help="the directory to look for runs in (a run directory, or a directory of runs). "
+                             "Defaults to the default directory in the uploader's settings.")
+    arguments = parser.parse_args(arguments)
+
+    _configure_logging()
+
+    directory = arguments.directory or read_config_option("default_dir")
+    uploaded_all = upload_runs(directory)
+
+    post_processing_task = read_config_option("completion_cmd")
+    if uploaded_all and post_processing_task:
+        logging.info("About to launch post-processing command: {}".format(post_processing_task))
+        if os.system(post_processing_task):
+            logging.error("The post-processing command is reporting failure")
+            return 1
+
+    return 0 if uploaded_all else 1
+
+if __name__ == "__main__":
+    sys.exit(main())